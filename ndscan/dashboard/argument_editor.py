@@ -101,10 +101,52 @@ class ScanOptions:
         randomise_globally_layout.addWidget(self.randomise_globally_box)
         randomise_globally_layout.setStretchFactor(self.randomise_globally_box, 1)
 
+        #
+
+        self.aggregate_repeats_container = QtWidgets.QWidget()
+        aggregate_repeats_layout = QtWidgets.QHBoxLayout()
+        self.aggregate_repeats_container.setLayout(aggregate_repeats_layout)
+
+        aggregate_repeats_label = QtWidgets.QLabel("Only store mean over repeats: ")
+        aggregate_repeats_layout.addWidget(aggregate_repeats_label)
+        aggregate_repeats_layout.setStretchFactor(aggregate_repeats_label, 0)
+
+        self.aggregate_repeats_box = QtWidgets.QCheckBox()
+        self.aggregate_repeats_box.setChecked(
+            current_scan.get("aggregate_repeats", False))
+        aggregate_repeats_layout.addWidget(self.aggregate_repeats_box)
+        aggregate_repeats_layout.setStretchFactor(self.aggregate_repeats_box, 0)
+
+        archive_raw_label = QtWidgets.QLabel("Archive raw values: ")
+        aggregate_repeats_layout.addWidget(archive_raw_label)
+        aggregate_repeats_layout.setStretchFactor(archive_raw_label, 0)
+
+        self.archive_raw_box = QtWidgets.QCheckBox()
+        self.archive_raw_box.setChecked(current_scan.get("archive_raw_repeats", False))
+        self.archive_raw_box.setEnabled(self.aggregate_repeats_box.isChecked())
+        self.aggregate_repeats_box.toggled.connect(self.archive_raw_box.setEnabled)
+        aggregate_repeats_layout.addWidget(self.archive_raw_box)
+        aggregate_repeats_layout.setStretchFactor(self.archive_raw_box, 1)
+
+        #
+
+        self.num_points_container = QtWidgets.QWidget()
+        num_points_layout = QtWidgets.QHBoxLayout()
+        self.num_points_container.setLayout(num_points_layout)
+
+        num_points_label = QtWidgets.QLabel("Total number of points: ")
+        num_points_layout.addWidget(num_points_label)
+        num_points_layout.setStretchFactor(num_points_label, 0)
+
+        self.num_points_value = QtWidgets.QLabel(_describe_num_points(current_scan))
+        num_points_layout.addWidget(self.num_points_value)
+        num_points_layout.setStretchFactor(self.num_points_value, 1)
+
     def get_widgets(self) -> List[QtWidgets.QWidget]:
         return [
             self.num_repeats_container, self.no_axis_container,
-            self.randomise_globally_container
+            self.randomise_globally_container, self.aggregate_repeats_container,
+            self.num_points_container
         ]
 
     def write_to_params(self, params: Dict[str, Any]) -> None:
@@ -112,6 +154,95 @@ class ScanOptions:
         scan["num_repeats"] = self.num_repeats_box.value()
         scan["no_axes_mode"] = NoAxesMode(self.no_axes_box.currentText()).name
         scan["randomise_order_globally"] = self.randomise_globally_box.isChecked()
+        scan["aggregate_repeats"] = self.aggregate_repeats_box.isChecked()
+        scan["archive_raw_repeats"] = self.archive_raw_box.isChecked()
+        self.num_points_value.setText(_describe_num_points(scan))
+
+
+class ChannelSettings:
+    def __init__(self, channels: Dict[str, Any], current_settings: Dict[str, Any]):
+        self.save_by_default = OrderedDict()
+        self.save_boxes = OrderedDict()
+        self.mute_boxes = OrderedDict()
+        self.containers = []
+        for path in sorted(channels.keys()):
+            schema = channels[path]
+            settings = current_settings.get(path, {})
+
+            container = QtWidgets.QWidget()
+            layout = QtWidgets.QHBoxLayout()
+            container.setLayout(layout)
+
+            label = QtWidgets.QLabel(schema.get("description", "") or path)
+            label.setToolTip(path)
+            layout.addWidget(label)
+            layout.setStretchFactor(label, 1)
+
+            save_by_default = schema.get("save_by_default", True)
+            save_box = QtWidgets.QCheckBox("Save")
+            save_box.setChecked(settings.get("save", save_by_default))
+            layout.addWidget(save_box)
+            layout.setStretchFactor(save_box, 0)
+
+            mute_box = QtWidgets.QCheckBox("Mute")
+            mute_box.setToolTip("Discard all values pushed to this result channel")
+            mute_box.setChecked(settings.get("muted", False))
+            save_box.setEnabled(not mute_box.isChecked())
+            mute_box.toggled.connect(
+                lambda muted, box=save_box: box.setEnabled(not muted))
+            layout.addWidget(mute_box)
+            layout.setStretchFactor(mute_box, 0)
+
+            self.save_by_default[path] = save_by_default
+            self.save_boxes[path] = save_box
+            self.mute_boxes[path] = mute_box
+            self.containers.append(container)
+
+    def get_widgets(self) -> List[QtWidgets.QWidget]:
+        return self.containers
+
+    def write_to_params(self, params: Dict[str, Any]) -> None:
+        # Only store settings that differ from the defaults, such that the argument
+        # stays small for fragments with many result channels.
+        channel_settings = {}
+        for path, save_by_default in self.save_by_default.items():
+            settings = {}
+            save = self.save_boxes[path].isChecked()
+            if save != save_by_default:
+                settings["save"] = save
+            if self.mute_boxes[path].isChecked():
+                settings["muted"] = True
+            if settings:
+                channel_settings[path] = settings
+        params["channel_settings"] = channel_settings
+
+
+def _describe_num_points(scan: Dict[str, Any]) -> str:
+    """Return a human-readable description of the number of points the given scan
+    will visit (cf. ``ScanSpec.plan()`` on the experiment side)."""
+    axes = scan.get("axes", [])
+    if not axes:
+        return "(no scan)"
+    num_points = scan.get("num_repeats", 1)
+    sampled_types = set()
+    unbounded_types = set()
+    for ax in axes:
+        typ = ax["type"]
+        rang = ax["range"]
+        if typ == "linear":
+            num_points *= rang["num_points"]
+        elif typ == "list":
+            num_points *= len(rang["values"])
+        elif typ in ("halton", "latin_hypercube"):
+            # All axes of the same type are sampled jointly.
+            if typ not in sampled_types:
+                sampled_types.add(typ)
+                num_points *= rang["num_points"]
+        else:
+            unbounded_types.add(typ)
+    if unbounded_types:
+        return "unbounded ({} scan)".format(", ".join(sorted(unbounded_types)))
+    return str(num_points)
 
 
 class ArgumentEditor(QtWidgets.QTreeWidget):
@@ -184,6 +315,12 @@ class ArgumentEditor(QtWidgets.QTreeWidget):
             if "scan" in ndscan_params:
                 self.scan_options = ScanOptions(ndscan_params["scan"])
 
+            self.channel_settings = None
+            if ndscan_params.get("channels", None):
+                self.channel_settings = ChannelSettings(
+                    ndscan_params["channels"],
+                    ndscan_params.get("channel_settings", {}))
+
             for fqn, path in ndscan_params["always_shown"]:
                 self._make_param_items(fqn, path, True)
 
@@ -212,6 +349,14 @@ class ArgumentEditor(QtWidgets.QTreeWidget):
                     scan_options_group.addChild(twi)
                     self.setItemWidget(twi, 1, widget)
 
+            if self.channel_settings:
+                channels_group = self._make_group_header_item("Result channels")
+                self.addTopLevelItem(channels_group)
+                for widget in self.channel_settings.get_widgets():
+                    twi = QtWidgets.QTreeWidgetItem()
+                    channels_group.addChild(twi)
+                    self.setItemWidget(twi, 1, widget)
+
         buttons_item = QtWidgets.QTreeWidgetItem()
         self.addTopLevelItem(buttons_item)
         buttons_item.setFirstColumnSpanned(True)
@@ -572,6 +717,9 @@ class ArgumentEditor(QtWidgets.QTreeWidget):
             # Store scan parameters.
             self.scan_options.write_to_params(self._ndscan_params)
 
+        if self.channel_settings is not None:
+            self.channel_settings.write_to_params(self._ndscan_params)
+
         _update_ndscan_params(self._arguments, self._ndscan_params)
 
     def _make_override_entry(self, fqn, path):
@@ -667,9 +815,14 @@ class FloatOverrideEntry(OverrideEntry):
         self.scan_types = OrderedDict([
             ("Fixed", (self._build_fixed_ui, self._write_override)),
             ("Refining", (self._build_refining_ui, self._write_refining_scan)),
+            ("Adaptive", (self._build_adaptive_ui, self._write_adaptive_scan)),
             ("Linear", (self._build_linear_ui, self._write_linear_scan)),
             ("List", (self._build_list_ui, self._write_list_scan))
         ])
+        for name, typ in [("Halton", "halton"), ("Latin hypercube", "latin_hypercube")]:
+            build_ui = partial(self._build_sampled_ui, typ)
+            self.scan_types[name] = (build_ui, partial(self._write_sampled_scan, typ))
+        self.sampled_boxes = {}
         self.current_scan_type = None
         self.scale = schema.get("spec", {}).get("scale", 1.0)
 
@@ -702,6 +855,20 @@ class FloatOverrideEntry(OverrideEntry):
         }
         params["scan"].setdefault("axes", []).append(spec)
 
+    def _write_adaptive_scan(self, params: dict) -> None:
+        spec = {
+            "fqn": self.schema["fqn"],
+            "path": self.path,
+            "type": "adaptive",
+            "range": {
+                "lower": self.box_adaptive_lower.value() * self.scale,
+                "upper": self.box_adaptive_upper.value() * self.scale,
+                "channel": self.box_adaptive_channel.text().strip(),
+                "randomise_order": self.box_adaptive_randomise.isChecked()
+            }
+        }
+        params["scan"].setdefault("axes", []).append(spec)
+
     def _write_linear_scan(self, params: dict) -> None:
         spec = {
             "fqn": self.schema["fqn"],
@@ -735,6 +902,21 @@ class FloatOverrideEntry(OverrideEntry):
         }
         params["scan"].setdefault("axes", []).append(spec)
 
+    def _write_sampled_scan(self, typ: str, params: dict) -> None:
+        lower, num_points, randomise, upper = self.sampled_boxes[typ]
+        spec = {
+            "fqn": self.schema["fqn"],
+            "path": self.path,
+            "type": typ,
+            "range": {
+                "lower": lower.value() * self.scale,
+                "upper": upper.value() * self.scale,
+                "num_points": num_points.value(),
+                "randomise_order": randomise.isChecked(),
+            }
+        }
+        params["scan"].setdefault("axes", []).append(spec)
+
     def _scan_type_names(self) -> List[str]:
         return list(self.scan_types.keys())
 
@@ -764,6 +946,31 @@ class FloatOverrideEntry(OverrideEntry):
         layout.addWidget(self.box_refining_upper)
         layout.setStretchFactor(self.box_refining_upper, 1)
 
+    def _build_adaptive_ui(self, layout: QtWidgets.QLayout) -> None:
+        self.box_adaptive_lower = self._make_spin_box()
+        layout.addWidget(self.box_adaptive_lower)
+        layout.setStretchFactor(self.box_adaptive_lower, 1)
+
+        layout.addWidget(self._make_divider())
+
+        self.box_adaptive_channel = QtWidgets.QLineEdit()
+        self.box_adaptive_channel.setPlaceholderText("result channel")
+        self.box_adaptive_channel.setToolTip(
+            "Name of the result channel to refine the scan for")
+        self.box_adaptive_channel.textChanged.connect(self.value_changed)
+        layout.addWidget(self.box_adaptive_channel)
+        layout.setStretchFactor(self.box_adaptive_channel, 1)
+
+        self.box_adaptive_randomise = self._make_randomise_box()
+        layout.addWidget(self.box_adaptive_randomise)
+        layout.setStretchFactor(self.box_adaptive_randomise, 0)
+
+        layout.addWidget(self._make_divider())
+
+        self.box_adaptive_upper = self._make_spin_box()
+        layout.addWidget(self.box_adaptive_upper)
+        layout.setStretchFactor(self.box_adaptive_upper, 1)
+
     def _build_linear_ui(self, layout: QtWidgets.QLayout) -> None:
         self.box_linear_start = self._make_spin_box()
         layout.addWidget(self.box_linear_start)
@@ -793,6 +1000,35 @@ class FloatOverrideEntry(OverrideEntry):
         layout.addWidget(self.box_linear_stop)
         layout.setStretchFactor(self.box_linear_stop, 1)
 
+    def _build_sampled_ui(self, typ: str, layout: QtWidgets.QLayout) -> None:
+        lower = self._make_spin_box()
+        layout.addWidget(lower)
+        layout.setStretchFactor(lower, 1)
+
+        layout.addWidget(self._make_divider())
+
+        num_points = QtWidgets.QSpinBox()
+        num_points.setMinimum(1)
+        num_points.setValue(64)
+        num_points.setMaximum(0xffff)
+        num_points.setSuffix(" pts")
+        num_points.setToolTip("Total number of points, shared between all axes " +
+                              "sampled jointly using this method")
+        layout.addWidget(num_points)
+        layout.setStretchFactor(num_points, 0)
+
+        randomise = self._make_randomise_box()
+        layout.addWidget(randomise)
+        layout.setStretchFactor(randomise, 0)
+
+        layout.addWidget(self._make_divider())
+
+        upper = self._make_spin_box()
+        layout.addWidget(upper)
+        layout.setStretchFactor(upper, 1)
+
+        self.sampled_boxes[typ] = (lower, num_points, randomise, upper)
+
     def _build_list_ui(self, layout: QtWidgets.QLayout) -> None:
         class Validator(QtGui.QValidator):
             def validate(self, input, pos):
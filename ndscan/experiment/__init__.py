@@ -17,8 +17,9 @@ from experiment client code, like ``artiq.experiment`` does for upstream ARTIQ::
 import artiq.experiment
 from artiq.experiment import *
 
-from . import (default_analysis, entry_point, fragment, parameters, result_channels,
-               scan_generator, subscan)
+from . import (checkpoint, default_analysis, entry_point, fragment, parameters,
+               result_channels, scan_generator, streaming, subscan, timing)
+from .checkpoint import *
 from .default_analysis import *
 from .entry_point import *
 from .fragment import *
@@ -26,10 +27,13 @@ from .parameters import *
 from .result_channels import *
 from .scan_generator import *
 from .scan_runner import *
+from .streaming import *
 from .subscan import *
+from .timing import *
 
 __all__ = []
 __all__.extend(artiq.experiment.__all__)
+__all__.extend(checkpoint.__all__)
 __all__.extend(default_analysis.__all__)
 __all__.extend(entry_point.__all__)
 __all__.extend(fragment.__all__)
@@ -37,4 +41,6 @@ __all__.extend(parameters.__all__)
 __all__.extend(result_channels.__all__)
 __all__.extend(scan_generator.__all__)
 __all__.extend(scan_runner.__all__)
+__all__.extend(streaming.__all__)
 __all__.extend(subscan.__all__)
+__all__.extend(timing.__all__)
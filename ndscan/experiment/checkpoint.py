@@ -0,0 +1,193 @@
+"""
+Crash-safe checkpointing of scan progress, so that interrupted scans can be resumed.
+"""
+
+import hashlib
+import logging
+import os
+from sipyco import pyon
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Sequence
+from .result_channels import ResultSink, _to_value_list
+
+__all__ = ["ScanCheckpoint"]
+
+logger = logging.getLogger(__name__)
+
+#: Version of the checkpoint file format; files of other versions are ignored.
+CHECKPOINT_VERSION = 1
+
+
+class ScanCheckpoint:
+    """Records the coordinates and results of a scan as they are acquired, and
+    periodically saves them to a local file, along with the scan seed, so that the scan
+    can be resumed by a later run (e.g. after the master or worker process crashed)
+    without re-acquiring the completed points.
+
+    The sinks returned by :meth:`wrap_axis_sink`/:meth:`wrap_channel_sink` need to be
+    used in place of the original sinks for the values to be recorded. The number of
+    completed points is determined from the first axis; each result channel is assumed
+    to be pushed exactly once per point. Checkpoints are only written between points,
+    and the file is replaced atomically, so a crash never leaves a corrupted checkpoint
+    behind.
+
+    :param directory: The directory to store checkpoint files in.
+    :param name: A name identifying the scanned experiment (e.g. the fragment FQN),
+        used as the file name prefix.
+    :param fingerprint: A string describing everything that determines the points and
+        results of the scan (apart from the seed). Only checkpoints for scans with the
+        same fingerprint are resumed.
+    :param interval: The minimum interval between checkpoints, in seconds.
+    """
+    def __init__(self, directory: str, name: str, fingerprint: str, interval: float):
+        digest = hashlib.sha1(fingerprint.encode()).hexdigest()[:16]
+        self.path = os.path.join(directory, "{}_{}.pyon".format(name, digest))
+        self.fingerprint = fingerprint
+        self.interval = interval
+
+        self._seed = None
+        self._description = None
+        self._coordinates = []
+        self._channel_values = {}
+        self._num_complete = 0
+        self._last_save = time.monotonic()
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """Read the state saved by a previous run of the same scan, if any.
+
+        :return: A dictionary with the ``seed``, the number of completed points
+            (``num_points``), and the ``coordinates`` (a list per axis) and
+            ``channels`` (a dictionary of lists by channel name) acquired for them, or
+            ``None`` if there is no usable checkpoint.
+        """
+        try:
+            with open(self.path, "r") as f:
+                state = pyon.decode(f.read())
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logger.warning("Ignoring unreadable scan checkpoint '%s'",
+                           self.path,
+                           exc_info=True)
+            return None
+        if (state.get("version", None) != CHECKPOINT_VERSION
+                or state.get("fingerprint", None) != self.fingerprint):
+            logger.warning("Ignoring scan checkpoint '%s' for a different scan",
+                           self.path)
+            return None
+        return state
+
+    def start(self,
+              seed: int,
+              num_axes: int,
+              channel_names: List[str],
+              description: Dict[str, Any],
+              restored: Optional[Dict[str, Any]] = None) -> None:
+        """Start recording a scan.
+
+        :param seed: The seed of the scan point sequence.
+        :param num_axes: The number of scan axes.
+        :param channel_names: The names of the result channels to record.
+        :param description: Scan description (see :func:`.describe_scan`) to save along
+            with the data for reference.
+        :param restored: The state loaded from a previous checkpoint to continue from,
+            if any.
+        """
+        self._seed = seed
+        self._description = description
+        self._coordinates = [[] for _ in range(num_axes)]
+        self._channel_values = {name: [] for name in channel_names}
+        self._num_complete = 0
+        if restored:
+            for values, saved in zip(self._coordinates, restored["coordinates"]):
+                values.extend(saved)
+            for name, saved in restored["channels"].items():
+                if name in self._channel_values:
+                    self._channel_values[name].extend(saved)
+            self._num_complete = restored["num_points"]
+        self._last_save = time.monotonic()
+
+    def wrap_axis_sink(self, axis_idx: int, sink: ResultSink) -> ResultSink:
+        """Return a sink recording the coordinates along the given axis, and forwarding
+        them to ``sink``."""
+        return _CheckpointAxisSink(self, axis_idx, sink)
+
+    def wrap_channel_sink(self, name: str, sink: ResultSink) -> ResultSink:
+        """Return a sink recording the values of the given result channel, and
+        forwarding them to ``sink``."""
+        return _CheckpointChannelSink(self._channel_values[name], sink)
+
+    def save(self) -> None:
+        """Write the state of the scan as of the last completed point to the checkpoint
+        file."""
+        num_points = self._num_complete
+        state = {
+            "version": CHECKPOINT_VERSION,
+            "fingerprint": self.fingerprint,
+            "seed": self._seed,
+            "num_points": num_points,
+            "coordinates": [values[:num_points] for values in self._coordinates],
+            "channels": {
+                name: values[:num_points]
+                for name, values in self._channel_values.items()
+            },
+            "scan": self._description,
+        }
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=directory, delete=False) as f:
+            f.write(pyon.encode(state))
+            tmp_path = f.name
+        os.replace(tmp_path, self.path)
+        self._last_save = time.monotonic()
+
+    def remove(self) -> None:
+        """Delete the checkpoint file (e.g. once the scan has completed)."""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def _begin_point(self) -> None:
+        # The coordinates of the first axis are pushed once per point, after all
+        # values of the previous point have been pushed. (For kernel scans, the results
+        # of the new point are pushed before its coordinates, but those are simply
+        # truncated when saving.)
+        self._num_complete = len(self._coordinates[0])
+        if time.monotonic() - self._last_save >= self.interval:
+            self.save()
+
+
+class _CheckpointAxisSink(ResultSink):
+    def __init__(self, checkpoint: ScanCheckpoint, axis_idx: int, sink: ResultSink):
+        self._checkpoint = checkpoint
+        self._values = checkpoint._coordinates[axis_idx]
+        self._is_first = axis_idx == 0
+        self.sink = sink
+
+    def push(self, value: Any) -> None:
+        if self._is_first:
+            self._checkpoint._begin_point()
+        self._values.append(value)
+        self.sink.push(value)
+
+    def flush(self) -> None:
+        self.sink.flush()
+
+
+class _CheckpointChannelSink(ResultSink):
+    def __init__(self, values: List[Any], sink: ResultSink):
+        self._values = values
+        self.sink = sink
+
+    def push(self, value: Any) -> None:
+        self._values.append(value)
+        self.sink.push(value)
+
+    def push_many(self, values: Sequence[Any]) -> None:
+        self._values.extend(_to_value_list(values))
+        self.sink.push_many(values)
+
+    def flush(self) -> None:
+        self.sink.flush()
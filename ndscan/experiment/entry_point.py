@@ -16,19 +16,27 @@ from collections import OrderedDict
 from contextlib import suppress
 from functools import reduce
 import logging
-import random
+import numpy as np
+import os
 import time
-from typing import Any, Callable, Dict, Iterable, List, Tuple, Type
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Type
 
+from .checkpoint import ScanCheckpoint
 from .default_analysis import AnnotationContext
 from .fragment import (ExpFragment, Fragment, RestartKernelTransitoryError,
                        TransitoryError)
 from .parameters import ParamStore, type_string_to_param
-from .result_channels import (AppendingDatasetSink, LastValueSink, ScalarDatasetSink,
-                              ResultChannel)
-from .scan_generator import GENERATORS, ScanOptions
-from .scan_runner import (ScanAxis, ScanRunner, ScanSpec, describe_scan,
+from .result_channels import (AppendingDatasetSink, CoalescingAppendingDatasetSink,
+                              DecimatingDatasetSink, FanOutSink, LastValueSink,
+                              NumericChannel, PackedArrayChannel,
+                              PackedArrayDatasetSink, RepeatAggregator, ResultSink,
+                              ScalarDatasetSink, ResultChannel)
+from .scan_generator import (AdaptiveGenerator, GENERATORS, SampledGenerator, SAMPLERS,
+                             ScanOptions)
+from .scan_runner import (ScanAxis, ScanPlan, ScanRunner, ScanSpec, describe_scan,
                           describe_analyses, filter_default_analyses)
+from .streaming import HDF5Stream
+from .timing import TimingLog
 from .utils import dump_json, is_kernel, to_metadata_broadcast_type
 from ..utils import (merge_no_duplicates, NoAxesMode, PARAMS_ARG_KEY, SCHEMA_REVISION,
                      SCHEMA_REVISION_KEY, shorten_to_unambiguous_suffixes)
@@ -67,7 +75,18 @@ class FragmentScanExperiment(EnvExperiment):
     def build(self,
               fragment_init: Callable[[], ExpFragment],
               max_rtio_underflow_retries: int = 3,
-              max_transitory_error_retries: int = 10):
+              max_transitory_error_retries: int = 10,
+              batch_kernel_results: bool = False,
+              publish_host_results: bool = False,
+              num_host_processes: int = 1,
+              checkpoint_dir: Optional[str] = None,
+              checkpoint_interval: float = 60.0,
+              record_timing: bool = False,
+              append_flush_interval: Optional[float] = None,
+              max_pending_appends: int = 1024,
+              stream_dir: Optional[str] = None,
+              stream_window: int = 10000,
+              live_view_resolution: Optional[int] = None):
         """
         :param fragment_init: Callable to create the top-level :meth:`ExpFragment`
             instance.
@@ -75,10 +94,42 @@ class FragmentScanExperiment(EnvExperiment):
             point (by simply trying again) before giving up.
         :param max_transitory_error_retries: Number of transitory errors to tolerate per
             scan point (by simply trying again) before giving up.
+        :param batch_kernel_results: Whether to transfer results from the core device
+            to the host once per chunk of scan points; see :class:`.ScanRunner`.
+        :param publish_host_results: Whether to push results to the datasets from a
+            background thread during host scans; see :class:`.ScanRunner`.
+        :param num_host_processes: Number of processes to run host scans in parallel
+            with; see :class:`.ScanRunner`.
+        :param checkpoint_dir: Directory to periodically save the progress of scans
+            to, such that a later submission with the same arguments resumes from where
+            the scan was interrupted; see :class:`TopLevelRunner`.
+        :param checkpoint_interval: Minimum interval between checkpoints, in seconds.
+        :param record_timing: Whether to record the time spent in the different phases
+            of the scan; see :class:`TopLevelRunner`.
+        :param append_flush_interval: If given, batch the values appended to the
+            result datasets; see :class:`TopLevelRunner`.
+        :param max_pending_appends: See :class:`TopLevelRunner`.
+        :param stream_dir: Directory to stream the data of time series to, keeping
+            only a window of the most recent points in the datasets; see
+            :class:`TopLevelRunner`.
+        :param stream_window: See :class:`TopLevelRunner`.
+        :param live_view_resolution: If given, only broadcast a decimated view of time
+            series with (at least) this many points; see :class:`TopLevelRunner`.
         """
         self.fragment = fragment_init()
         self.max_rtio_underflow_retries = max_rtio_underflow_retries
         self.max_transitory_error_retries = max_transitory_error_retries
+        self.batch_kernel_results = batch_kernel_results
+        self.publish_host_results = publish_host_results
+        self.num_host_processes = num_host_processes
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoint_interval = checkpoint_interval
+        self.record_timing = record_timing
+        self.append_flush_interval = append_flush_interval
+        self.max_pending_appends = max_pending_appends
+        self.stream_dir = stream_dir
+        self.stream_window = stream_window
+        self.live_view_resolution = live_view_resolution
 
         self.args = ArgumentInterface(self, [self.fragment], scannable=True)
 
@@ -94,6 +145,7 @@ class FragmentScanExperiment(EnvExperiment):
             param_stores.setdefault(fqn, []).append((ax.path, ax.param_store))
 
         self.fragment.init_params(param_stores)
+        self.args.apply_channel_settings()
 
         for fqn, pairs in param_stores.items():
             for path, store in pairs:
@@ -109,9 +161,24 @@ class FragmentScanExperiment(EnvExperiment):
                                      "since made to the experiment code; try " +
                                      "Recompute All Arguments).")
 
-        self.tlr = TopLevelRunner(self, self.fragment, spec, no_axes_mode,
+        self.tlr = TopLevelRunner(self,
+                                  self.fragment,
+                                  spec,
+                                  no_axes_mode,
                                   self.max_rtio_underflow_retries,
-                                  self.max_transitory_error_retries)
+                                  self.max_transitory_error_retries,
+                                  batch_kernel_results=self.batch_kernel_results,
+                                  publish_host_results=self.publish_host_results,
+                                  num_host_processes=self.num_host_processes,
+                                  checkpoint_dir=self.checkpoint_dir,
+                                  checkpoint_interval=self.checkpoint_interval,
+                                  checkpoint_key=dump_json(self.args.get_params()),
+                                  record_timing=self.record_timing,
+                                  append_flush_interval=self.append_flush_interval,
+                                  max_pending_appends=self.max_pending_appends,
+                                  stream_dir=self.stream_dir,
+                                  stream_window=self.stream_window,
+                                  live_view_resolution=self.live_view_resolution)
 
     def run(self):
         self.tlr.create_applet(title="ndscan: " + self.fragment.fqn)
@@ -128,9 +195,11 @@ class ArgumentInterface(HasEnvironment):
 
         instances = dict()
         self._schemata = dict()
+        self._channels = dict()
         always_shown_params = []
         for fragment in fragments:
             fragment._collect_params(instances, self._schemata)
+            fragment._collect_result_channels(self._channels)
 
             for handle in fragment.get_always_shown_params():
                 path = handle.owner._stringize_path()
@@ -146,17 +215,29 @@ class ArgumentInterface(HasEnvironment):
             "instances": instances,
             "schemata": self._schemata,
             "always_shown": always_shown_params,
-            "overrides": {}
+            "overrides": {},
+            "channels": {
+                path: dict(channel.describe(), save_by_default=channel.save_by_default)
+                for path, channel in self._channels.items()
+            },
+            "channel_settings": {}
         }
         if scannable:
             desc["scan"] = {
                 "axes": [],
                 "num_repeats": 1,
                 "no_axes_mode": "single",
-                "randomise_order_globally": False
+                "randomise_order_globally": False,
+                "aggregate_repeats": False,
+                "archive_raw_repeats": False
             }
         self._params = self.get_argument(PARAMS_ARG_KEY, PYONValue(default=desc))
 
+    def get_params(self) -> Dict[str, Any]:
+        """Return the parameter override/scan specification submitted via the
+        :data:`PARAMS_ARG_KEY` argument."""
+        return self._params
+
     def make_override_stores(self) -> Dict[str, Tuple[str, ParamStore]]:
         stores = {}
         for fqn, specs in self._params.get("overrides", {}).items():
@@ -171,17 +252,53 @@ class ArgumentInterface(HasEnvironment):
                            for s in specs]
         return stores
 
+    def apply_channel_settings(self) -> None:
+        """Mute result channels and select whether to save them as specified in the
+        ``channel_settings`` of the :data:`PARAMS_ARG_KEY` argument (a dictionary
+        mapping channel paths to dictionaries with optional ``save`` and ``muted``
+        entries).
+
+        Muted channels discard any values pushed to them without coercing them to the
+        channel type or forwarding them to a sink, and are omitted from the scan
+        description altogether.
+        """
+        for path, settings in self._params.get("channel_settings", {}).items():
+            channel = self._channels.get(path, None)
+            if channel is None:
+                raise ValueError(f"Settings given for result channel '{path}', which " +
+                                 "does not exist (likely due to changes since made " +
+                                 "to the experiment code; try Recompute All " +
+                                 "Arguments).")
+            if "save" in settings:
+                channel.save_by_default = settings["save"]
+            if "muted" in settings:
+                channel.set_muted(settings["muted"])
+
     def make_scan_spec(self) -> Tuple[ScanSpec, NoAxesMode]:
         scan = self._params.get("scan", {})
 
         generators = []
         axes = []
+        samplers = {}
         for axspec in scan.get("axes", []):
-            generator_class = GENERATORS.get(axspec["type"], None)
-            if not generator_class:
-                raise ScanSpecError("Axis type '{}' not implemented".format(
-                    axspec["type"]))
-            generator = generator_class(**axspec["range"])
+            typ = axspec["type"]
+            if typ in SAMPLERS:
+                # All axes of the same sampled type are scanned jointly.
+                rang = axspec["range"]
+                sampler = samplers.get(typ, None)
+                if sampler is None:
+                    sampler = SAMPLERS[typ](rang["num_points"], rang["randomise_order"])
+                    samplers[typ] = sampler
+                elif sampler.num_points != rang["num_points"]:
+                    raise ScanSpecError(
+                        "All '{}' axes need to have the same number of points".format(
+                            typ))
+                generator = SampledGenerator(sampler, rang["lower"], rang["upper"])
+            else:
+                generator_class = GENERATORS.get(typ, None)
+                if not generator_class:
+                    raise ScanSpecError("Axis type '{}' not implemented".format(typ))
+                generator = generator_class(**axspec["range"])
             generators.append(generator)
 
             fqn = axspec["fqn"]
@@ -189,11 +306,14 @@ class ArgumentInterface(HasEnvironment):
 
             store_type = type_string_to_param(self._schemata[fqn]["type"]).StoreType
             store = store_type((fqn, pathspec),
-                               generator.points_for_level(0, random)[0])
+                               generator.points_for_level(0, np.random)[0])
             axes.append(ScanAxis(self._schemata[fqn], pathspec, store))
 
         options = ScanOptions(scan.get("num_repeats", 1),
-                              scan.get("randomise_order_globally", False))
+                              scan.get("randomise_order_globally", False),
+                              aggregate_repeats=scan.get("aggregate_repeats", False),
+                              archive_raw_repeats=scan.get("archive_raw_repeats",
+                                                           False))
         no_axes_mode = NoAxesMode[scan.get("no_axes_mode", "single")]
         spec = ScanSpec(axes, generators, options)
         return spec, no_axes_mode
@@ -206,11 +326,85 @@ class TopLevelRunner(HasEnvironment):
               no_axes_mode: NoAxesMode = NoAxesMode.single,
               max_rtio_underflow_retries: int = 3,
               max_transitory_error_retries: int = 10,
-              dataset_prefix: str = "ndscan."):
+              dataset_prefix: str = "ndscan.",
+              batch_kernel_results: bool = False,
+              publish_host_results: bool = False,
+              num_host_processes: int = 1,
+              checkpoint_dir: Optional[str] = None,
+              checkpoint_interval: float = 60.0,
+              checkpoint_key: str = "",
+              record_timing: bool = False,
+              append_flush_interval: Optional[float] = None,
+              max_pending_appends: int = 1024,
+              stream_dir: Optional[str] = None,
+              stream_window: int = 10000,
+              live_view_resolution: Optional[int] = None):
+        """
+        :param fragment: The top-level fragment to run.
+        :param spec: The scan to run (without any axes for single runs/continuous
+            operation/time series).
+        :param no_axes_mode: Mode of operation if ``spec`` does not have any axes.
+        :param max_rtio_underflow_retries: Number of RTIOUnderflows to tolerate per scan
+            point (by simply trying again) before giving up.
+        :param max_transitory_error_retries: Number of transitory errors to tolerate per
+            scan point (by simply trying again) before giving up.
+        :param dataset_prefix: Prefix for the keys of the datasets written.
+        :param batch_kernel_results: See :class:`.ScanRunner`.
+        :param publish_host_results: See :class:`.ScanRunner`.
+        :param num_host_processes: See :class:`.ScanRunner`.
+        :param checkpoint_dir: If given, the progress of scans (coordinates and results
+            acquired so far, and the scan seed) is periodically saved to a file in this
+            directory, and the scan is resumed from there if the same scan is run again
+            (e.g. after a crash or termination), skipping the already completed points.
+            The checkpoint is removed once the scan completes. Not supported for scans
+            the points of which depend on the results (e.g. adaptive scans).
+        :param checkpoint_interval: Minimum interval between checkpoints, in seconds.
+        :param checkpoint_key: Any extra information identifying the scan (e.g. the
+            submitted arguments) that needs to match for a checkpoint to be resumed.
+        :param record_timing: Whether to record the time spent in the different phases
+            of scans (see :class:`.ScanRunner`) and the ``total`` time spent in
+            :meth:`run`. The recorded durations are saved as ``timing.<phase>``
+            datasets, and summary statistics as the ``timing.summary`` dataset (a JSON
+            string of the statistics computed by :meth:`.TimingLog.summarise`).
+        :param append_flush_interval: If given, the values appended to the
+            ``points.*`` datasets are buffered, and written in batches at most this
+            many seconds apart (see :class:`.CoalescingAppendingDatasetSink`), rather
+            than with one dataset modification per value. This considerably reduces
+            the load on the master and the applets for fast scans. All values are
+            written before the experiment is paused, and when the scan finishes.
+        :param max_pending_appends: The maximum number of values to buffer per dataset
+            if ``append_flush_interval`` is given.
+        :param stream_dir: If given, the timestamps and results of time series are
+            streamed to an HDF5 file in this directory (named after the RID and the
+            fragment FQN; see :class:`.HDF5Stream`), which also contains the scan
+            metadata. Only a window of the most recent points is kept in the
+            ``points.*`` datasets, so that memory usage does not grow over time. The
+            path of the file is stored in the ``stream_file`` dataset.
+        :param stream_window: The number of most recent points to keep in the datasets
+            if ``stream_dir`` is given.
+        :param live_view_resolution: If given, the timestamps and results of time
+            series are archived at full resolution without being broadcast, and only
+            a decimated view with between this many and twice as many points (the mean,
+            minimum and maximum of consecutive bins; see
+            :class:`.DecimatingDatasetSink`) is broadcast in the ``live_points.*``
+            datasets for numeric result channels. Both are described by the
+            ``point_views`` dataset. Cannot be combined with ``stream_dir``.
+        """
         self.fragment = fragment
         self.spec = spec
         self.max_rtio_underflow_retries = max_rtio_underflow_retries
         self.max_transitory_error_retries = max_transitory_error_retries
+        self.batch_kernel_results = batch_kernel_results
+        self.publish_host_results = publish_host_results
+        self.num_host_processes = num_host_processes
+        self._timing_log = TimingLog() if record_timing else None
+        self.append_flush_interval = append_flush_interval
+        self.max_pending_appends = max_pending_appends
+        self.stream_dir = stream_dir
+        self.stream_window = stream_window
+        self.live_view_resolution = live_view_resolution
+        self._stream = None
+        self._metadata = {}
 
         if dataset_prefix and dataset_prefix[-1] != ".":
             # Add trailing dot to dataset prefix if not given – the same bare prefix
@@ -219,6 +413,10 @@ class TopLevelRunner(HasEnvironment):
             dataset_prefix += "."
         self.dataset_prefix = dataset_prefix
 
+        if stream_dir is not None and live_view_resolution is not None:
+            raise ValueError("Time series can either be streamed to a file or "
+                             "broadcast as a decimated live view, not both")
+
         self.setattr_device("ccb")
         self.setattr_device("core")
         self.setattr_device("scheduler")
@@ -227,6 +425,14 @@ class TopLevelRunner(HasEnvironment):
         self._continue_running = False
         self._is_time_series = False
 
+        # Repeats of the same point can only be aggregated for actual scans (time
+        # series points are all distinct anyway).
+        self._repeat_aggregator = None
+        if self.spec.axes and self.spec.options.aggregate_repeats:
+            self._repeat_aggregator = RepeatAggregator(
+                self, len(self.spec.axes), self.dataset_prefix,
+                self.spec.options.archive_raw_repeats)
+
         if not self.spec.axes:
             self._continue_running = no_axes_mode != NoAxesMode.single
             if no_axes_mode == NoAxesMode.time_series:
@@ -253,19 +459,34 @@ class TopLevelRunner(HasEnvironment):
         self._scan_result_sinks = {}
         self._short_child_channel_names = {}
         for path, channel in chan_dict.items():
-            if not channel.save_by_default:
+            if channel.is_muted() or not channel.save_by_default:
                 continue
             name = chan_name_map[path].replace("/", "_")
             self._short_child_channel_names[channel] = name
 
-            if self.spec.axes:
-                sink = AppendingDatasetSink(
+            if self._repeat_aggregator:
+                sink = self._repeat_aggregator.make_channel_sink(channel, name)
+            elif self.spec.axes and isinstance(channel, PackedArrayChannel):
+                sink = PackedArrayDatasetSink(
                     self, self.dataset_prefix + "points.channel_" + name)
+            elif self._is_time_series:
+                sink = self._make_time_series_sink("channel_" + name,
+                                                   isinstance(channel, NumericChannel))
+            elif self.spec.axes:
+                sink = self._make_appending_sink("points.channel_" + name)
             else:
                 sink = ScalarDatasetSink(self, self.dataset_prefix + "point." + name)
             channel.set_sink(sink)
             self._scan_result_sinks[channel] = sink
 
+        if self._repeat_aggregator:
+            clashes = set(self._repeat_aggregator.get_derived_channel_names()) & set(
+                self._short_child_channel_names.values())
+            if clashes:
+                raise ScanSpecError(
+                    "Cannot aggregate repeats, as result channel names clash with "
+                    "derived channels: {}".format(", ".join(sorted(clashes))))
+
         # Filter analyses, set up analysis result channels, and keep track of all the
         # names in the annotation context.
         self._analyses = filter_default_analyses(self.fragment, self.spec.axes)
@@ -288,10 +509,46 @@ class TopLevelRunner(HasEnvironment):
 
         self._coordinate_sinks = None
 
+        # The scan plan (expected number of points, etc.), if this is an actual scan.
+        self._plan = None
+        if self.spec.generators:
+            self._plan = self.spec.plan({
+                name: channel
+                for channel, name in self._short_child_channel_names.items()
+            })
+
+        self._checkpoint = None
+        if checkpoint_dir is not None and self.spec.generators:
+            if any(g.depends_on_results for g in self.spec.generators):
+                logger.warning("Cannot checkpoint scans the points of which depend "
+                               "on the results; not saving progress")
+            else:
+                self._checkpoint = ScanCheckpoint(
+                    checkpoint_dir, self.fragment.fqn,
+                    self._make_checkpoint_fingerprint(checkpoint_key),
+                    checkpoint_interval)
+
         self.fragment.prepare()
 
     def run(self):
         """Run the (possibly trivial) scan."""
+        start = time.perf_counter()
+        try:
+            return self._run()
+        finally:
+            # Write any buffered values also if the scan was interrupted.
+            self._flush_sinks()
+            if self._timing_log:
+                self._timing_log.record("total", time.perf_counter() - start)
+                self._save_timing()
+
+    def _run(self):
+        restored = None
+        if self._checkpoint:
+            restored = self._checkpoint.load()
+            if restored:
+                # Continue with the same sequence of points.
+                self.spec.options.seed = restored["seed"]
         self._broadcast_metadata()
 
         if not self.spec.axes and not self._is_time_series:
@@ -299,26 +556,176 @@ class TopLevelRunner(HasEnvironment):
             return None, {c: s.get_last() for c, s in self._scan_result_sinks.items()}
 
         if self._is_time_series:
-            self._timestamp_sink = AppendingDatasetSink(
-                self, self.dataset_prefix + "points.axis_0")
+            if self.stream_dir is None:
+                self._timestamp_sink = self._make_time_series_sink("axis_0", True)
+            else:
+                self._start_stream()
             self._coordinate_sinks = [self._timestamp_sink]
             self._time_series_start = time.monotonic()
-            self._run_continuous()
+            try:
+                self._run_continuous()
+            finally:
+                if self._stream:
+                    self._stream.close()
         else:
             runner = ScanRunner(
                 self,
                 max_rtio_underflow_retries=self.max_rtio_underflow_retries,
-                max_transitory_error_retries=self.max_transitory_error_retries)
-            self._coordinate_sinks = [
-                AppendingDatasetSink(self,
-                                     self.dataset_prefix + "points.axis_{}".format(i))
-                for i in range(len(self.spec.axes))
-            ]
-            runner.run(self.fragment, self.spec, self._coordinate_sinks)
+                max_transitory_error_retries=self.max_transitory_error_retries,
+                batch_kernel_results=self.batch_kernel_results,
+                publish_host_results=self.publish_host_results,
+                num_host_processes=self.num_host_processes,
+                timing_log=self._timing_log)
+            if self._repeat_aggregator:
+                self._coordinate_sinks = [
+                    self._repeat_aggregator.make_axis_sink(i)
+                    for i in range(len(self.spec.axes))
+                ]
+            else:
+                self._coordinate_sinks = [
+                    self._make_appending_sink("points.axis_{}".format(i))
+                    for i in range(len(self.spec.axes))
+                ]
+            self._connect_adaptive_feedback()
+            if self._checkpoint:
+                self._run_checkpointed_scan(runner, restored)
+            else:
+                progress = _ProgressSink(self, self._coordinate_sinks[0], self._plan)
+                runner.run(self.fragment, self.spec,
+                           [progress] + self._coordinate_sinks[1:])
+                progress.broadcast_progress()
             self._set_completed()
 
         return self._make_coordinate_dict(), self._make_value_dict()
 
+    def _run_checkpointed_scan(self, runner: ScanRunner,
+                               restored: Optional[Dict[str, Any]]) -> None:
+        checkpoint = self._checkpoint
+        names = self._short_child_channel_names
+        checkpoint.start(self.spec.options.seed, len(self.spec.axes),
+                         list(names.values()), self._scan_desc, restored)
+
+        start_index = 0
+        if restored:
+            # Re-populate the sinks with the previously acquired data.
+            start_index = restored["num_points"]
+            logger.info("Resuming scan from checkpoint at point %s", start_index)
+            for sink, values in zip(self._coordinate_sinks, restored["coordinates"]):
+                for value in values:
+                    sink.push(value)
+            sinks_by_name = {
+                name: self._scan_result_sinks[c]
+                for c, name in names.items()
+            }
+            for name, values in restored["channels"].items():
+                sink = sinks_by_name.get(name, None)
+                if sink is None:
+                    continue
+                for value in values:
+                    sink.push(value)
+
+        progress = _ProgressSink(self, self._coordinate_sinks[0], self._plan,
+                                 start_index)
+        axis_sinks = [
+            checkpoint.wrap_axis_sink(i, sink)
+            for i, sink in enumerate([progress] + self._coordinate_sinks[1:])
+        ]
+        for channel, name in names.items():
+            channel.set_sink(checkpoint.wrap_channel_sink(name, channel.sink))
+        completed = False
+        try:
+            runner.run(self.fragment, self.spec, axis_sinks, start_index)
+            completed = True
+        finally:
+            for channel, sink in self._scan_result_sinks.items():
+                channel.set_sink(sink)
+            if completed:
+                checkpoint.remove()
+            else:
+                checkpoint.save()
+        progress.broadcast_progress()
+
+    def _start_stream(self):
+        os.makedirs(self.stream_dir, exist_ok=True)
+        path = os.path.join(self.stream_dir,
+                            "{:09}-{}.h5".format(self.scheduler.rid, self.fragment.fqn))
+        stream = HDF5Stream(self, path, self.stream_window)
+        for name, value in self._metadata.items():
+            stream.set_metadata(self.dataset_prefix + name, value)
+        self._timestamp_sink = stream.make_sink(self.dataset_prefix + "points.axis_0",
+                                                np.float64)
+        for channel, name in self._short_child_channel_names.items():
+            sink = stream.make_channel_sink(
+                self.dataset_prefix + "points.channel_" + name, channel)
+            channel.set_sink(sink)
+            self._scan_result_sinks[channel] = sink
+        stream.start()
+        self._stream = stream
+        self.set_dataset(self.dataset_prefix + "stream_file", path, broadcast=True)
+
+    def _make_appending_sink(self,
+                             name: str,
+                             broadcast: bool = True) -> AppendingDatasetSink:
+        key = self.dataset_prefix + name
+        if self.append_flush_interval is None:
+            return AppendingDatasetSink(self, key, broadcast)
+        return CoalescingAppendingDatasetSink(self,
+                                              key,
+                                              broadcast,
+                                              max_pending=self.max_pending_appends,
+                                              flush_interval=self.append_flush_interval)
+
+    def _make_time_series_sink(self, name: str, is_numeric: bool) -> ResultSink:
+        if self.live_view_resolution is None:
+            return self._make_appending_sink("points." + name)
+        archive = self._make_appending_sink("points." + name, broadcast=False)
+        if not is_numeric:
+            return archive
+        live = DecimatingDatasetSink(self, self.dataset_prefix + "live_points." + name,
+                                     self.live_view_resolution)
+        return FanOutSink([archive, live])
+
+    def _flush_sinks(self):
+        for sink in (self._coordinate_sinks or []) + list(
+                self._scan_result_sinks.values()):
+            sink.flush()
+
+    def _make_checkpoint_fingerprint(self, key: str) -> str:
+        options = self.spec.options
+        return dump_json({
+            "fragment_fqn":
+            self.fragment.fqn,
+            "axes": [(a.param_schema["fqn"], a.path) for a in self.spec.axes],
+            "num_repeats":
+            options.num_repeats,
+            "randomise_order_globally":
+            options.randomise_order_globally,
+            "aggregate_repeats":
+            options.aggregate_repeats,
+            "archive_raw_repeats":
+            options.archive_raw_repeats,
+            "channels":
+            sorted(self._short_child_channel_names.values()),
+            "key":
+            key
+        })
+
+    def _connect_adaptive_feedback(self):
+        sinks_by_name = {
+            name: self._scan_result_sinks[channel]
+            for channel, name in self._short_child_channel_names.items()
+        }
+        for generator, coordinate_sink in zip(self.spec.generators,
+                                              self._coordinate_sinks):
+            if not isinstance(generator, AdaptiveGenerator) or not generator.channel:
+                continue
+            value_sink = sinks_by_name.get(generator.channel, None)
+            if value_sink is None:
+                raise ScanSpecError(
+                    "Result channel '{}' for adaptive scan not found".format(
+                        generator.channel))
+            generator.set_feedback_sinks(coordinate_sink, value_sink)
+
     def _make_coordinate_dict(self):
         return OrderedDict(((a.param_schema["fqn"], a.path), s.get_all())
                            for a, s in zip(self.spec.axes, self._coordinate_sinks))
@@ -370,6 +777,7 @@ class TopLevelRunner(HasEnvironment):
                             break
                 finally:
                     self.fragment.host_cleanup()
+                self._flush_sinks()
                 self.scheduler.pause()
         finally:
             self._set_completed()
@@ -424,13 +832,27 @@ class TopLevelRunner(HasEnvironment):
                          broadcast=True)
         if self._is_time_series:
             self._timestamp_sink.push(time.monotonic() - self._time_series_start)
+            if self._stream:
+                self._stream.end_point()
+
+    def _save_timing(self):
+        for phase in self._timing_log.get_phases():
+            self.set_dataset(self.dataset_prefix + "timing." + phase,
+                             self._timing_log.get_durations(phase),
+                             broadcast=False)
+        self.set_dataset(self.dataset_prefix + "timing.summary",
+                         dump_json(self._timing_log.summarise()),
+                         broadcast=True)
 
     def _set_completed(self):
         self.set_dataset(self.dataset_prefix + "completed", True, broadcast=True)
+        if self._stream:
+            self._stream.set_metadata(self.dataset_prefix + "completed", True)
 
     def _broadcast_metadata(self):
         def push(name, value):
             self.set_dataset(self.dataset_prefix + name, value, broadcast=True)
+            self._metadata[name] = value
 
         push(SCHEMA_REVISION_KEY, SCHEMA_REVISION)
 
@@ -443,10 +865,28 @@ class TopLevelRunner(HasEnvironment):
                                         self._short_child_channel_names)
         self._scan_desc.update(
             describe_analyses(self._analyses, self._annotation_context))
+        if self._repeat_aggregator:
+            self._scan_desc["channels"].update(
+                self._repeat_aggregator.describe_channels())
+        if self._plan:
+            self._scan_desc["plan"] = self._plan.describe()
         self._scan_desc["analysis_results"] = {
             name: channel.describe()
             for name, channel in self._analysis_results.items()
         }
+        if self._is_time_series and self.live_view_resolution is not None:
+            self._scan_desc["point_views"] = {
+                "full": {
+                    "prefix": "points.",
+                    "broadcast": False
+                },
+                "live": {
+                    "prefix": "live_points.",
+                    "kind": "decimated",
+                    "resolution": self.live_view_resolution,
+                    "statistics": list(DecimatingDatasetSink.STATISTICS)
+                }
+            }
 
         for name, value in self._scan_desc.items():
             # Flatten arrays/dictionaries to JSON strings for HDF5 compatibility.
@@ -467,6 +907,75 @@ class TopLevelRunner(HasEnvironment):
         self.ccb.issue("create_applet", title, cmd, group=group)
 
 
+class _ProgressSink(ResultSink):
+    """Forwards the coordinates of a scan axis to another sink, counting the number of
+    points acquired to periodically broadcast the measured time per point and the
+    estimated time of completion.
+
+    For unbounded scans, the estimate refers to the end of the current level.
+    """
+
+    #: Minimum interval between dataset updates, in seconds.
+    UPDATE_INTERVAL = 1.0
+
+    def __init__(self,
+                 runner: TopLevelRunner,
+                 sink: ResultSink,
+                 plan: ScanPlan,
+                 num_skipped: int = 0):
+        """
+        :param num_skipped: The number of points acquired previously (e.g. before
+            resuming the scan from a checkpoint), which count towards the progress, but
+            not the time per point.
+        """
+        self._runner = runner
+        self._sink = sink
+        self._plan = plan
+        self._num_skipped = num_skipped
+        self._num_points = num_skipped
+        self._start_time = time.monotonic()
+        self._last_update = self._start_time
+
+    def push(self, value: Any) -> None:
+        self._sink.push(value)
+        self._num_points += 1
+        now = time.monotonic()
+        if now - self._last_update >= self.UPDATE_INTERVAL:
+            self.broadcast_progress()
+
+    def broadcast_progress(self) -> None:
+        """Update the progress datasets (if any points have been acquired)."""
+        if self._num_points == self._num_skipped:
+            return
+        now = time.monotonic()
+        self._last_update = now
+        time_per_point = (now - self._start_time) / (self._num_points -
+                                                     self._num_skipped)
+
+        end = self._plan.num_points
+        if end is None:
+            for level in range(len(self._plan.points_per_level)):
+                level_end = self._plan.num_points_after_level(level)
+                if level_end is None or level_end > self._num_points:
+                    end = level_end
+                    break
+        eta = None
+        if end is not None:
+            eta = time.time() + max(0, end - self._num_points) * time_per_point
+
+        def push(name, value):
+            self._runner.set_dataset(self._runner.dataset_prefix + "progress." + name,
+                                     value,
+                                     broadcast=True)
+
+        push("num_points", self._num_points)
+        push("time_per_point", time_per_point)
+        push("eta", float("nan") if eta is None else eta)
+
+    def flush(self) -> None:
+        self._sink.flush()
+
+
 def _shorten_result_channel_names(full_names: Iterable[str]) -> Dict[str, str]:
     return shorten_to_unambiguous_suffixes(full_names,
                                            lambda fqn, n: "/".join(fqn.split("/")[-n:]))
@@ -476,7 +985,18 @@ def make_fragment_scan_exp(
         fragment_class: Type[ExpFragment],
         *args,
         max_rtio_underflow_retries: int = 3,
-        max_transitory_error_retries: int = 10) -> Type[FragmentScanExperiment]:
+        max_transitory_error_retries: int = 10,
+        batch_kernel_results: bool = False,
+        publish_host_results: bool = False,
+        num_host_processes: int = 1,
+        checkpoint_dir: Optional[str] = None,
+        checkpoint_interval: float = 60.0,
+        record_timing: bool = False,
+        append_flush_interval: Optional[float] = None,
+        max_pending_appends: int = 1024,
+        stream_dir: Optional[str] = None,
+        stream_window: int = 10000,
+        live_view_resolution: Optional[int] = None) -> Type[FragmentScanExperiment]:
     """Create a :class:`FragmentScanExperiment` subclass that scans the given
     :class:`.ExpFragment`, ready to be picked up by the ARTIQ explorer/…
 
@@ -495,7 +1015,18 @@ def make_fragment_scan_exp(
         def build(self):
             super().build(lambda: fragment_class(self, [], *args),
                           max_rtio_underflow_retries=max_rtio_underflow_retries,
-                          max_transitory_error_retries=max_transitory_error_retries)
+                          max_transitory_error_retries=max_transitory_error_retries,
+                          batch_kernel_results=batch_kernel_results,
+                          publish_host_results=publish_host_results,
+                          num_host_processes=num_host_processes,
+                          checkpoint_dir=checkpoint_dir,
+                          checkpoint_interval=checkpoint_interval,
+                          record_timing=record_timing,
+                          append_flush_interval=append_flush_interval,
+                          max_pending_appends=max_pending_appends,
+                          stream_dir=stream_dir,
+                          stream_window=stream_window,
+                          live_view_resolution=live_view_resolution)
 
     # Take on the name of the fragment class to keep result file names informative.
     FragmentScanShim.__name__ = fragment_class.__name__
@@ -5,7 +5,7 @@ import logging
 from typing import Any, Dict, List, Iterable, Type, Tuple, Union
 
 from .default_analysis import DefaultAnalysis
-from .parameters import ParamHandle, ParamStore
+from .parameters import ParamChangeFlag, ParamHandle, ParamStore
 from .result_channels import ResultChannel, FloatChannel
 from .utils import path_matches_spec
 from ..utils import strip_prefix
@@ -17,6 +17,16 @@ logger = logging.getLogger(__name__)
 
 class Fragment(HasEnvironment):
     """Main building block."""
+
+    #: Whether :meth:`device_setup` only needs to be called again if any of the
+    #: parameters of this fragment or its subfragments have changed since the last
+    #: call (within the same kernel). If set for all fragments in a subtree, the
+    #: parent's :meth:`device_setup_subfragments` skips the whole subtree unless one
+    #: of its parameters was modified, which can cut the per-point overhead of deep
+    #: fragment trees considerably. Only enable this for fragments that do not keep
+    #: any other state relevant to :meth:`device_setup`.
+    skip_unchanged_device_setup = False
+
     def build(self, fragment_path: List[str], *args, **kwargs):
         """Initialise this fragment instance; called from the ``HasEnvironment``
         constructor.
@@ -55,6 +65,14 @@ class Fragment(HasEnvironment):
         #: for subscans).
         self._absorbed_results_subfragments = set()
 
+        #: Set whenever a parameter of this fragment or any of its subfragments
+        #: changes; cleared by the parent after calling :meth:`device_setup` (see
+        #: :attr:`skip_unchanged_device_setup`).
+        self._subtree_changed = ParamChangeFlag()
+
+        #: All ParamHandles of this fragment and its subfragments.
+        self._subtree_param_handles = []
+
         klass = self.__class__
         mod = klass.__module__
         # KLUDGE: Strip prefix added by file_import() to make path matches compatible
@@ -75,16 +93,35 @@ class Fragment(HasEnvironment):
         self.build_fragment(*args, **kwargs)
         self._building = False
 
+        #: Whether device_setup() can be skipped for the whole subtree if none of its
+        #: parameters changed.
+        self._subtree_skips_unchanged_device_setup = (
+            self.skip_unchanged_device_setup
+            and all(s._subtree_skips_unchanged_device_setup
+                    for s in self._subfragments))
+
         # Now that we know all subfragments, synthesise code for device_setup() and
-        # device_cleanup() to forward to subfragments.
-        self._device_setup_subfragments_impl = kernel_from_string(["self"], "\n".join([
-            "self.{}.device_setup()".format(s._fragment_path[-1])
-            for s in self._subfragments
-        ]) or "pass", portable)
+        # device_cleanup() to forward to subfragments. Subtrees that opted into
+        # skipping device_setup() are only set up if any of their parameters changed,
+        # and are marked as changed again on cleanup to start afresh on the next
+        # kernel entry.
+        code = ""
+        for s in self._subfragments:
+            frag = "self." + s._fragment_path[-1]
+            if s._subtree_skips_unchanged_device_setup:
+                code += "if {}._subtree_changed.changed:\n".format(frag)
+                code += "    {}.device_setup()\n".format(frag)
+                code += "    {}._subtree_changed.changed = False\n".format(frag)
+            else:
+                code += "{}.device_setup()\n".format(frag)
+        self._device_setup_subfragments_impl = kernel_from_string(
+            ["self"], code[:-1] if code else "pass", portable)
 
         code = ""
         for s in self._subfragments[::-1]:
             frag = "self." + s._fragment_path[-1]
+            if s._subtree_skips_unchanged_device_setup:
+                code += "{}._subtree_changed.changed = True\n".format(frag)
             code += "try:\n"
             code += "    {}.device_cleanup()\n".format(frag)
             code += "except Exception:\n"
@@ -286,6 +323,10 @@ class Fragment(HasEnvironment):
         self._subfragments.append(frag)
         setattr(self, name, frag)
 
+        for handle in frag._subtree_param_handles:
+            handle._change_flags.append(self._subtree_changed)
+        self._subtree_param_handles += frag._subtree_param_handles
+
         return frag
 
     def setattr_param(self, name: str, param_class: Type, description: str, *args,
@@ -311,6 +352,7 @@ class Fragment(HasEnvironment):
         self._free_params[name] = param_class(fqn, description, *args, **kwargs)
 
         handle = param_class.HandleType(self, name)
+        self._register_param_handle(handle)
         setattr(self, name, handle)
         return handle
 
@@ -360,6 +402,7 @@ class Fragment(HasEnvironment):
             setattr(param, k, v)
         self._free_params[name] = param
         handle = param.HandleType(self, name)
+        self._register_param_handle(handle)
         setattr(self, name, handle)
 
         # Deregister it from the original owner and make sure we set the store
@@ -558,6 +601,10 @@ class Fragment(HasEnvironment):
     def _get_all_handles_for_param(self, name: str) -> List[ParamHandle]:
         return [getattr(self, name)] + self._rebound_subfragment_params.get(name, [])
 
+    def _register_param_handle(self, handle: ParamHandle) -> None:
+        handle._change_flags.append(self._subtree_changed)
+        self._subtree_param_handles.append(handle)
+
     def _stringize_path(self) -> str:
         return "/".join(self._fragment_path)
 
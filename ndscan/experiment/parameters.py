@@ -10,6 +10,7 @@
 
 from artiq.language import *
 from artiq.language import units
+import numpy as np
 from typing import Any, Callable, Dict, Optional, Tuple, Type, Union
 from ..utils import eval_param_default
 
@@ -61,7 +62,7 @@ class FloatParamStore(ParamStore):
     @portable
     def _notify_handles(self):
         for h in self._handles:
-            h._changed_after_use = True
+            h._change_cb()
 
     @portable
     def _do_nothing(self):
@@ -83,12 +84,16 @@ class FloatParamStore(ParamStore):
     def coerce(self, value):
         return float(value)
 
+    @host_only
+    def coerce_array(self, values) -> np.ndarray:
+        return np.asarray(values, dtype=np.float64)
+
 
 class IntParamStore(ParamStore):
     @portable
     def _notify_handles(self):
         for h in self._handles:
-            h._changed_after_use = True
+            h._change_cb()
 
     @portable
     def _do_nothing(self):
@@ -110,12 +115,22 @@ class IntParamStore(ParamStore):
     def coerce(self, value):
         return int(value)
 
+    @host_only
+    def coerce_array(self, values) -> np.ndarray:
+        values = np.asarray(values)
+        if values.dtype.kind in "fc" and not np.all(np.isfinite(values)):
+            # Match int(), which refuses to convert NaN/infinity, rather than silently
+            # producing arbitrary integers.
+            raise ValueError("Cannot convert non-finite values to int: {}".format(
+                values[~np.isfinite(values)]))
+        return values.astype(np.int64)
+
 
 class StringParamStore(ParamStore):
     @portable
     def _notify_handles(self):
         for h in self._handles:
-            h._changed_after_use = True
+            h._change_cb()
 
     @portable
     def _do_nothing(self):
@@ -137,6 +152,22 @@ class StringParamStore(ParamStore):
     def coerce(self, value):
         return str(value)
 
+    @host_only
+    def coerce_array(self, values) -> np.ndarray:
+        return np.asarray(values).astype(str)
+
+
+class ParamChangeFlag:
+    """Flag set whenever any of a number of parameters changes.
+
+    Used by :class:`.Fragment` to track, per fragment subtree, whether any parameter
+    was modified since the last :meth:`.Fragment.device_setup` call. Parameter
+    handles set all the flags they are registered with on change; the flag is only
+    ever cleared by its owner.
+    """
+    def __init__(self):
+        self.changed = True
+
 
 class ParamHandle:
     """
@@ -156,17 +187,23 @@ class ParamHandle:
         self._store = None
         self._changed_after_use = True
 
+        #: :class:`ParamChangeFlag`\ s to set when the parameter value changes (those
+        #: of the owning fragment and all its parents).
+        self._change_flags = []
+
     def set_store(self, store) -> None:
         if self._store:
             self._store.unregister_handle(self)
         store.register_handle(self)
         self._store = store
-        self._changed_after_use = True
+        self._change_cb()
 
     @portable
     def _change_cb(self):
         # Once transform lambdas are supported, handle them here.
         self._changed_after_use = True
+        for f in self._change_flags:
+            f.changed = True
 
     @portable
     def changed_after_use(self) -> TBool:
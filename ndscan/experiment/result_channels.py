@@ -2,14 +2,23 @@
 Result handling building blocks.
 """
 
+from array import array
 from artiq.language import HasEnvironment, rpc
 import artiq.language.units
-from typing import Any, Dict, List, Optional
+from collections import deque
+import math
+import numpy as np
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 from .utils import dump_json
+from ..utils import PackedArray
 
 __all__ = [
-    "LastValueSink", "ArraySink", "AppendingDatasetSink", "ScalarDatasetSink",
-    "ResultChannel", "NumericChannel", "FloatChannel", "IntChannel", "OpaqueChannel"
+    "LastValueSink", "ArraySink", "TypedArraySink", "make_array_sink", "FanOutSink",
+    "AppendingDatasetSink", "CoalescingAppendingDatasetSink", "ScalarDatasetSink",
+    "DecimatingDatasetSink", "PackedArrayDatasetSink", "RepeatAggregator",
+    "ResultChannel", "NumericChannel", "FloatChannel", "IntChannel", "ArrayChannel",
+    "PackedArrayChannel", "OpaqueChannel"
 ]
 
 
@@ -19,6 +28,27 @@ class ResultSink:
     def push(self, value: Any) -> None:
         raise NotImplementedError
 
+    def push_many(self, values: Sequence[Any]) -> None:
+        """Push a number of values at once, equivalent to pushing them one by one.
+
+        The default implementation simply forwards to :meth:`push` for each value;
+        sinks override this where they can handle many values more efficiently.
+
+        :param values: The values to push (e.g. a list, or a NumPy array with the
+            values along the first dimension).
+        """
+        for value in _to_value_list(values):
+            self.push(value)
+
+    def flush(self) -> None:
+        """Make sure all values pushed so far have been forwarded to their final
+        destination, for sinks that buffer values internally.
+
+        Called e.g. before a scan is paused, and once it has finished (or failed).
+        Sinks wrapping other sinks should forward this call.
+        """
+        pass
+
 
 class LastValueSink(ResultSink):
     """Sink that stores the last-pushed value."""
@@ -28,6 +58,11 @@ class LastValueSink(ResultSink):
     def push(self, value: Any) -> None:
         self.value = value
 
+    def push_many(self, values: Sequence[Any]) -> None:
+        values = _to_value_list(values)
+        if values:
+            self.value = values[-1]
+
     def get_last(self) -> Any:
         """Return the last-pushed value, or ``None`` if none yet."""
         return self.value
@@ -41,6 +76,9 @@ class ArraySink(ResultSink):
     def push(self, value: Any) -> None:
         self.data.append(value)
 
+    def push_many(self, values: Sequence[Any]) -> None:
+        self.data.extend(_to_value_list(values))
+
     def get_all(self) -> List[Any]:
         """Return a list of all previously pushed values."""
         return self.data
@@ -50,6 +88,98 @@ class ArraySink(ResultSink):
         self.data = []
 
 
+class TypedArraySink(ResultSink):
+    """Sink that stores all pushed values in a NumPy array of fixed dtype.
+
+    Compared to :class:`ArraySink`, this avoids storing a boxed Python object per value,
+    and the values can be handed to analysis code as an array without any conversions.
+    The storage is grown by doubling its capacity as required, so pushing values takes
+    amortised constant time.
+
+    :param dtype: The NumPy dtype to store the values as.
+    :param shape: The shape of each value (scalars by default). All values are stored
+        in one contiguous array, with the point index as the first dimension.
+    :param initial_capacity: The number of values to allocate storage for initially.
+    """
+    def __init__(self, dtype, shape: Tuple[int, ...] = (), initial_capacity: int = 16):
+        self.dtype = np.dtype(dtype)
+        self.shape = tuple(shape)
+        self.initial_capacity = initial_capacity
+        self.clear()
+
+    def push(self, value: Any) -> None:
+        if self._num_values == len(self._data):
+            self._grow(self._num_values + 1)
+        self._data[self._num_values] = value
+        self._num_values += 1
+
+    def push_many(self, values: Sequence[Any]) -> None:
+        values = np.asarray(values, dtype=self.dtype)
+        num_values = self._num_values + len(values)
+        if num_values > len(self._data):
+            self._grow(num_values)
+        self._data[self._num_values:num_values] = values
+        self._num_values = num_values
+
+    def get_all(self) -> np.ndarray:
+        """Return all previously pushed values.
+
+        The returned array is a read-only view into the storage (i.e. is not copied),
+        and remains valid (and unchanged) after further values are pushed or the sink is
+        cleared.
+        """
+        values = self._data[:self._num_values]
+        values.flags.writeable = False
+        return values
+
+    def clear(self) -> None:
+        """Clear the previously pushed values."""
+        # Always allocate new storage, as views previously returned from get_all() might
+        # still be in use.
+        self._data = np.empty((self.initial_capacity, ) + self.shape, dtype=self.dtype)
+        self._num_values = 0
+
+    def _grow(self, min_capacity: int) -> None:
+        data = np.empty((max(2 * len(self._data), min_capacity), ) + self.shape,
+                        dtype=self.dtype)
+        data[:self._num_values] = self._data[:self._num_values]
+        self._data = data
+
+
+class FanOutSink(ResultSink):
+    """Sink that forwards all pushed values to a number of other sinks (e.g. one
+    archiving them at full resolution, and one broadcasting a reduced live view).
+
+    Values are read back from the first of the sinks, which should thus be the one
+    storing all of them.
+
+    :param sinks: The sinks to forward values to.
+    """
+    def __init__(self, sinks: List[ResultSink]):
+        assert sinks, "Need at least one sink to forward to"
+        self.sinks = sinks
+
+    def push(self, value: Any) -> None:
+        for sink in self.sinks:
+            sink.push(value)
+
+    def push_many(self, values: Sequence[Any]) -> None:
+        for sink in self.sinks:
+            sink.push_many(values)
+
+    def flush(self) -> None:
+        for sink in self.sinks:
+            sink.flush()
+
+    def get_last(self) -> Any:
+        """Return the last pushed value, as reported by the first sink."""
+        return self.sinks[0].get_last()
+
+    def get_all(self) -> List[Any]:
+        """Return all previously pushed values, as reported by the first sink."""
+        return self.sinks[0].get_all()
+
+
 class AppendingDatasetSink(ResultSink, HasEnvironment):
     def build(self, key: str, broadcast: bool = True) -> None:
         """
@@ -60,15 +190,30 @@ class AppendingDatasetSink(ResultSink, HasEnvironment):
         self.key = key
         self.broadcast = broadcast
         self.last_value = None
+        self._num_values = 0
 
     def push(self, value: Any) -> None:
         assert value is not None
+        self._num_values += 1
         if self.last_value is None:
             self.set_dataset(self.key, [value], broadcast=self.broadcast)
             self.last_value = value
             return
         self.append_to_dataset(self.key, value)
 
+    def push_many(self, values: Sequence[Any]) -> None:
+        values = _to_value_list(values)
+        if not values:
+            return
+        if self.last_value is None:
+            self.set_dataset(self.key, values, broadcast=self.broadcast)
+        else:
+            # Assigning to an empty slice at the end appends all values with a single
+            # modification.
+            self.mutate_dataset(self.key, (self._num_values, self._num_values), values)
+        self._num_values += len(values)
+        self.last_value = values[-1]
+
     def get_last(self) -> Any:
         """Return the last pushed value (or None)."""
         return self.last_value
@@ -78,6 +223,81 @@ class AppendingDatasetSink(ResultSink, HasEnvironment):
         return [] if (self.last_value is None) else self.get_dataset(self.key)
 
 
+class CoalescingAppendingDatasetSink(AppendingDatasetSink):
+    """Variant of :class:`AppendingDatasetSink` that buffers pushed values and appends
+    them to the dataset in batches.
+
+    Each batch is written as a single dataset modification (rather than one per value),
+    which considerably reduces the load on the master and all dataset subscribers for
+    high point rates. The first value is written immediately, such that the dataset is
+    created right away.
+
+    Buffered values are written once :attr:`max_pending` of them have accumulated, or on
+    the first push at least :attr:`flush_interval` seconds after the last write, as
+    well as on :meth:`flush`, which needs to be called once no more values are pushed
+    (e.g. when the scan is paused or has finished).
+    """
+    def build(self,
+              key: str,
+              broadcast: bool = True,
+              max_pending: int = 1024,
+              flush_interval: float = 1.0) -> None:
+        """
+        :param key: Dataset key to store results in. Set to an array on the first push,
+            and subsequently appended to.
+        :param broadcast: Whether to set the dataset in broadcast mode.
+        :param max_pending: The maximum number of values to buffer.
+        :param flush_interval: The maximum interval between writes while values are
+            being pushed, in seconds.
+        """
+        super().build(key, broadcast)
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._num_written = 0
+        self._last_write = time.monotonic()
+
+    def push(self, value: Any) -> None:
+        assert value is not None
+        self.last_value = value
+        self._pending.append(value)
+        self._flush_if_due()
+
+    def push_many(self, values: Sequence[Any]) -> None:
+        values = _to_value_list(values)
+        if not values:
+            return
+        self.last_value = values[-1]
+        self._pending.extend(values)
+        self._flush_if_due()
+
+    def flush(self) -> None:
+        """Write all buffered values to the dataset."""
+        if not self._pending:
+            return
+        if self._num_written == 0:
+            self.set_dataset(self.key, self._pending, broadcast=self.broadcast)
+        else:
+            # Appending by assigning to an empty slice at the end of the list gives a
+            # single modification.
+            self.mutate_dataset(self.key, (self._num_written, self._num_written),
+                                self._pending)
+        self._num_written += len(self._pending)
+        self._pending = []
+        self._last_write = time.monotonic()
+
+    def get_all(self) -> List[Any]:
+        """Read back the previously pushed values from the target dataset (if any),
+        writing any buffered values first."""
+        self.flush()
+        return super().get_all()
+
+    def _flush_if_due(self) -> None:
+        if (self._num_written == 0 or len(self._pending) >= self.max_pending
+                or time.monotonic() - self._last_write >= self.flush_interval):
+            self.flush()
+
+
 class ScalarDatasetSink(ResultSink, HasEnvironment):
     """Sink that writes pushed results to a dataset, overwriting its previous value
     if any."""
@@ -94,11 +314,440 @@ class ScalarDatasetSink(ResultSink, HasEnvironment):
         self.set_dataset(self.key, value, broadcast=self.broadcast)
         self.has_pushed = True
 
+    def push_many(self, values: Sequence[Any]) -> None:
+        # Only the last value would remain anyway.
+        values = _to_value_list(values)
+        if values:
+            self.push(values[-1])
+
     def get_last(self) -> Any:
         """Return the last pushed value, or ``None`` if none yet."""
         return self.get_dataset(self.key) if self.has_pushed else None
 
 
+class PackedArrayDatasetSink(ResultSink, HasEnvironment):
+    """Sink that stores 1-D arrays of possibly different length (see
+    :class:`PackedArrayChannel`) packed into a single dataset.
+
+    The elements of all pushed arrays are appended to the dataset ``key`` (a flat
+    list, saved as a contiguous 1-D array in the HDF5 results file), and the offsets at
+    which the arrays start (followed by the total number of elements) are stored in
+    ``<key>.offsets``. Compared to storing a list of arrays, this avoids (slow) nested
+    structures when broadcasting, saving and loading the data; the arrays can be read
+    back as views into the packed values using :class:`.PackedArray`.
+    """
+    def build(self, key: str, broadcast: bool = True) -> None:
+        """
+        :param key: Dataset key to store the packed values in.
+        :param broadcast: Whether to set the datasets in broadcast mode.
+        """
+        self.key = key
+        self.offsets_key = key + ".offsets"
+        self.broadcast = broadcast
+        self.last_value = None
+        self._num_values = 0
+
+    def push(self, value: Any) -> None:
+        values = np.asarray(value).tolist()
+        num_values = self._num_values + len(values)
+        if self.last_value is None:
+            self.set_dataset(self.key, values, broadcast=self.broadcast)
+            self.set_dataset(self.offsets_key, [0, num_values],
+                             broadcast=self.broadcast)
+        else:
+            # Write the values first, so that readers never see offsets pointing
+            # beyond the end of the data.
+            if values:
+                self.mutate_dataset(self.key, (self._num_values, self._num_values),
+                                    values)
+            self.append_to_dataset(self.offsets_key, num_values)
+        self._num_values = num_values
+        self.last_value = value
+
+    def get_last(self) -> Any:
+        """Return the last pushed value (or None)."""
+        return self.last_value
+
+    def get_all(self) -> PackedArray:
+        """Read back the previously pushed values from the target datasets."""
+        if self.last_value is None:
+            return PackedArray([], [0])
+        return PackedArray(self.get_dataset(self.key),
+                           self.get_dataset(self.offsets_key))
+
+
+class DecimatingDatasetSink(ResultSink, HasEnvironment):
+    """Sink that broadcasts a decimated view of the pushed (numeric) values, for live
+    display of series far too long to be broadcast/plotted in full.
+
+    Consecutive values are grouped into bins of equal size, and the mean, minimum and
+    maximum of each completed bin are appended to the ``<key>.mean``, ``<key>.min`` and
+    ``<key>.max`` datasets. The bin size starts out as 1; once there are twice
+    :attr:`resolution` bins, pairs of neighbouring bins are merged (and the datasets
+    rewritten), doubling the bin size. The datasets thus always hold between
+    :attr:`resolution` and twice as many values, however many values are pushed. Sinks
+    that are pushed the same number of values (e.g. for the different result channels
+    of a scan) use the same bins.
+
+    Values in the last, incomplete bin are only written on :meth:`flush`.
+    """
+
+    #: The statistics computed for each bin, in the order stored internally.
+    STATISTICS = ("mean", "min", "max")
+
+    def build(self, key: str, resolution: int, broadcast: bool = True) -> None:
+        """
+        :param key: Prefix of the dataset keys to write the statistics to.
+        :param resolution: The minimum number of bins to keep (once that many values
+            have been pushed).
+        :param broadcast: Whether to set the datasets in broadcast mode.
+        """
+        self.key = key
+        self.resolution = resolution
+        self.broadcast = broadcast
+        self.bin_size = 1
+        self.last_value = None
+
+        self._bins = []
+        self._num_written = 0
+        self._start_bin()
+
+    def push(self, value: Any) -> None:
+        self.last_value = value
+        self._bin_count += 1
+        self._bin_sum += value
+        self._bin_min = min(self._bin_min, value)
+        self._bin_max = max(self._bin_max, value)
+        if self._bin_count < self.bin_size:
+            return
+
+        self._bins.append(self._current_bin())
+        self._start_bin()
+        if len(self._bins) < 2 * self.resolution:
+            self._write_bin(len(self._bins) - 1, self._bins[-1])
+            return
+
+        self._bins = [(0.5 * (a[0] + b[0]), min(a[1], b[1]), max(a[2], b[2]))
+                      for a, b in zip(self._bins[::2], self._bins[1::2])]
+        self.bin_size *= 2
+        for i, name in enumerate(self.STATISTICS):
+            self.set_dataset(self._stat_key(name), [b[i] for b in self._bins],
+                             broadcast=self.broadcast)
+        self._num_written = len(self._bins)
+
+    def flush(self) -> None:
+        """Write the statistics of the values in the incomplete last bin (if any).
+
+        They are overwritten once the bin is completed.
+        """
+        if self._bin_count:
+            self._write_bin(len(self._bins), self._current_bin())
+
+    def get_last(self) -> Any:
+        """Return the last pushed value (or None)."""
+        return self.last_value
+
+    def _start_bin(self) -> None:
+        self._bin_count = 0
+        self._bin_sum = 0
+        self._bin_min = math.inf
+        self._bin_max = -math.inf
+
+    def _current_bin(self) -> Tuple[float, Any, Any]:
+        return self._bin_sum / self._bin_count, self._bin_min, self._bin_max
+
+    def _stat_key(self, name: str) -> str:
+        return self.key + "." + name
+
+    def _write_bin(self, index: int, stats: Tuple[float, Any, Any]) -> None:
+        for name, value in zip(self.STATISTICS, stats):
+            key = self._stat_key(name)
+            if self._num_written == 0:
+                self.set_dataset(key, [value], broadcast=self.broadcast)
+            elif index < self._num_written:
+                # Replace the previously flushed partial bin.
+                self.mutate_dataset(key, index, value)
+            else:
+                self.append_to_dataset(key, value)
+        self._num_written = max(self._num_written, index + 1)
+
+
+class RepeatAggregator(HasEnvironment):
+    """Reduces repeated measurements at identical scan coordinates to running summary
+    statistics, storing only one entry per unique coordinate tuple.
+
+    Coordinates and results are pushed through the sinks returned by
+    :meth:`make_axis_sink` and :meth:`make_channel_sink`. Values are matched up with
+    their scan points in order of arrival, so the coordinates of a point can be pushed
+    either before or after its results (as is the case for host and kernel scans,
+    respectively).
+
+    For numeric channels, the mean over all repeats is stored in place of the
+    individual values, with the standard error of the mean (computed online using
+    Welford's algorithm) stored as an additional derived channel. For other channels,
+    the last value pushed for each coordinate tuple is kept.
+    """
+    def build(self, num_axes: int, dataset_prefix: str, archive_raw: bool = False):
+        """
+        :param num_axes: The number of scan axes.
+        :param dataset_prefix: Prefix for the keys of the datasets to write to.
+        :param archive_raw: Whether to additionally store all raw values in
+            (non-broadcast) ``raw.*`` datasets.
+        """
+        self.dataset_prefix = dataset_prefix
+        self.archive_raw = archive_raw
+
+        #: Map from coordinate tuple to its index in the aggregated datasets.
+        self._slots = {}
+        #: The unique coordinates, one list per axis, in order of appearance.
+        self._coordinates = [[] for _ in range(num_axes)]
+        #: The number of scan points acquired for each coordinate tuple.
+        self._counts = []
+        #: The aggregated dataset index of every scan point, in acquisition order.
+        self._point_slots = array("q")
+
+        self._pending_coordinates = [deque() for _ in range(num_axes)]
+        self._axis_sinks = [
+            AppendingDatasetSink(self, dataset_prefix + "points.axis_{}".format(i))
+            for i in range(num_axes)
+        ]
+        self._raw_axis_sinks = [
+            AppendingDatasetSink(
+                self, dataset_prefix + "raw.axis_{}".format(i), broadcast=False)
+            for i in range(num_axes)
+        ] if archive_raw else []
+        self._count_writer = _ListDatasetWriter(
+            self, dataset_prefix + "points.channel_repeat_count")
+        self._channel_sinks = []
+
+    def make_axis_sink(self, axis_idx: int) -> ResultSink:
+        """Return a sink to push the coordinates along the given axis to."""
+        return _AggregatedAxisSink(self, axis_idx)
+
+    def make_channel_sink(self, channel: "ResultChannel", name: str) -> ResultSink:
+        """Return a sink to push the values of the given result channel to.
+
+        :param channel: The result channel.
+        :param name: The (shortened) name of the channel to use for the dataset keys.
+        """
+        sink = _AggregatedChannelSink(self, channel, name)
+        self._channel_sinks.append(sink)
+        return sink
+
+    def describe_channels(self) -> Dict[str, Dict[str, Any]]:
+        """Return the schema for the channels derived from the aggregated statistics,
+        to be merged with the regular result channel metadata.
+
+        Numeric channels are averaged and hence always become floating-point.
+        """
+        primaries = set()
+        for sink in self._channel_sinks:
+            primaries.add(sink.channel.display_hints.get("error_bar_for", None))
+
+        desc = {}
+        for sink in self._channel_sinks:
+            if not sink.is_numeric:
+                continue
+            channel_desc = sink.channel.describe()
+            channel_desc["type"] = "float"
+            desc[sink.name] = channel_desc
+            error_desc = {
+                "path":
+                channel_desc["path"] + "_error",
+                "description":
+                "Standard error of mean " +
+                (channel_desc["description"] or channel_desc["path"]),
+                "type":
+                "float",
+                "scale":
+                channel_desc["scale"],
+                "unit":
+                channel_desc.get("unit", "")
+            }
+            # Only provide error bars if the user didn't already.
+            if (channel_desc["path"] not in primaries
+                    and "error_bar_for" not in sink.channel.display_hints):
+                error_desc["display_hints"] = {"error_bar_for": channel_desc["path"]}
+            else:
+                error_desc["display_hints"] = {"priority": -1}
+            desc[sink.error_name] = error_desc
+        desc["repeat_count"] = {
+            "path": "repeat_count",
+            "description": "Number of repeats",
+            "type": "int",
+            "display_hints": {
+                "priority": -1
+            }
+        }
+        return desc
+
+    def get_derived_channel_names(self) -> List[str]:
+        """Return the names of the channels added to store the aggregated statistics."""
+        return [s.error_name
+                for s in self._channel_sinks if s.is_numeric] + ["repeat_count"]
+
+    def get_coordinates(self, axis_idx: int) -> List[Any]:
+        """Return the unique coordinates along the given axis, in the order of the
+        aggregated datasets."""
+        return self._coordinates[axis_idx]
+
+    def get_counts(self) -> List[int]:
+        """Return the number of scan points acquired for each unique coordinate
+        tuple."""
+        return self._counts
+
+    def num_points(self) -> int:
+        """Return the number of complete scan points (coordinate tuples) pushed so
+        far."""
+        return len(self._point_slots)
+
+    def slot_for_point(self, point_idx: int) -> int:
+        """Return the aggregated dataset index the given scan point maps to."""
+        return self._point_slots[point_idx]
+
+    def _push_coordinate(self, axis_idx: int, value: Any) -> None:
+        if self.archive_raw:
+            self._raw_axis_sinks[axis_idx].push(value)
+        self._pending_coordinates[axis_idx].append(value)
+        if not all(self._pending_coordinates):
+            return
+        coords = tuple(p.popleft() for p in self._pending_coordinates)
+
+        slot = self._slots.get(coords, None)
+        if slot is None:
+            slot = len(self._counts)
+            self._slots[coords] = slot
+            for values, sink, value in zip(self._coordinates, self._axis_sinks, coords):
+                values.append(value)
+                sink.push(value)
+            self._counts.append(0)
+        self._counts[slot] += 1
+        self._count_writer.set(slot, self._counts[slot])
+        self._point_slots.append(slot)
+
+        for sink in self._channel_sinks:
+            sink.process_pending()
+
+
+class _AggregatedAxisSink(ResultSink):
+    def __init__(self, aggregator: RepeatAggregator, axis_idx: int):
+        self._aggregator = aggregator
+        self._axis_idx = axis_idx
+
+    def push(self, value: Any) -> None:
+        self._aggregator._push_coordinate(self._axis_idx, value)
+
+    def get_all(self) -> List[Any]:
+        return self._aggregator.get_coordinates(self._axis_idx)
+
+
+class _AggregatedChannelSink(ResultSink):
+    def __init__(self, aggregator: RepeatAggregator, channel: "ResultChannel",
+                 name: str):
+        self.channel = channel
+        self.name = name
+        self.is_numeric = isinstance(channel, NumericChannel)
+        self.error_name = (name + "_error") if self.is_numeric else None
+
+        self._aggregator = aggregator
+        key = aggregator.dataset_prefix + "points.channel_" + name
+        self._value_writer = _ListDatasetWriter(aggregator, key,
+                                                math.nan if self.is_numeric else None)
+        self._error_writer = _ListDatasetWriter(aggregator, key + "_error",
+                                                math.nan) if self.is_numeric else None
+        self._raw_sink = AppendingDatasetSink(
+            aggregator,
+            aggregator.dataset_prefix + "raw.channel_" + name,
+            broadcast=False) if aggregator.archive_raw else None
+
+        self._pending = deque()
+        self._num_processed = 0
+        self._last_value = None
+
+        # Running statistics per aggregated dataset entry: number of values, mean and
+        # sum of squared deviations from the mean.
+        self._counts = []
+        self._values = []
+        self._m2s = []
+
+    def push(self, value: Any) -> None:
+        if self._raw_sink is not None:
+            self._raw_sink.push(value)
+        self._pending.append(value)
+        self.process_pending()
+
+    def process_pending(self) -> None:
+        """Fold any values whose coordinates are known into the running statistics."""
+        while self._pending and self._num_processed < self._aggregator.num_points():
+            value = self._pending.popleft()
+            slot = self._aggregator.slot_for_point(self._num_processed)
+            self._num_processed += 1
+            self._update(slot, value)
+
+    def get_last(self) -> Any:
+        return self._last_value
+
+    def get_all(self) -> List[Any]:
+        return self._values
+
+    def get_errors(self) -> List[float]:
+        """Return the standard error of the mean for each aggregated entry (NaN where
+        there is only a single value)."""
+        return [_standard_error(n, m2) for n, m2 in zip(self._counts, self._m2s)]
+
+    def _update(self, slot: int, value: Any) -> None:
+        while len(self._values) <= slot:
+            # Only reached for slots this channel has not seen yet (or if a point
+            # was skipped for this channel, in which case the entry stays empty).
+            self._counts.append(0)
+            self._values.append(math.nan if self.is_numeric else None)
+            self._m2s.append(0.0)
+
+        self._counts[slot] += 1
+        n = self._counts[slot]
+        if self.is_numeric:
+            if n == 1:
+                mean, m2 = float(value), 0.0
+            else:
+                delta = value - self._values[slot]
+                mean = self._values[slot] + delta / n
+                m2 = self._m2s[slot] + delta * (value - mean)
+            self._values[slot] = mean
+            self._m2s[slot] = m2
+            self._error_writer.set(slot, _standard_error(n, m2))
+        else:
+            self._values[slot] = value
+        self._value_writer.set(slot, self._values[slot])
+        self._last_value = self._values[slot]
+
+
+def _standard_error(count: int, m2: float) -> float:
+    if count < 2:
+        return math.nan
+    return math.sqrt(m2 / (count - 1) / count)
+
+
+class _ListDatasetWriter:
+    """Sets individual elements of a list dataset, growing it as required."""
+    def __init__(self, env: HasEnvironment, key: str, fill_value: Any = None):
+        self._env = env
+        self._key = key
+        self._fill_value = fill_value
+        self._length = 0
+
+    def set(self, index: int, value: Any) -> None:
+        if index < self._length:
+            self._env.mutate_dataset(self._key, index, value)
+            return
+        values = [self._fill_value] * (index - self._length) + [value]
+        if self._length == 0:
+            self._env.set_dataset(self._key, values, broadcast=True)
+        else:
+            for v in values:
+                self._env.append_to_dataset(self._key, v)
+        self._length = index + 1
+
+
 class ResultChannel:
     """
     :param path: The path to the channel in the fragment tree (e.g. ``"readout/p"``).
@@ -136,6 +785,10 @@ class ResultChannel:
             - Path of the linked result channel
             - Indicates that this result channel should be drawn on the same plot axis
               as the given other channel.
+
+    :param save_by_default: Whether to save the results pushed to the channel (e.g. to
+        datasets) when running the fragment as a top-level scan. Can be overridden per
+        submission through the :data:`.PARAMS_ARG_KEY` argument.
     """
     def __init__(self,
                  path: str,
@@ -147,6 +800,7 @@ class ResultChannel:
         self.display_hints = {} if display_hints is None else display_hints
         self.save_by_default = save_by_default
         self.sink = None
+        self._muted = False
 
     def __repr__(self) -> str:
         return "<{}@{}: {}>".format(type(self).__name__, hex(id(self)), self.path)
@@ -165,10 +819,18 @@ class ResultChannel:
         return desc
 
     def is_muted(self) -> bool:
+        """Return whether the channel has been muted (see :meth:`set_muted`).
+
+        Code producing expensive results (e.g. debug information) can check this to
+        skip computing them altogether.
         """
+        return self._muted
+
+    def set_muted(self, muted: bool) -> None:
+        """Set whether the channel is muted, i.e. values pushed to it are discarded
+        without being coerced to the channel type or forwarded to the sink.
         """
-        # TODO: Implement muting interface?
-        return self.sink is not None
+        self._muted = muted
 
     def set_sink(self, sink: ResultSink) -> None:
         """
@@ -179,16 +841,40 @@ class ResultChannel:
     def push(self, raw_value) -> None:
         """
         """
+        if self._muted:
+            return
         value = self._coerce_to_type(raw_value)
         if self.sink:
             self.sink.push(value)
 
+    @rpc(flags={"async"})
+    def push_many(self, raw_values) -> None:
+        """Push a number of results at once, equivalent to calling :meth:`push` for
+        each of them.
+
+        The values are coerced in one go (vectorised for numeric and array channels)
+        and forwarded to the sink in a single call, which is much faster than pushing
+        them individually, e.g. for values already held in an array (camera frames,
+        FIFO readouts, …). From kernels, this is a single (asynchronous) RPC.
+
+        :param raw_values: A list or NumPy array of the values (with the values along
+            the first dimension).
+        """
+        if self._muted:
+            return
+        values = self._coerce_many(raw_values)
+        if self.sink:
+            self.sink.push_many(values)
+
     def _get_type_string(self):
         raise NotImplementedError()
 
     def _coerce_to_type(self, value):
         raise NotImplementedError()
 
+    def _coerce_many(self, values):
+        return [self._coerce_to_type(v) for v in values]
+
 
 class NumericChannel(ResultChannel):
     r"""Base class for :class:`ResultChannel`\ s of numerical results, with scale/unit
@@ -209,8 +895,9 @@ class NumericChannel(ResultChannel):
                  min=None,
                  max=None,
                  unit: str = "",
-                 scale=None):
-        super().__init__(path, description, display_hints)
+                 scale=None,
+                 save_by_default: bool = True):
+        super().__init__(path, description, display_hints, save_by_default)
         self.min = min
         self.max = max
 
@@ -247,6 +934,9 @@ class FloatChannel(NumericChannel):
     def _coerce_to_type(self, value):
         return float(value)
 
+    def _coerce_many(self, values):
+        return _as_1d_array(values, np.float64, self.path)
+
 
 class IntChannel(NumericChannel):
     """:class:`NumericChannel` that accepts integer results."""
@@ -256,6 +946,96 @@ class IntChannel(NumericChannel):
     def _coerce_to_type(self, value):
         return int(value)
 
+    def _coerce_many(self, values):
+        # Like int(), truncate any floating-point values towards zero.
+        return _as_1d_array(values, None, self.path).astype(np.int64)
+
+
+class ArrayChannel(ResultChannel):
+    """:class:`ResultChannel` for results that are arrays of a fixed shape and dtype,
+    e.g. camera images or histograms.
+
+    Values are coerced to NumPy arrays of the given dtype (and rejected if they do not
+    have the declared shape). Where ndscan stores all values for a channel itself, they
+    are kept in a single contiguous array with the point index as the first dimension,
+    and ARTIQ saves the values of a scan as one such array to the HDF5 results file.
+
+    :param shape: The shape of each value, e.g. ``(height, width)`` for images.
+    :param dtype: The NumPy dtype of the values (``float64`` by default).
+    """
+    def __init__(self,
+                 path: str,
+                 shape: Tuple[int, ...],
+                 dtype=np.float64,
+                 description: str = "",
+                 display_hints: Optional[Dict[str, Any]] = None,
+                 save_by_default: bool = True):
+        super().__init__(path, description, display_hints, save_by_default)
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+
+    def describe(self) -> Dict[str, Any]:
+        """"""
+        result = super().describe()
+        result["shape"] = list(self.shape)
+        result["dtype"] = self.dtype.name
+        return result
+
+    def _get_type_string(self):
+        return "array"
+
+    def _coerce_to_type(self, value):
+        value = np.asarray(value, dtype=self.dtype)
+        if value.shape != self.shape:
+            raise ValueError("Value of shape {} pushed to result channel '{}' of shape "
+                             "{}".format(value.shape, self.path, self.shape))
+        return value
+
+    def _coerce_many(self, values):
+        values = np.asarray(values, dtype=self.dtype)
+        if values.shape[1:] != self.shape:
+            raise ValueError("Values of shape {} pushed to result channel '{}' of "
+                             "shape {}".format(values.shape[1:], self.path, self.shape))
+        return values
+
+
+class PackedArrayChannel(ResultChannel):
+    """:class:`ResultChannel` for results that are 1-D arrays of a fixed dtype, but of
+    possibly varying length, e.g. the values of a subscan result channel for each point
+    of the parent scan (see :func:`.setattr_subscan`).
+
+    Where ndscan stores all values for a channel itself, they are packed into a single
+    contiguous array, with an array of offsets recording where the individual values
+    start (see :class:`PackedArrayDatasetSink`).
+
+    :param dtype: The NumPy dtype of the array elements (``float64`` by default).
+    """
+    def __init__(self,
+                 path: str,
+                 dtype=np.float64,
+                 description: str = "",
+                 display_hints: Optional[Dict[str, Any]] = None,
+                 save_by_default: bool = True):
+        super().__init__(path, description, display_hints, save_by_default)
+        self.dtype = np.dtype(dtype)
+
+    def describe(self) -> Dict[str, Any]:
+        """"""
+        result = super().describe()
+        result["dtype"] = self.dtype.name
+        return result
+
+    def _get_type_string(self):
+        return "packed_array"
+
+    def _coerce_to_type(self, value):
+        value = np.asarray(value, dtype=self.dtype)
+        if value.ndim != 1:
+            raise ValueError(
+                "Value of shape {} pushed to 1-D result channel '{}'".format(
+                    value.shape, self.path))
+        return value
+
 
 class OpaqueChannel(ResultChannel):
     """:class:`ResultChannel` that stores arbitrary data, with ndscan making no attempts
@@ -286,3 +1066,33 @@ class SubscanChannel(ResultChannel):
 
     def _coerce_to_type(self, value):
         return dump_json(value)
+
+
+def _to_value_list(values: Sequence[Any]) -> List[Any]:
+    # Convert arrays of scalars to lists of Python scalars, as pushed individually by
+    # the channels (which notably keeps them serialisable to PYON).
+    if isinstance(values, np.ndarray) and values.ndim == 1:
+        return values.tolist()
+    return list(values)
+
+
+def _as_1d_array(values: Sequence[Any], dtype, path: str) -> np.ndarray:
+    values = np.asarray(values, dtype=dtype)
+    if values.ndim != 1:
+        raise ValueError(
+            "Values of shape {} pushed to scalar result channel '{}'".format(
+                values.shape, path))
+    return values
+
+
+def make_array_sink(channel: ResultChannel) -> ResultSink:
+    """Create a sink to collect all values pushed to the given result channel, storing
+    them in a typed NumPy array for numeric and array channels (see
+    :class:`TypedArraySink`), and in a list otherwise (see :class:`ArraySink`)."""
+    if isinstance(channel, ArrayChannel):
+        return TypedArraySink(channel.dtype, channel.shape)
+    if isinstance(channel, FloatChannel):
+        return TypedArraySink(np.float64)
+    if isinstance(channel, IntChannel):
+        return TypedArraySink(np.int64)
+    return ArraySink()
@@ -1,17 +1,25 @@
+from bisect import bisect_right
 from itertools import product
 import numpy as np
 import random
-from typing import Any, Dict, List, Iterator
+from typing import Any, Dict, List, Iterator, Optional, Tuple
 
 __all__ = [
-    "ScanGenerator", "RefiningGenerator", "LinearGenerator", "ListGenerator",
-    "ScanOptions"
+    "ScanGenerator", "RefiningGenerator", "AdaptiveGenerator", "LinearGenerator",
+    "ListGenerator", "JointSampler", "HaltonSampler", "LatinHypercubeSampler",
+    "SampledGenerator", "ScanOptions", "ScanPointSequence"
 ]
 
 
 class ScanGenerator:
     """Generates points along a single scan axis to be visited.
     """
+
+    #: Whether the points for each level depend on the results acquired for the
+    #: previous levels. If so, a level is only generated once all the points before it
+    #: have been handed out.
+    depends_on_results = False
+
     def has_level(self, level: int) -> bool:
         """
         """
@@ -22,6 +30,24 @@ class ScanGenerator:
         """
         raise NotImplementedError
 
+    def total_num_points(self) -> Optional[int]:
+        """Return the total number of points generated across all levels, or ``None``
+        if the number of points is unbounded (or not known in advance).
+
+        The default implementation returns ``None``.
+        """
+        return None
+
+    def num_points_for_level(self, level: int) -> Optional[int]:
+        """Return the number of points that will be generated for the given level
+        (without generating them), ``0`` if there is no such level, or ``None`` if
+        this is not known in advance.
+
+        For generators whose points depend on the results, this can be an upper bound.
+        The default implementation assumes all points are generated in the first level.
+        """
+        return self.total_num_points() if level == 0 else 0
+
     def describe_limits(self, target: Dict[str, Any]) -> None:
         """
         """
@@ -52,12 +78,186 @@ class RefiningGenerator(ScanGenerator):
 
         return points
 
+    def total_num_points(self) -> Optional[int]:
+        ""
+        return None
+
+    def num_points_for_level(self, level: int) -> Optional[int]:
+        ""
+        return 2 if level == 0 else 2**(level - 1)
+
     def describe_limits(self, target: Dict[str, Any]) -> None:
         ""
         target["min"] = self.lower
         target["max"] = self.upper
 
 
+class AdaptiveGenerator(ScanGenerator):
+    """Generates points in a given interval, refining the scan where the values of a
+    result channel change most.
+
+    The first level consists of ``num_initial_points`` evenly spaced points. For each
+    subsequent level, the ``num_points_per_level`` intervals between previous points
+    with the largest loss are bisected. The loss of an interval is computed from its
+    (normalised) width, the change of the result channel across it, the local curvature
+    and the statistical uncertainty of the results at the end points (estimated from
+    repeats and any other scan axes).
+
+    The data is read back from the sinks passed to :meth:`set_feedback_sinks`; if none
+    are set, the widest intervals are split, similar to :class:`RefiningGenerator`.
+    Refinement stops once all intervals are narrower than ``2 * min_spacing``.
+
+    Note that new levels are only generated once all points from the previous ones
+    have been acquired, so the points might be sent to the core device in smaller
+    chunks than for other generators. For the same reason, such scans cannot be resumed
+    part-way through. The result channel must be pushed to exactly once per scan point.
+
+    :param channel: The (short) name of the result channel to use as feedback.
+    :param min_spacing: The minimum distance between points; defaults to a millionth
+        of the scan range.
+    """
+    depends_on_results = True
+
+    def __init__(self,
+                 lower,
+                 upper,
+                 randomise_order,
+                 channel: str = "",
+                 num_initial_points: int = 11,
+                 num_points_per_level: int = 5,
+                 min_spacing: Optional[float] = None):
+        if num_initial_points < 2:
+            raise ValueError("Need at least 2 initial points in adaptive scan")
+        self.lower = float(min(lower, upper))
+        self.upper = float(max(lower, upper))
+        self.randomise_order = randomise_order
+        self.channel = channel
+        self.num_initial_points = num_initial_points
+        self.num_points_per_level = num_points_per_level
+        if min_spacing is None:
+            min_spacing = 1e-6 * (self.upper - self.lower)
+        self.min_spacing = min_spacing
+
+        self._coordinate_sink = None
+        self._value_sink = None
+
+        # Sorted array of all points generated so far in the current scan.
+        self._points = np.array([])
+        self._num_levels = 0
+        self._exhausted = False
+
+    def set_feedback_sinks(self, coordinate_sink, value_sink) -> None:
+        """Set the sinks to read back the acquired data from.
+
+        :param coordinate_sink: The sink the coordinates of this axis are pushed to.
+        :param value_sink: The sink the values of the feedback result channel are pushed
+            to (anything with a ``get_all()`` method, e.g. an :class:`.ArraySink`).
+        """
+        self._coordinate_sink = coordinate_sink
+        self._value_sink = value_sink
+
+    def has_level(self, level: int) -> bool:
+        ""
+        return level == 0 or (level <= self._num_levels and not self._exhausted)
+
+    def points_for_level(self, level: int, rng=None) -> List[Any]:
+        ""
+        if level == 0:
+            # Start of a new scan; forget about any previous points.
+            new_points = np.linspace(self.lower, self.upper, self.num_initial_points)
+            self._points = new_points
+            self._num_levels = 0
+            self._exhausted = False
+        else:
+            assert level == self._num_levels, "Levels must be requested in order"
+            new_points = self._next_points()
+            self._points = np.sort(np.concatenate((self._points, new_points)))
+            self._exhausted = len(new_points) == 0
+        self._num_levels = level + 1
+
+        points = new_points.copy()
+        if self.randomise_order:
+            rng.shuffle(points)
+        return points
+
+    def total_num_points(self) -> Optional[int]:
+        ""
+        return None
+
+    def num_points_for_level(self, level: int) -> Optional[int]:
+        ""
+        # Later levels can contain fewer points once min_spacing is reached.
+        return self.num_initial_points if level == 0 else self.num_points_per_level
+
+    def describe_limits(self, target: Dict[str, Any]) -> None:
+        ""
+        target["min"] = self.lower
+        target["max"] = self.upper
+
+    def _next_points(self) -> np.ndarray:
+        losses = self._interval_losses()
+        too_narrow = np.diff(self._points) < 2 * self.min_spacing
+        losses[too_narrow] = -np.inf
+        num_new = min(self.num_points_per_level, np.count_nonzero(~too_narrow))
+        to_split = np.argsort(-losses, kind="stable")[:num_new]
+        return (self._points[to_split] + self._points[to_split + 1]) / 2
+
+    def _interval_losses(self) -> np.ndarray:
+        x = self._points
+        width = np.diff(x) / max(self.upper - self.lower, np.finfo(float).tiny)
+        data = self._read_feedback()
+        if data is None:
+            return width
+
+        # Average over repeats (and any other axes) for each coordinate, and
+        # interpolate onto the points without data yet.
+        coords, inverse, counts = np.unique(data[0],
+                                            return_inverse=True,
+                                            return_counts=True)
+        means = np.bincount(inverse, data[1]) / counts
+        variances = np.maximum(np.bincount(inverse, data[1]**2) / counts - means**2, 0)
+        std_errs = np.sqrt(variances / counts)
+        y = np.interp(x, coords, means)
+        y_err = np.interp(x, coords, std_errs)
+
+        scale = np.ptp(y)
+        if scale == 0:
+            scale = 1.0
+        change = np.abs(np.diff(y)) / scale
+        uncertainty = (y_err[:-1] + y_err[1:]) / (2 * scale)
+
+        point_curvature = np.zeros_like(x)
+        point_curvature[1:-1] = np.abs(y[:-2] - 2 * y[1:-1] + y[2:]) / scale
+        curvature = np.maximum(point_curvature[:-1], point_curvature[1:])
+
+        return np.hypot(width, change + uncertainty) * (1 + curvature)
+
+    def _read_feedback(self) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        if self._coordinate_sink is None or self._value_sink is None:
+            return None
+        coords = self._coordinate_sink.get_all()
+        values = self._value_sink.get_all()
+        if len(coords) != len(values):
+            # Values can only be matched up with their points if there is exactly one
+            # per point.
+            raise ValueError(
+                "Adaptive scan result channel '{}' was pushed to {} times for {} "
+                "points; it must be pushed to exactly once per point".format(
+                    self.channel, len(values), len(coords)))
+        if len(coords) == 0:
+            return None
+        try:
+            coords = np.asarray(coords, dtype=float)
+            values = np.asarray(values, dtype=float)
+        except (TypeError, ValueError):
+            # Not a scalar numeric channel; nothing sensible to do.
+            return None
+        valid = np.isfinite(coords) & np.isfinite(values)
+        if not np.any(valid):
+            return None
+        return coords[valid], values[valid]
+
+
 class LinearGenerator(ScanGenerator):
     def __init__(self, start, stop, num_points, randomise_order):
         if num_points < 2:
@@ -82,6 +282,10 @@ class LinearGenerator(ScanGenerator):
             rng.shuffle(points)
         return points
 
+    def total_num_points(self) -> Optional[int]:
+        ""
+        return self.num_points
+
     def describe_limits(self, target: Dict[str, Any]) -> None:
         ""
         target["min"] = min(self.start, self.stop)
@@ -107,6 +311,10 @@ class ListGenerator(ScanGenerator):
             rng.shuffle(values)
         return values
 
+    def total_num_points(self) -> Optional[int]:
+        ""
+        return len(self.values)
+
     def describe_limits(self, target: Dict[str, Any]) -> None:
         ""
         values = np.array(self.values)
@@ -115,62 +323,575 @@ class ListGenerator(ScanGenerator):
             target["max"] = np.max(values)
 
 
+class JointSampler:
+    """Samples a fixed number of points from a multi-dimensional unit hypercube,
+    filling it evenly, for scanning several axes jointly (see
+    :class:`SampledGenerator`).
+
+    Compared to the Cartesian product of per-axis generators, this allows the space to
+    be covered with a number of points that does not grow exponentially with the
+    number of axes.
+
+    :param num_points: The number of points to sample.
+    :param randomise_order: Whether to visit the points in random order.
+    """
+    def __init__(self, num_points: int, randomise_order: bool):
+        if num_points < 1:
+            raise ValueError("Need at least 1 point in sampled scan")
+        self.num_points = num_points
+        self.randomise_order = randomise_order
+        self.num_dims = 0
+
+    def add_dimension(self) -> int:
+        """Register a new axis to be sampled, and return its index in the samples."""
+        self.num_dims += 1
+        return self.num_dims - 1
+
+    def sample(self, rng) -> np.ndarray:
+        """Return the points as an array of shape ``(num_points, num_dims)``, with all
+        coordinates in ``[0, 1)``.
+        """
+        points = self._sample_unit_cube(rng)
+        if self.randomise_order:
+            rng.shuffle(points)
+        return points
+
+    def _sample_unit_cube(self, rng) -> np.ndarray:
+        raise NotImplementedError
+
+
+class HaltonSampler(JointSampler):
+    """Samples points from the Halton low-discrepancy sequence.
+
+    As any prefix of the sequence is itself evenly distributed, the space is covered
+    progressively as the scan runs (unless the order is randomised).
+    """
+    def _sample_unit_cube(self, rng) -> np.ndarray:
+        # Skip the first element of the sequence (the origin in every dimension).
+        indices = np.arange(1, self.num_points + 1)
+        return np.stack(
+            [_radical_inverse(indices, p) for p in _first_primes(self.num_dims)],
+            axis=-1)
+
+
+class LatinHypercubeSampler(JointSampler):
+    """Samples points using Latin hypercube sampling, such that the projection of the
+    points onto each axis contains exactly one point per interval of width
+    ``1 / num_points``.
+    """
+    def _sample_unit_cube(self, rng) -> np.ndarray:
+        n = self.num_points
+        return np.stack([(rng.permutation(n) + rng.uniform(size=n)) / n
+                         for _ in range(self.num_dims)],
+                        axis=-1)
+
+
+def _first_primes(n: int) -> List[int]:
+    primes = []
+    candidate = 2
+    while len(primes) < n:
+        if all(candidate % p != 0 for p in primes):
+            primes.append(candidate)
+        candidate += 1
+    return primes
+
+
+def _radical_inverse(indices: np.ndarray, base: int) -> np.ndarray:
+    result = np.zeros(len(indices))
+    remaining = indices.copy()
+    factor = 1 / base
+    while np.any(remaining > 0):
+        result += factor * (remaining % base)
+        remaining //= base
+        factor /= base
+    return result
+
+
+class SampledGenerator(ScanGenerator):
+    """Generates the points along one axis of a scan sampled jointly with other axes.
+
+    All axes whose generators share the same :class:`JointSampler` are sampled
+    together, i.e. the scan visits the sampler's points in the joint space of these
+    axes, rather than a Cartesian product of per-axis points. (Any other axes are still
+    scanned as a Cartesian product with the sampled points.)
+
+    :param sampler: The sampler providing the points.
+    :param lower: The coordinate corresponding to 0 in the sampler's unit hypercube.
+    :param upper: The coordinate corresponding to 1 in the sampler's unit hypercube.
+    """
+    def __init__(self, sampler: JointSampler, lower, upper):
+        self.sampler = sampler
+        self.dimension = sampler.add_dimension()
+        self.lower = float(min(lower, upper))
+        self.upper = float(max(lower, upper))
+
+    def has_level(self, level: int) -> bool:
+        ""
+        return level == 0
+
+    def points_for_level(self, level: int, rng=None) -> List[Any]:
+        ""
+        assert level == 0
+        return self.scale(self.sampler.sample(rng)[:, self.dimension])
+
+    def scale(self, unit_values: np.ndarray) -> np.ndarray:
+        """Map the given coordinates from the unit interval onto the scan range."""
+        return self.lower + unit_values * (self.upper - self.lower)
+
+    def total_num_points(self) -> Optional[int]:
+        ""
+        return self.sampler.num_points
+
+    def describe_limits(self, target: Dict[str, Any]) -> None:
+        ""
+        target["min"] = self.lower
+        target["max"] = self.upper
+        # The points are not on a grid; give the spacing of a regular grid with the
+        # same number of points for display purposes.
+        points_per_axis = max(
+            1, int(round(self.sampler.num_points**(1 / self.sampler.num_dims))))
+        if points_per_axis > 1:
+            target["increment"] = (self.upper - self.lower) / (points_per_axis - 1)
+
+
 GENERATORS = {
     "refining": RefiningGenerator,
+    "adaptive": AdaptiveGenerator,
     "linear": LinearGenerator,
     "list": ListGenerator
 }
 
+#: Types of :class:`JointSampler` by scan axis type; all axes of one of these types are
+#: sampled jointly using :class:`SampledGenerator`.
+SAMPLERS = {"halton": HaltonSampler, "latin_hypercube": LatinHypercubeSampler}
+
 
 class ScanOptions:
     """
+    :param num_repeats: The number of times to repeat the scan.
+    :param randomise_order_globally: Whether to randomise the order of points across
+        all axes (and repeats) instead of per axis.
+    :param seed: The seed for the random number generator used to randomise the point
+        order (chosen randomly if ``None``).
+    :param aggregate_repeats: Whether to only store running summary statistics (mean,
+        standard error and count) for each unique point instead of every repeat.
+    :param archive_raw_repeats: If aggregating repeats, whether to still archive the
+        individual values (without broadcasting them).
     """
     def __init__(self,
                  num_repeats: int = 1,
                  randomise_order_globally: bool = False,
-                 seed=None):
+                 seed=None,
+                 aggregate_repeats: bool = False,
+                 archive_raw_repeats: bool = False):
         self.num_repeats = num_repeats
         self.randomise_order_globally = randomise_order_globally
+        self.aggregate_repeats = aggregate_repeats
+        self.archive_raw_repeats = archive_raw_repeats
 
         if seed is None:
             seed = random.getrandbits(32)
         self.seed = seed
 
 
-def generate_points(axis_generators: List[ScanGenerator],
-                    options: ScanOptions) -> Iterator[Any]:
-    rng = np.random.RandomState(options.seed)
+class _LevelPoints:
+    """The points making up one level of a multi-dimensional scan, i.e. the union of a
+    number of Cartesian products of per-factor coordinates, addressed by a flat index.
 
-    # Stores computed coordinates for each axis, indexed first by
-    # axis order, then by level.
-    axis_level_points = [[] for _ in axis_generators]
+    :param blocks: A list of Cartesian products, each given as a list of per-factor
+        coordinate arrays of shape ``(num_points, len(factor_axes[i]))`` (with the first
+        factor varying fastest).
+    :param factor_axes: For each factor, the indices of the scan axes it consists of.
+    :param num_axes: The total number of scan axes.
+    """
+    def __init__(self, blocks: List[List[np.ndarray]], factor_axes: List[List[int]],
+                 num_axes: int):
+        self._blocks = blocks
+        self._factor_axes = factor_axes
+        self._shapes = [tuple(len(p) for p in b) for b in blocks]
+        self._offsets = np.cumsum([0] + [int(np.prod(s)) for s in self._shapes])
+        self._dtypes = [None] * num_axes
+        for f, axes in enumerate(factor_axes):
+            for j, axis in enumerate(axes):
+                self._dtypes[axis] = np.result_type(*(b[f][:, j] for b in blocks))
+
+    def __len__(self) -> int:
+        return int(self._offsets[-1])
+
+    def points_at(self, indices: np.ndarray) -> Tuple[np.ndarray, ...]:
+        """Return the coordinates of the points with the given flat indices, as one
+        array per axis (in axis order).
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        result = [np.empty(len(indices), dtype=dtype) for dtype in self._dtypes]
+        block_indices = np.searchsorted(self._offsets, indices, side="right") - 1
+        for b in np.unique(block_indices):
+            mask = block_indices == b
+            coords = np.unravel_index(indices[mask] - self._offsets[b], self._shapes[b])
+            for factor_points, axes, c in zip(self._blocks[b], self._factor_axes,
+                                              coords):
+                rows = factor_points[c]
+                for j, axis in enumerate(axes):
+                    result[axis][mask] = rows[:, j]
+        return tuple(result)
+
+
+class _ProductFactor:
+    """A factor of the Cartesian product of points making up a scan, that is, either a
+    single axis or a group of axes sampled jointly.
+    """
+    def __init__(self, axes: List[int], generators: List[ScanGenerator]):
+        self.axes = axes
+        self.generators = generators
 
-    max_level = 0
-    while True:
+    def has_level(self, level: int) -> bool:
+        return self.generators[0].has_level(level)
+
+    def points_for_level(self, level: int, rng) -> np.ndarray:
+        """Return the points for the given level as an array of shape
+        ``(num_points, len(self.axes))``.
+        """
+        first = self.generators[0]
+        if isinstance(first, SampledGenerator):
+            assert level == 0
+            unit = first.sampler.sample(rng)
+            return np.stack([g.scale(unit[:, g.dimension]) for g in self.generators],
+                            axis=-1)
+        points = np.asarray(first.points_for_level(level, rng))
+        return points.reshape((len(points), 1))
+
+    def total_num_points(self) -> Optional[int]:
+        return self.generators[0].total_num_points()
+
+    def num_points_for_level(self, level: int) -> Optional[int]:
+        return self.generators[0].num_points_for_level(level)
+
+
+def _make_product_factors(axis_generators: List[ScanGenerator]) -> List[_ProductFactor]:
+    factors = []
+    factors_by_sampler = {}
+    for i, g in enumerate(axis_generators):
+        if isinstance(g, SampledGenerator):
+            factor = factors_by_sampler.get(g.sampler, None)
+            if factor is not None:
+                factor.axes.append(i)
+                factor.generators.append(g)
+                continue
+            factor = _ProductFactor([i], [g])
+            factors_by_sampler[g.sampler] = factor
+        else:
+            factor = _ProductFactor([i], [g])
+        factors.append(factor)
+    return factors
+
+
+class _RandomPermutation:
+    """A pseudo-random bijection of the integers ``0, …, size - 1`` onto themselves.
+
+    The permutation is computed on the fly, using a small Feistel network on the next
+    larger even power of two together with cycle walking, so that randomly ordered
+    indices can be generated lazily in constant memory, independently of ``size``.
+
+    :param size: The number of elements to permute.
+    :param rng: The NumPy random number generator to draw the round keys from.
+    :param num_rounds: The number of Feistel rounds.
+    """
+    def __init__(self, size: int, rng, num_rounds: int = 4):
+        self.size = size
+        num_bits = max(int(size - 1).bit_length(), 2)
+        self._half_bits = np.uint64((num_bits + 1) // 2)
+        self._half_mask = np.uint64((1 << int(self._half_bits)) - 1)
+        self._keys = rng.randint(0, 2**32, size=num_rounds, dtype=np.uint64)
+
+    def __call__(self, indices: np.ndarray) -> np.ndarray:
+        """Map the given array of indices to their permuted counterparts."""
+        result = self._permute_domain(np.asarray(indices, dtype=np.uint64))
+        # Cycle walking: Indices mapped outside the target range are permuted again
+        # until they land inside; as this is a bijection on the (larger) domain, the
+        # result is a bijection on the target range too.
+        out_of_range = result >= self.size
+        while np.any(out_of_range):
+            result[out_of_range] = self._permute_domain(result[out_of_range])
+            out_of_range = result >= self.size
+        return result.astype(np.int64)
+
+    def _permute_domain(self, x: np.ndarray) -> np.ndarray:
+        left = x >> self._half_bits
+        right = x & self._half_mask
+        for key in self._keys:
+            left, right = right, left ^ self._round_function(right, key)
+        return (left << self._half_bits) | right
+
+    def _round_function(self, x: np.ndarray, key: np.uint64) -> np.ndarray:
+        # Simple 32 bit integer hash (all products fit into 64 bits without overflow).
+        m32 = np.uint64(0xffffffff)
+        c = np.uint64(0x45d9f3b)
+        s = np.uint64(16)
+        x = ((x ^ key) * c) & m32
+        x = (((x >> s) ^ x) * c) & m32
+        x = (x >> s) ^ x
+        return x & self._half_mask
+
+
+class ScanPointSequence:
+    """The sequence of points visited during a multi-dimensional scan, supporting random
+    access as well as iteration.
+
+    Points are ordered level by level, with each level repeated
+    ``options.num_repeats`` times (see :func:`generate_points`). Any point can be
+    computed from its index without generating the preceding ones, which allows a scan
+    to be resumed part-way through, e.g. after an interruption.
+
+    Iterating over the sequence yields the points (as tuples of coordinates, one per
+    axis), starting from :attr:`position`. The position itself is only advanced by
+    :meth:`next_chunk` and :meth:`skip`, so several iterators do not interfere.
+    ``len()`` gives the total number of points, and is only supported for finite
+    sequences.
+
+    :param axis_generators: The generators for each scan axis.
+    :param options: The :class:`ScanOptions` to apply.
+    """
+    def __init__(self, axis_generators: List[ScanGenerator], options: ScanOptions):
+        self._axis_generators = axis_generators
+        self._options = options
+        self._rng = np.random.RandomState(options.seed)
+
+        self._num_axes = len(axis_generators)
+
+        # The scan is the Cartesian product of the points of these factors (in reverse
+        # order, such that the first axis varies fastest).
+        self._factors = _make_product_factors(axis_generators)[::-1]
+
+        #: The total number of points in the sequence, or ``None`` if it is unbounded.
+        self.num_points = _total_num_points(self._factors, options)
+
+        #: Whether later points depend on the results acquired for earlier ones (see
+        #: :attr:`ScanGenerator.depends_on_results`).
+        self.depends_on_results = any(g.depends_on_results for g in axis_generators)
+
+        #: The index of the next point to be returned by :meth:`next_chunk`.
+        self.position = 0
+
+        # Stores computed coordinates for each factor, indexed first by
+        # factor order, then by level.
+        self._factor_level_points = [[] for _ in self._factors]
+
+        # The (level, repeat) blocks generated so far, as pairs of points and the
+        # applicable permutation, with the flat index of their first point.
+        self._blocks = []
+        self._block_offsets = [0]
+        self._next_level = 0
+        self._all_levels_generated = False
+
+    def point_at(self, index: int) -> Tuple:
+        """Return the coordinates of the point with the given index.
+
+        :raises IndexError: If the sequence has fewer than ``index + 1`` points.
+        :raises ValueError: If the point depends on results not acquired yet (see
+            :attr:`depends_on_results`).
+        """
+        chunk = self.chunk_at(index, 1)
+        if chunk is None:
+            raise IndexError("Scan point index out of range: {}".format(index))
+        return tuple(values.tolist()[0] for values in chunk)
+
+    def chunk_at(self, start: int, max_size: int) -> Optional[Tuple[np.ndarray, ...]]:
+        """Return the coordinates of up to ``max_size`` consecutive points starting at
+        the given index, as one array per axis.
+
+        Chunks can span several levels and repeats; they only contain fewer than
+        ``max_size`` points if the end of the sequence is reached, or if the next level
+        cannot be generated yet as it depends on the results for the previous ones (see
+        :attr:`ScanGenerator.depends_on_results`).
+
+        :return: The coordinate arrays, or ``None`` if ``start`` is past the end of the
+            sequence.
+        """
+        parts = []
+        index = start
+        end = start + max_size
+        while index < end:
+            if (index > start and self.depends_on_results
+                    and index >= self._block_offsets[-1]):
+                break
+            b = self._find_block(index)
+            if b is None:
+                break
+            points, permutation = self._blocks[b]
+            offset = self._block_offsets[b]
+            block_end = min(end, self._block_offsets[b + 1])
+            indices = np.arange(index - offset, block_end - offset)
+            if permutation is not None:
+                indices = permutation(indices)
+            parts.append(points.points_at(indices))
+            index = block_end
+        if not parts:
+            return None
+        if len(parts) == 1:
+            return parts[0]
+        return tuple(np.concatenate(values) for values in zip(*parts))
+
+    def next_chunk(self, max_size: int) -> Optional[Tuple[np.ndarray, ...]]:
+        """Return the next chunk of up to ``max_size`` points starting at
+        :attr:`position` (see :meth:`chunk_at`), and advance the position accordingly.
+        """
+        chunk = self.chunk_at(self.position, max_size)
+        if chunk is not None:
+            self.position += len(chunk[0])
+        return chunk
+
+    def skip(self, n: int) -> None:
+        """Advance :attr:`position` by ``n`` points without generating them.
+
+        :raises ValueError: If :attr:`depends_on_results` is set, as the skipped points
+            would never be acquired.
+        """
+        if n != 0 and self.depends_on_results:
+            raise ValueError("Cannot skip points in scans that depend on results")
+        self.position += n
+
+    def __len__(self) -> int:
+        if self.num_points is None:
+            raise TypeError("Scan point sequence is unbounded")
+        return self.num_points
+
+    def __iter__(self) -> Iterator[Tuple]:
+        index = self.position
+        while True:
+            # Compute points in chunks to avoid creating a separate set of arrays for
+            # each point.
+            chunk = self.chunk_at(index, 1024)
+            if chunk is None:
+                return
+            yield from zip(*(values.tolist() for values in chunk))
+            index += len(chunk[0])
+
+    def _find_block(self, index: int) -> Optional[int]:
+        if index < 0:
+            raise IndexError("Negative scan point index: {}".format(index))
+        if (self.depends_on_results and index > self._block_offsets[-1]
+                and not self._all_levels_generated):
+            # Generating the levels in between would require their results.
+            raise ValueError("Cannot access scan point {} before preceding points have "
+                             "been acquired".format(index))
+        while index >= self._block_offsets[-1]:
+            if self._all_levels_generated:
+                return None
+            self._generate_next_level()
+        return bisect_right(self._block_offsets, index) - 1
+
+    def _generate_next_level(self) -> None:
+        # Random numbers need to be drawn in a fixed order (levels in order, and within
+        # each, axis points then permutations) for the sequence to only depend on the
+        # seed.
+        level = self._next_level
         found_new_levels = False
-        for i, a in enumerate(axis_generators[::-1]):
-            if a.has_level(max_level):
-                axis_level_points[i].append(a.points_for_level(max_level, rng))
+        for i, f in enumerate(self._factors):
+            if f.has_level(level):
+                self._factor_level_points[i].append(f.points_for_level(
+                    level, self._rng))
                 found_new_levels = True
 
         if not found_new_levels:
             # No levels left to exhaust, done.
+            self._all_levels_generated = True
             return
 
-        points = []
-
-        for axis_levels in product(*(range(len(p)) for p in axis_level_points)):
-            if all(lvl < max_level for lvl in axis_levels):
+        blocks = []
+        for factor_levels in product(*(range(len(p))
+                                       for p in self._factor_level_points)):
+            if all(lvl < level for lvl in factor_levels):
                 # Previously visited this combination already.
                 continue
-            tp = product(*(p[lvl] for (lvl, p) in zip(axis_levels, axis_level_points)))
-            points.extend(tp)
+            blocks.append(
+                [p[lvl] for (lvl, p) in zip(factor_levels, self._factor_level_points)])
+        points = _LevelPoints(blocks, [f.axes for f in self._factors], self._num_axes)
+        num_points = len(points)
+
+        for _ in range(self._options.num_repeats):
+            # With global randomisation, the points are visited in the order given by a
+            # random permutation of the flat index space, which is evaluated lazily to
+            # avoid materialising the (potentially huge) list of points.
+            permutation = None
+            if self._options.randomise_order_globally:
+                permutation = _RandomPermutation(num_points, self._rng)
+            self._blocks.append((points, permutation))
+            self._block_offsets.append(self._block_offsets[-1] + num_points)
+
+        self._next_level += 1
+
+
+def _total_num_points(factors: List[_ProductFactor],
+                      options: ScanOptions) -> Optional[int]:
+    counts = [f.total_num_points() for f in factors]
+    if options.num_repeats == 0 or 0 in counts:
+        return 0
+    if None in counts:
+        return None
+    return options.num_repeats * int(np.prod(counts, dtype=object))
+
+
+def count_points_per_level(axis_generators: List[ScanGenerator], options: ScanOptions,
+                           max_levels: int) -> List[Optional[int]]:
+    """Return the number of points (including repeats) the scan over the given axes
+    will visit in each level, without generating them.
+
+    :param axis_generators: The generators for each scan axis.
+    :param options: The :class:`ScanOptions` to apply.
+    :param max_levels: The maximum number of levels to consider, for scans with an
+        unbounded number of levels (e.g. using a :class:`RefiningGenerator`).
+
+    :return: A list with one entry per level (up to ``max_levels``), each either the
+        number of points or ``None`` if it is not known in advance.
+    """
+    factors = _make_product_factors(axis_generators)
+    counts = []
+    totals = [0] * len(factors)
+    prev_num_points = 0
+    for level in range(max_levels):
+        level_counts = [f.num_points_for_level(level) for f in factors]
+        if None in level_counts:
+            counts.append(None)
+            break
+        if not any(level_counts):
+            break
+        # Each level visits all the combinations of points that weren't visited before
+        # (see ScanPointSequence._generate_next_level()).
+        totals = [t + c for t, c in zip(totals, level_counts)]
+        num_points = int(np.prod(totals, dtype=object))
+        counts.append(options.num_repeats * (num_points - prev_num_points))
+        prev_num_points = num_points
+    return counts
+
+
+def generate_point_chunks(axis_generators: List[ScanGenerator], options: ScanOptions,
+                          chunk_size: int) -> Iterator[Tuple[np.ndarray, ...]]:
+    """Generate the points to visit for the given scan axes, in chunks of coordinate
+    arrays.
+
+    The points are produced in the same order as by :func:`generate_points`, but each
+    chunk is given as a tuple of NumPy arrays, one per axis, so that large scans can be
+    generated without creating a Python object for every point. All chunks but the
+    last contain exactly ``chunk_size`` points.
+
+    :param axis_generators: The generators for each scan axis.
+    :param options: The :class:`ScanOptions` to apply.
+    :param chunk_size: The maximum number of points per chunk.
+    """
+    points = ScanPointSequence(axis_generators, options)
+    while True:
+        chunk = points.next_chunk(chunk_size)
+        if chunk is None:
+            return
+        yield chunk
 
-        for _ in range(options.num_repeats):
-            if options.randomise_order_globally:
-                rng.shuffle(points)
 
-            for p in points:
-                yield p[::-1]
+def generate_points(axis_generators: List[ScanGenerator],
+                    options: ScanOptions) -> Iterator[Tuple]:
+    """Generate the points to visit for the given scan axes, one tuple of coordinates
+    at a time.
 
-        max_level += 1
+    See :func:`generate_point_chunks` for a more efficient alternative when dealing with
+    a large number of points, and :class:`ScanPointSequence` for random access.
+    """
+    return iter(ScanPointSequence(axis_generators, options))
@@ -6,23 +6,37 @@ will likely be used by end users via
 :class:`~ndscan.experiment.entry_point.FragmentScanExperiment` or subscans.
 """
 
+import logging
+import multiprocessing
+import multiprocessing.util
 import numpy as np
+import queue
+import random
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from types import MethodType
 from artiq.coredevice.exceptions import RTIOUnderflow
 from artiq.language import *
-from itertools import islice
-from typing import Any, Dict, List, Iterable, Iterator, Tuple
+from typing import Any, Dict, List, Iterable, Optional, Sequence, Tuple
 from .default_analysis import AnnotationContext, DefaultAnalysis
 from .fragment import ExpFragment, TransitoryError, RestartKernelTransitoryError
 from .parameters import ParamStore, type_string_to_param
-from .result_channels import ResultChannel, ResultSink
-from .scan_generator import generate_points, ScanGenerator, ScanOptions
+from .result_channels import (ArrayChannel, ArraySink, FloatChannel, IntChannel,
+                              NumericChannel, ResultChannel, ResultSink, _to_value_list)
+from .scan_generator import (ScanGenerator, ScanOptions, ScanPointSequence,
+                             count_points_per_level)
+from .timing import TimingLog
 from .utils import is_kernel
 
 __all__ = [
-    "ScanAxis", "ScanSpec", "ScanRunner", "filter_default_analyses", "describe_scan",
-    "describe_analyses"
+    "ScanAxis", "ScanPlan", "ScanSpec", "ScanRunner", "filter_default_analyses",
+    "describe_scan", "describe_analyses"
 ]
 
+logger = logging.getLogger(__name__)
+
 
 class ScanAxis:
     """Describes a single axis that is being scanned.
@@ -38,6 +52,69 @@ class ScanAxis:
         self.param_store = param_store
 
 
+class ScanPlan:
+    """Estimated cost of a scan, as computed by :meth:`ScanSpec.plan`.
+
+    :param points_per_level: The number of points visited in each level (including
+        repeats); see :func:`.count_points_per_level`.
+    :param is_complete: Whether ``points_per_level`` covers all levels of the scan
+        (otherwise, the scan continues beyond them).
+    :param bytes_per_point: The number of bytes stored for each scan point by axis
+        (``"axis_{i}"``) or result channel name, or ``None`` where this is not known in
+        advance (e.g. for opaque channels).
+    :param num_repeats: The number of repeats per point.
+    :param aggregate_repeats: Whether only one entry per unique point is stored (see
+        :attr:`.ScanOptions.aggregate_repeats`).
+    """
+    def __init__(self, points_per_level: List[Optional[int]], is_complete: bool,
+                 bytes_per_point: Dict[str, Optional[int]], num_repeats: int,
+                 aggregate_repeats: bool):
+        self.points_per_level = points_per_level
+        self.is_complete = is_complete and None not in points_per_level
+        self.bytes_per_point = bytes_per_point
+        self.num_repeats = num_repeats
+        self.aggregate_repeats = aggregate_repeats
+
+    @property
+    def num_points(self) -> Optional[int]:
+        """The total number of points in the scan, or ``None`` if it is unbounded (or
+        not known in advance)."""
+        return sum(self.points_per_level) if self.is_complete else None
+
+    def num_points_after_level(self, level: int) -> Optional[int]:
+        """Return the total number of points once the given level has been completed,
+        or ``None`` if not known in advance."""
+        counts = self.points_per_level[:level + 1]
+        if len(counts) <= level or None in counts:
+            return None
+        return sum(counts)
+
+    def num_bytes(self, num_points: Optional[int] = None) -> Dict[str, Optional[int]]:
+        """Return the estimated number of bytes stored for each axis/channel after the
+        given number of points (by default, the total number of points).
+
+        :return: A dictionary mapping each key in ``bytes_per_point`` to the number of
+            bytes, or ``None`` if not known in advance.
+        """
+        if num_points is None:
+            num_points = self.num_points
+        if num_points is not None and self.aggregate_repeats:
+            # Assume that points are evenly repeated.
+            num_points = -(-num_points // max(1, self.num_repeats))
+        return {
+            name: (None if (b is None or num_points is None) else b * num_points)
+            for name, b in self.bytes_per_point.items()
+        }
+
+    def describe(self) -> Dict[str, Any]:
+        """Return the plan in stringly typed dictionary form for the scan metadata."""
+        return {
+            "points_per_level": self.points_per_level,
+            "num_points": self.num_points,
+            "num_bytes": self.num_bytes()
+        }
+
+
 class ScanSpec:
     """Describes a single scan.
 
@@ -51,6 +128,42 @@ class ScanSpec:
         self.generators = generators
         self.options = options
 
+    def plan(self,
+             channels: Optional[Dict[str, ResultChannel]] = None,
+             max_levels: int = 16) -> ScanPlan:
+        """Estimate the number of points and the amount of data this scan produces,
+        without generating the points.
+
+        :param channels: The result channels saved for each point, by name.
+        :param max_levels: The maximum number of levels to consider for scans with an
+            unbounded number of levels.
+        """
+        counts = count_points_per_level(self.generators, self.options, max_levels + 1)
+        is_complete = len(counts) <= max_levels
+        bytes_per_point = {
+            "axis_{}".format(i): _bytes_per_value(a.param_schema["type"])
+            for i, a in enumerate(self.axes)
+        }
+        for name, channel in (channels or {}).items():
+            num_bytes = None
+            if isinstance(channel, NumericChannel):
+                num_bytes = 8
+                if self.options.aggregate_repeats:
+                    # Mean and standard error.
+                    num_bytes *= 2
+            elif isinstance(channel, ArrayChannel):
+                num_bytes = int(np.prod(channel.shape)) * channel.dtype.itemsize
+            bytes_per_point["channel_" + name] = num_bytes
+        if self.options.aggregate_repeats:
+            bytes_per_point["channel_repeat_count"] = 8
+        return ScanPlan(counts[:max_levels], is_complete, bytes_per_point,
+                        self.options.num_repeats, self.options.aggregate_repeats)
+
+
+def _bytes_per_value(type_string: str) -> Optional[int]:
+    # Stored as 64 bit values in NumPy arrays/HDF5 files.
+    return 8 if type_string in ("float", "int") else None
+
 
 class ScanRunner(HasEnvironment):
     """Runs the actual loop that executes an :class:`.ExpFragment` for a specified list
@@ -66,83 +179,319 @@ class ScanRunner(HasEnvironment):
     # metaprogramming. While the interface for this class is effortlessly generic, the
     # implementation might well be a long-forgotten ritual for invoking Cthulhu.
 
+    #: Number of scan points to generate at once for host-side scans.
+    HOST_CHUNK_SIZE = 1024
+
+    #: Initial number of scan points to send to the core device at once. After each
+    #: chunk, the kernel needs to execute a blocking RPC to fetch new points, so the
+    #: chunk size is subsequently adapted based on the measured time per point and RPC
+    #: round-trip time (see :attr:`KERNEL_CHUNK_RPC_OVERHEAD`). 10 is an arbitrary
+    #: choice based on the observation that even for fast experiments, 10 points take a
+    #: good fraction of a second, while it is still low enough not to run into any
+    #: memory management issues on the kernel.
+    KERNEL_CHUNK_SIZE = 10
+
+    #: Target fraction of the time spent in the RPCs fetching new chunks of points,
+    #: relative to the time spent executing the points themselves.
+    KERNEL_CHUNK_RPC_OVERHEAD = 0.05
+
     def build(self,
               max_rtio_underflow_retries: int = 3,
-              max_transitory_error_retries: int = 10):
+              max_transitory_error_retries: int = 10,
+              min_kernel_chunk_size: int = 1,
+              max_kernel_chunk_size: int = 256,
+              prefetch_kernel_chunks: bool = True,
+              batch_kernel_results: bool = False,
+              publish_host_results: bool = False,
+              max_pending_host_results: int = 1024,
+              num_host_processes: int = 1,
+              timing_log: Optional[TimingLog] = None):
         """
         :param max_rtio_underflow_retries: Number of RTIOUnderflows to tolerate per scan
             point (by simply trying again) before giving up.
         :param max_transitory_error_retries: Number of transitory errors to tolerate per
             scan point (by simply trying again) before giving up.
+        :param min_kernel_chunk_size: Lower limit for the number of points sent to the
+            core device at once.
+        :param max_kernel_chunk_size: Upper limit for the number of points sent to the
+            core device at once (limits the kernel memory usage).
+        :param prefetch_kernel_chunks: Whether to prepare the next chunk of points on
+            the host while the current one is still executing on the core device, such
+            that the RPC at the chunk boundary returns without delay. Not used for
+            scans whose points depend on the results (e.g. adaptive scans).
+        :param batch_kernel_results: Whether to buffer the values pushed to numeric
+            result channels and the completed points on the core device, and only
+            transfer them to the host once per chunk (rather than using one RPC per
+            point and channel). Values pushed from kernels need to be convertible to the
+            channel type on the core device (``float`` for :class:`.FloatChannel`,
+            ``int32`` for :class:`.IntChannel`). As the host-side parameter stores are
+            then only updated at the end of each chunk, this should not be used with
+            fragments that rely on them during kernel scans (e.g. for RPCs from
+            ``device_setup()``).
+        :param publish_host_results: Whether to push coordinates and results to their
+            sinks from a background thread during host scans, such that slow sinks
+            (e.g. dataset broadcasts) do not delay the next measurement. As ARTIQ IPC
+            is not thread-safe, this should not be used with fragments that access
+            datasets or the scheduler themselves while running.
+        :param max_pending_host_results: Number of values that can be queued for the
+            background thread before the scan blocks until it has caught up.
+        :param num_host_processes: Number of worker processes to distribute the points
+            of host scans over (only for fragments without kernels, and only on
+            platforms supporting ``fork()``). Each worker process inherits a copy of the
+            fragment, so fragments must not rely on state shared between points, or on
+            accessing datasets or the scheduler while running. For reproducibility, the
+            random number generators of the ``random`` and ``numpy.random`` modules are
+            seeded for each point from the scan seed and the point index.
+        :param timing_log: If given, the durations of the different phases of the scan
+            are recorded in this :class:`.TimingLog`:
+
+            * ``host_setup``, ``host_cleanup``, ``pause``: once per occurrence.
+            * ``fetch``: generating the next chunk of points (for kernel scans, the
+              round-trip time of the RPC as measured on the core device).
+            * ``set_point``, ``device_setup``, ``run_once``, ``check_pause``: once per
+              point for host scans (``run_once`` includes pushing the results).
+            * ``wait``: once per point for host scans using multiple processes (the
+              time spent waiting for the results from the workers).
+            * ``kernel_point``: for kernel scans, the mean time per point on the core
+              device, once per chunk.
+            * ``push``: pushing the coordinates and (for kernel and multi-process scans)
+              results of a point to the sinks, once per point (or per chunk of points
+              for kernel scans with ``batch_kernel_results``).
         """
         self.max_rtio_underflow_retries = max_rtio_underflow_retries
         self.max_transitory_error_retries = max_transitory_error_retries
+        self.min_kernel_chunk_size = min_kernel_chunk_size
+        self.max_kernel_chunk_size = max_kernel_chunk_size
+        self.prefetch_kernel_chunks = prefetch_kernel_chunks
+        self.batch_kernel_results = batch_kernel_results
+        self.publish_host_results = publish_host_results
+        self.max_pending_host_results = max_pending_host_results
+        self.num_host_processes = num_host_processes
+        self.timing_log = timing_log
+
+        #: The number of scan points currently sent to the core device at once (tuned
+        #: automatically during kernel scans; exposed for diagnostics).
+        self.kernel_chunk_size = min(max(self.KERNEL_CHUNK_SIZE, min_kernel_chunk_size),
+                                     max_kernel_chunk_size)
         self.setattr_device("core")
         self.setattr_device("scheduler")
 
-    def run(self, fragment: ExpFragment, spec: ScanSpec,
-            axis_sinks: List[ResultSink]) -> None:
+    def run(self,
+            fragment: ExpFragment,
+            spec: ScanSpec,
+            axis_sinks: List[ResultSink],
+            start_index: int = 0) -> None:
         """Run a scan of the given fragment, with axes as specified.
 
         :param fragment: The fragment to iterate.
         :param options: The options for the scan generator.
         :param axis_sinks: A list of :class:`.ResultSink` instances to push the
             coordinates for each scan point to, matching ``scan.axes``.
+        :param start_index: The index of the first point to acquire; earlier points
+            are skipped (e.g. to resume a previously interrupted scan). Not supported
+            for scans whose points depend on the results (e.g. adaptive scans).
+
+        :raises ValueError: If ``start_index`` is given for a scan that does not
+            support it.
         """
 
-        points = generate_points(spec.generators, spec.options)
+        points = ScanPointSequence(spec.generators, spec.options)
+        points.skip(start_index)
 
         # TODO: Support parameters which require host_setup() when changed.
-        run_impl = self._run_scan_on_core_device if is_kernel(
-            fragment.run_once) else self._run_scan_on_host
-        run_impl(fragment, points, spec.axes, axis_sinks)
+        if is_kernel(fragment.run_once):
+            self._run_scan_on_core_device(fragment, points, spec.axes, axis_sinks)
+        elif self.num_host_processes > 1:
+            self._run_scan_in_processes(fragment, points, spec.axes, axis_sinks,
+                                        spec.options.seed)
+        else:
+            self._run_scan_on_host(fragment, points, spec.axes, axis_sinks)
 
-    def _run_scan_on_host(self, fragment: ExpFragment, points: Iterator[Tuple],
+    def _run_scan_on_host(self, fragment: ExpFragment, points: ScanPointSequence,
                           axes: List[ScanAxis], axis_sinks: List[ResultSink]) -> None:
+        if not self.publish_host_results:
+            self._run_host_loop(fragment, points, axes, axis_sinks, None)
+            return
+
+        publisher = _SinkPublisher(self.max_pending_host_results)
+        channels = {}
+        fragment._collect_result_channels(channels)
+        published_sinks = {
+            channel: publisher.wrap(channel.sink)
+            for channel in channels.values() if channel.sink is not None
+        }
+        for channel, sink in published_sinks.items():
+            channel.set_sink(sink)
+        try:
+            self._run_host_loop(fragment, points, axes,
+                                [publisher.wrap(sink) for sink in axis_sinks],
+                                publisher)
+        finally:
+            try:
+                publisher.close()
+            finally:
+                for channel, sink in published_sinks.items():
+                    channel.set_sink(sink.sink)
+
+    def _run_host_loop(self, fragment: ExpFragment, points: ScanPointSequence,
+                       axes: List[ScanAxis], axis_sinks: List[ResultSink],
+                       publisher: Optional["_SinkPublisher"]) -> None:
+        def next_chunk():
+            t = time.perf_counter()
+            if publisher and points.depends_on_results:
+                # The next points might depend on all the results so far.
+                publisher.flush()
+            chunk = points.next_chunk(self.HOST_CHUNK_SIZE)
+            if chunk is not None:
+                chunk = _coerce_chunk(axes, chunk)
+            self._record_duration("fetch", t)
+            return chunk
+
+        # Serialise scheduler calls with the sink I/O done by the publisher thread.
+        ipc_lock = publisher.lock if publisher else nullcontext()
+
+        chunks = iter(next_chunk, None)
+        values = (p for chunk in chunks for p in zip(*chunk))
         while True:
             try:
+                t = time.perf_counter()
                 fragment.host_setup()
+                self._record_duration("host_setup", t)
                 try:
                     while True:
-                        axis_values = next(points, None)
+                        axis_values = next(values, None)
                         if axis_values is None:
                             return
+                        t = time.perf_counter()
                         for (axis, value, sink) in zip(axes, axis_values, axis_sinks):
                             axis.param_store.set_value(value)
                             sink.push(value)
+                        t = self._record_duration("set_point", t)
                         fragment.device_setup()
+                        t = self._record_duration("device_setup", t)
                         fragment.run_once()
-                        if self.scheduler.check_pause():
+                        t = self._record_duration("run_once", t)
+                        with ipc_lock:
+                            should_pause = self.scheduler.check_pause()
+                        self._record_duration("check_pause", t)
+                        if should_pause:
                             break
                 finally:
                     fragment.device_cleanup()
             finally:
+                t = time.perf_counter()
                 fragment.host_cleanup()
+                self._record_duration("host_cleanup", t)
+            t = time.perf_counter()
+            # Make sure the datasets are up to date while paused.
+            if publisher:
+                publisher.flush()
+            self._flush_sinks(fragment, axis_sinks)
             self.scheduler.pause()
             fragment.recompute_param_defaults()
+            self._record_duration("pause", t)
 
-    def _run_scan_on_core_device(self, fragment: ExpFragment, points: list,
+    def _run_scan_in_processes(self, fragment: ExpFragment, points: ScanPointSequence,
+                               axes: List[ScanAxis], axis_sinks: List[ResultSink],
+                               seed: int) -> None:
+        global _host_worker_state
+
+        channels = {}
+        fragment._collect_result_channels(channels)
+        channels = [c for c in channels.values() if c.sink is not None]
+
+        # The points submitted to the workers (axis values and the pending results),
+        # in order.
+        pending = deque()
+
+        def complete_point():
+            t = time.perf_counter()
+            axis_values, result = pending.popleft()
+            channel_values = result.get()
+            t = self._record_duration("wait", t)
+            for value, sink in zip(axis_values, axis_sinks):
+                sink.push(value)
+            for values, channel in zip(channel_values, channels):
+                for value in values:
+                    channel.sink.push(value)
+            self._record_duration("push", t)
+
+        def next_chunk():
+            if points.depends_on_results:
+                # The next points might depend on all the results so far.
+                while pending:
+                    complete_point()
+            t = time.perf_counter()
+            chunk = points.next_chunk(self.HOST_CHUNK_SIZE)
+            if chunk is not None:
+                chunk = _coerce_chunk(axes, chunk)
+            self._record_duration("fetch", t)
+            return chunk
+
+        chunks = iter(next_chunk, None)
+        values = (p for chunk in chunks for p in zip(*chunk))
+        point_index = points.position
+        context = multiprocessing.get_context("fork")
+        while True:
+            # The workers are forked from this process, and thus inherit the fragment
+            # (with the current parameter values) through this global.
+            _host_worker_state = (fragment, axes, channels, seed)
+            pool = context.Pool(self.num_host_processes, _init_host_worker)
+            try:
+                finished = False
+                while True:
+                    # Keep enough points in flight for all workers to stay busy.
+                    while len(pending) < 2 * self.num_host_processes:
+                        axis_values = next(values, None)
+                        if axis_values is None:
+                            break
+                        pending.append((axis_values,
+                                        pool.apply_async(_run_host_worker_point,
+                                                         (point_index, axis_values))))
+                        point_index += 1
+                    if not pending:
+                        finished = True
+                        break
+                    complete_point()
+                    t = time.perf_counter()
+                    should_pause = self.scheduler.check_pause()
+                    self._record_duration("check_pause", t)
+                    if should_pause:
+                        break
+                while pending:
+                    complete_point()
+                pool.close()
+                pool.join()
+            finally:
+                pool.terminate()
+                _host_worker_state = None
+            if finished:
+                return
+            t = time.perf_counter()
+            self._flush_sinks(fragment, axis_sinks)
+            self.scheduler.pause()
+            fragment.recompute_param_defaults()
+            self._record_duration("pause", t)
+
+    def _run_scan_on_core_device(self, fragment: ExpFragment, points: ScanPointSequence,
                                  axes: List[ScanAxis],
                                  axis_sinks: List[ResultSink]) -> None:
         # Stash away _ragment in member variable to pacify ARTIQ compiler; there is no
         # reason this shouldn't just be passed along and materialised as a global.
         self._kscan_fragment = fragment
 
-        # Set up members to be accessed from the kernel through the
-        # _kscan_param_values_chunk RPC call later.
-        self._kscan_points = points
-        self._kscan_axes = axes
-        self._kscan_axis_sinks = axis_sinks
-
-        # Stash away points in current kernel chunk until they have been marked
-        # complete so we can resume from interruptions.
-        self._kscan_current_chunk = []
+        self._kscan_set_up_points(points, axes, axis_sinks)
 
         # Interval between scheduler.check_pause() calls on the core device (or rather,
         # the minimum interval; calls are only made after a point has been completed).
         self._kscan_pause_check_interval_mu = self.core.seconds_to_mu(0.2)
         self._kscan_last_pause_check_mu = np.int64(0)
 
+        # Timestamps/durations used to tune the kernel chunk size; see
+        # _kscan_update_chunk_size().
+        self._kscan_chunk_start_mu = np.int64(0)
+        self._kscan_last_fetch_mu = np.int64(0)
+
         # _kscan_param_values_chunk returns a tuple of lists of values, one for each
         # scan axis. Synthesize a return type annotation (`def foo(self): -> …`) with
         # the concrete type for this scan so the compiler can infer the types in
@@ -167,26 +516,101 @@ class ScanRunner(HasEnvironment):
                     axis.param_store.set_value)
         run_chunk = self._build_kscan_run_chunk(len(axes))
 
-        self._kscan_update_host_param_stores()
-        while True:
-            try:
-                self._kscan_fragment.host_setup()
-                self._kscan_run_loop(run_chunk)
-                if self._kscan_is_out_of_points():
-                    # No more points; finished successfully.
-                    return
-            finally:
-                self._kscan_fragment.host_cleanup()
-            self.core.comm.close()
-            self.scheduler.pause()
-            self._kscan_fragment.recompute_param_defaults()
+        self._kscan_set_up_results(fragment)
+
+        # Similarly, the calls to the kernel-side result buffers are generated as code,
+        # as there is no way to iterate over a list of objects of different types.
+        for i, buffer in enumerate(self._kscan_result_buffers):
+            setattr(self, "_kscan_result_buffer_{}".format(i), buffer)
+        for method in ["commit", "discard", "flush"]:
+            setattr(self, "_kscan_{}_result_buffers".format(method),
+                    self._build_kscan_result_buffer_calls(method))
+
+        stages = self._kscan_result_buffers + self._kscan_staging_sinks
+        for stage in stages:
+            stage.install()
+        try:
+            self._kscan_update_host_param_stores()
+            while True:
+                try:
+                    t = time.perf_counter()
+                    self._kscan_fragment.host_setup()
+                    self._record_duration("host_setup", t)
+                    self._kscan_run_loop(run_chunk)
+                    if self._kscan_is_out_of_points():
+                        # No more points; finished successfully.
+                        return
+                finally:
+                    t = time.perf_counter()
+                    self._kscan_fragment.host_cleanup()
+                    self._record_duration("host_cleanup", t)
+                t = time.perf_counter()
+                self.core.comm.close()
+                self._flush_sinks(self._kscan_fragment, self._kscan_axis_sinks)
+                self.scheduler.pause()
+                self._kscan_fragment.recompute_param_defaults()
+                self._record_duration("pause", t)
+        finally:
+            for stage in stages:
+                stage.uninstall()
+
+    def _kscan_set_up_points(self, points: ScanPointSequence, axes: List[ScanAxis],
+                             axis_sinks: List[ResultSink]) -> None:
+        # Set up members to be accessed from the kernel through the
+        # _kscan_param_values_chunk RPC call later.
+        self._kscan_points = points
+        self._kscan_axes = axes
+        self._kscan_axis_sinks = axis_sinks
+
+        # Stash away the (coerced) per-axis values of the points in the current kernel
+        # chunk until they have been marked complete so we can resume from
+        # interruptions.
+        self._kscan_current_chunk = [[] for _ in axes]
+
+        # Per-axis values of the points to be sent to the core device next, prepared
+        # ahead of time while the current chunk is executing (if enabled).
+        self._kscan_prefetched_chunk = [[] for _ in axes]
+
+        # Number of points completed since the last chunk was fetched.
+        self._kscan_num_points_since_fetch = 0
+
+        # Number of points completed on the core device since the last call to
+        # _kscan_points_completed() (only used if results are batched).
+        self._kscan_num_completed = 0
+
+        # Set up by _kscan_set_up_results().
+        self._kscan_result_buffers = []
+        self._kscan_staging_sinks = []
+        self._kscan_unpushed_channels = set()
+
+    def _kscan_set_up_results(self, fragment: ExpFragment) -> None:
+        # Values pushed to result channels are staged until the respective point has
+        # been completed, such that they can be discarded if it needs to be retried.
+        # With batching, this happens on the core device for numeric channels.
+        channels = {}
+        fragment._collect_result_channels(channels)
+        for channel in channels.values():
+            if channel.sink is None or channel.is_muted():
+                continue
+            buffer = None
+            if self.batch_kernel_results:
+                buffer = _make_kernel_result_buffer(channel, self.max_kernel_chunk_size)
+            if buffer is None:
+                self._kscan_staging_sinks.append(_StagingSink(channel))
+            else:
+                self._kscan_result_buffers.append(buffer)
 
     def _build_kscan_run_chunk(self, num_axes):
         param_decl = " ".join("p{0},".format(idx) for idx in range(num_axes))
         code = ""
-        code += "({}) = self._kscan_param_values_chunk()\n".format(param_decl)
+        code += "t0 = self.core.get_rtio_counter_mu()\n"
+        code += ("({}) = self._kscan_param_values_chunk(self._kscan_last_fetch_mu, "
+                 "t0 - self._kscan_chunk_start_mu)\n").format(param_decl)
+        code += "self._kscan_chunk_start_mu = self.core.get_rtio_counter_mu()\n"
+        code += "self._kscan_last_fetch_mu = self._kscan_chunk_start_mu - t0\n"
         code += "if not p0:\n"  # No more points
         code += "    return True\n"
+        code += "self._kscan_prefetch_points()\n"
         code += "for i in range(len(p0)):\n"
         for idx in range(num_axes):
             code += "    self._kscan_param_setter_{0}(p{0}[i])\n".format(idx)
@@ -195,16 +619,31 @@ class ScanRunner(HasEnvironment):
         code += "return False"
         return kernel_from_string(["self"], code)
 
+    def _build_kscan_result_buffer_calls(self, method):
+        code = "pass\n"
+        for idx in range(len(self._kscan_result_buffers)):
+            code += "self._kscan_result_buffer_{}.{}()\n".format(idx, method)
+        return MethodType(kernel_from_string(["self"], code, portable), self)
+
     @kernel
     def _kscan_run_loop(self, run_chunk):
         try:
             self._kscan_last_pause_check_mu = self.core.get_rtio_counter_mu()
+            # No timing information is available for the first chunk after (re-)entering
+            # the kernel.
+            self._kscan_last_fetch_mu = np.int64(0)
             while True:
                 # Fetch chunk in separate function to make sure stack memory is released
                 # every time.
                 if run_chunk(self):
                     return
+                self._kscan_flush_results()
         finally:
+            # Transfer any results still buffered (also for the points completed before
+            # an exception, as would be the case without batching), and drop those of
+            # any incomplete point.
+            self._kscan_flush_results()
+            self._kscan_discard_result_buffers()
             self._kscan_fragment.device_cleanup()
 
     @kernel
@@ -245,9 +684,20 @@ class ScanRunner(HasEnvironment):
                 print("Caught transitory error (", num_transitory_errors, "/",
                       self.max_transitory_error_retries, "), retrying")
                 self._kscan_retry_point()
-        self._kscan_point_completed()
+        if self.batch_kernel_results:
+            self._kscan_commit_result_buffers()
+            self._kscan_num_completed += 1
+        else:
+            self._kscan_point_completed()
         return False
 
+    @kernel
+    def _kscan_flush_results(self):
+        self._kscan_flush_result_buffers()
+        if self._kscan_num_completed > 0:
+            self._kscan_points_completed(self._kscan_num_completed)
+            self._kscan_num_completed = 0
+
     @kernel
     def _kscan_should_pause(self) -> TBool:
         current_time_mu = self.core.get_rtio_counter_mu()
@@ -258,45 +708,177 @@ class ScanRunner(HasEnvironment):
                 return True
         return False
 
-    def _kscan_param_values_chunk(self):
-        # Number of scan points to send at once. After each chunk, the kernel needs to
-        # execute a blocking RPC to fetch new points, so this should be chosen such
-        # that latency/constant overhead and throughput are balanced. 10 is an arbitrary
-        # choice based on the observation that even for fast experiments, 10 points take
-        # a good fraction of a second, while it is still low enough not to run into any
-        # memory management issues on the kernel.
-        CHUNK_SIZE = 10
-
-        self._kscan_current_chunk.extend(
-            islice(self._kscan_points, CHUNK_SIZE - len(self._kscan_current_chunk)))
-
-        values = tuple([] for _ in self._kscan_axes)
-        for p in self._kscan_current_chunk:
-            for i, (value, axis) in enumerate(zip(p, self._kscan_axes)):
-                # KLUDGE: Explicitly coerce value to the target type here so we can use
-                # the regular (float) scans for integers until proper support for int
-                # scans is implemented.
-                values[i].append(axis.param_store.coerce(value))
-        return values
+    def _kscan_param_values_chunk(self, last_fetch_mu=None, last_chunk_mu=None):
+        """Return the parameter values for the next chunk of points.
+
+        :param last_fetch_mu: The round-trip time of the previous call from the kernel
+            as measured on the core device, or 0 if not available. ``None`` for calls
+            from the host.
+        :param last_chunk_mu: The time the points since the previous call from the
+            kernel took to execute.
+        """
+        if last_fetch_mu is not None:
+            self._kscan_update_chunk_size(last_fetch_mu, last_chunk_mu)
+
+        # Top up the current chunk with new points; any points not completed yet (e.g.
+        # after the kernel was left to pause) are sent again.
+        num_pending = len(self._kscan_current_chunk[0])
+        num_missing = self.kernel_chunk_size - num_pending
+        if self._kscan_points.depends_on_results and num_pending > 0:
+            # Fetching more points might generate the next level of an adaptive scan
+            # before the results for the pending points are in.
+            num_missing = 0
+        if num_missing > 0:
+            # Use up any prefetched points first.
+            num_prefetched = min(num_missing, len(self._kscan_prefetched_chunk[0]))
+            for values, new_values in zip(self._kscan_current_chunk,
+                                          self._kscan_prefetched_chunk):
+                values.extend(new_values[:num_prefetched])
+                del new_values[:num_prefetched]
+            self._kscan_append_new_points(self._kscan_current_chunk,
+                                          num_missing - num_prefetched)
+        return tuple(values.copy() for values in self._kscan_current_chunk)
 
     @rpc(flags={"async"})
+    def _kscan_prefetch_points(self):
+        """Prepare the points for the next chunk ahead of time.
+
+        Called asynchronously by the kernel after fetching a chunk, i.e. executed while
+        the core device is busy running its points.
+        """
+        if not self.prefetch_kernel_chunks or self._kscan_points.depends_on_results:
+            return
+        self._kscan_append_new_points(
+            self._kscan_prefetched_chunk,
+            self.kernel_chunk_size - len(self._kscan_prefetched_chunk[0]))
+
+    @host_only
+    def _kscan_append_new_points(self, chunk_values: List[list], num: int) -> None:
+        if num <= 0:
+            return
+        chunk = self._kscan_points.next_chunk(num)
+        if chunk is None:
+            return
+        for values, new_values in zip(chunk_values,
+                                      _coerce_chunk(self._kscan_axes, chunk)):
+            values.extend(new_values)
+
+    @host_only
+    def _kscan_update_chunk_size(self, last_fetch_mu, last_chunk_mu):
+        num_points = self._kscan_num_points_since_fetch
+        self._kscan_num_points_since_fetch = 0
+        if last_fetch_mu <= 0 or last_chunk_mu <= 0 or num_points == 0:
+            return
+        point_mu = last_chunk_mu / num_points
+
+        if self.timing_log is not None:
+            self.timing_log.record("fetch", self.core.mu_to_seconds(last_fetch_mu))
+            self.timing_log.record("kernel_point", self.core.mu_to_seconds(point_mu))
+
+        # Choose the chunk size such that fetching new points only takes a small
+        # fraction of the total time…
+        size = last_fetch_mu / (self.KERNEL_CHUNK_RPC_OVERHEAD * point_mu)
+
+        # …but make sure the fetch itself (during which pause requests are not checked)
+        # stays within the pause check interval, assuming the cost scales linearly with
+        # the chunk size.
+        if last_fetch_mu > self._kscan_pause_check_interval_mu:
+            size = min(
+                size, self.kernel_chunk_size * self._kscan_pause_check_interval_mu /
+                last_fetch_mu)
+
+        # Change the chunk size gradually to be robust against outliers (e.g. due to
+        # host load).
+        size = min(max(size, self.kernel_chunk_size / 2), self.kernel_chunk_size * 2)
+        size = min(max(int(round(size)), self.min_kernel_chunk_size),
+                   self.max_kernel_chunk_size)
+        if size != self.kernel_chunk_size:
+            logger.debug(
+                "Changing kernel chunk size from %s to %s (%s mu per point, "
+                "%s mu per fetch)", self.kernel_chunk_size, size, point_mu,
+                last_fetch_mu)
+            self.kernel_chunk_size = size
+
+    @kernel
     def _kscan_retry_point(self):
-        # TODO: Ensure any values pushed to result channels in this iteration are
-        # discarded. For this, we'll need to make ScanRunner aware of the result channel
-        # sinks (not just the axis sinks), or "rebind" the fragment's result channels
-        # to intercept values locally and only forward them to the real sinks in
-        # _kscan_point_completed.
-        pass
+        # Discard any values pushed to result channels in this iteration.
+        self._kscan_discard_result_buffers()
+        self._kscan_discard_staged_results()
+
+    @rpc(flags={"async"})
+    def _kscan_discard_staged_results(self):
+        for sink in self._kscan_staging_sinks:
+            sink.discard()
+        # Host-side copies (values pushed from RPCs).
+        for buffer in self._kscan_result_buffers:
+            buffer.discard()
 
     @rpc(flags={"async"})
     def _kscan_point_completed(self):
-        values = self._kscan_current_chunk.pop(0)
-        for value, sink in zip(values, self._kscan_axis_sinks):
-            sink.push(value)
+        t = time.perf_counter()
+        self._kscan_commit_results(1)
+        self._kscan_advance_points(1)
+        self._record_duration("push", t)
 
-        # TODO: Warn if some result channels have not been pushed to.
+    @rpc(flags={"async"})
+    def _kscan_points_completed(self, num_points):
+        # Batched equivalent of _kscan_point_completed(); the values for the points
+        # have just been transferred from the kernel-side buffers.
+        t = time.perf_counter()
+        self._kscan_commit_results(num_points)
+        self._kscan_advance_points(num_points)
+        self._record_duration("push", t)
+
+    @host_only
+    def _kscan_commit_results(self, num_points):
+        unpushed = []
+        for sink in self._kscan_staging_sinks:
+            if not sink.commit():
+                unpushed.append(sink.channel)
+        for buffer in self._kscan_result_buffers:
+            # Values pushed from RPCs are buffered in the host-side copy.
+            buffer.commit()
+            buffer.flush()
+            if buffer.num_forwarded < num_points:
+                unpushed.append(buffer.channel)
+            buffer.num_forwarded = 0
+
+        for channel in unpushed:
+            # Only warn once per channel to avoid flooding the log.
+            if channel not in self._kscan_unpushed_channels:
+                self._kscan_unpushed_channels.add(channel)
+                logger.warning(
+                    "No value pushed to result channel '%s' for scan point (further "
+                    "occurrences will not be reported)", channel.path)
+
+    @host_only
+    def _kscan_advance_points(self, num_points):
+        for _ in range(num_points):
+            for values, sink in zip(self._kscan_current_chunk, self._kscan_axis_sinks):
+                sink.push(values.pop(0))
+            self._kscan_num_points_since_fetch += 1
+            self._kscan_update_host_param_stores()
 
-        self._kscan_update_host_param_stores()
+    @host_only
+    def _flush_sinks(self, fragment: ExpFragment, axis_sinks: List[ResultSink]) -> None:
+        """Flush the axis and result channel sinks (e.g. before pausing)."""
+        channels = {}
+        fragment._collect_result_channels(channels)
+        for sink in axis_sinks + [c.sink for c in channels.values()]:
+            if sink is not None:
+                sink.flush()
+
+    @host_only
+    def _record_duration(self, phase: str, start: float) -> float:
+        """Record the time elapsed since ``start`` for the given phase in the timing
+        log (if any).
+
+        :return: The current time (to be used as the start of the next phase).
+        """
+        now = time.perf_counter()
+        if self.timing_log is not None:
+            self.timing_log.record(phase, now - start)
+        return now
 
     @host_only
     def _kscan_update_host_param_stores(self):
@@ -311,17 +893,286 @@ class ScanRunner(HasEnvironment):
         if self._kscan_is_out_of_points():
             return
         # Set the host-side parameter stores.
-        next_values = self._kscan_current_chunk[0]
-        for value, axis in zip(next_values, self._kscan_axes):
-            axis.param_store.set_value(value)
+        for values, axis in zip(self._kscan_current_chunk, self._kscan_axes):
+            axis.param_store.set_value(values[0])
 
     @host_only
     def _kscan_is_out_of_points(self):
-        if self._kscan_current_chunk:
+        if self._kscan_current_chunk[0]:
             return False
         # Current chunk is empty, but we might be at a chunk boundary.
         self._kscan_param_values_chunk()
-        return not self._kscan_current_chunk
+        return not self._kscan_current_chunk[0]
+
+
+#: The fragment, scan axes, result channels and seed of the parallel host scan being
+#: run, to be inherited by the worker processes.
+_host_worker_state = None
+
+
+def _init_host_worker() -> None:
+    fragment, _, channels, _ = _host_worker_state
+    # Collect the results locally to send them back to the parent process.
+    for channel in channels:
+        channel.set_sink(ArraySink())
+    fragment.host_setup()
+    # Run when the worker process exits after the pool has been closed.
+    multiprocessing.util.Finalize(None, _clean_up_host_worker, exitpriority=10)
+
+
+def _clean_up_host_worker() -> None:
+    fragment = _host_worker_state[0]
+    try:
+        fragment.device_cleanup()
+    finally:
+        fragment.host_cleanup()
+
+
+def _run_host_worker_point(point_index: int, axis_values: tuple) -> List[List[Any]]:
+    fragment, axes, channels, seed = _host_worker_state
+    for axis, value in zip(axes, axis_values):
+        axis.param_store.set_value(value)
+
+    # Make the results independent of how the points are distributed between the
+    # workers.
+    point_seed = np.random.SeedSequence([seed, point_index]).generate_state(1)[0]
+    random.seed(int(point_seed))
+    np.random.seed(point_seed)
+
+    for channel in channels:
+        channel.sink.clear()
+    fragment.device_setup()
+    fragment.run_once()
+    return [channel.sink.get_all() for channel in channels]
+
+
+class _SinkPublisher:
+    """Pushes values to result sinks from a background thread.
+
+    Values are delivered in the order they were pushed (across all sinks). If too many
+    values are pending, pushing blocks until the thread has caught up. Exceptions
+    raised by the sinks are re-raised in the pushing thread.
+    """
+    def __init__(self, max_pending: int):
+        #: Held while pushing to a sink; to be used to serialise other I/O with it.
+        self.lock = threading.Lock()
+        self._queue = queue.Queue(max_pending)
+        self._error = None
+        self._failed = False
+        self._thread = threading.Thread(target=self._run,
+                                        name="ndscan result publisher",
+                                        daemon=True)
+        self._thread.start()
+
+    def wrap(self, sink: ResultSink) -> "_PublishedSink":
+        """Return a sink that forwards values to the given one via the thread."""
+        return _PublishedSink(self, sink)
+
+    def push(self, sink: ResultSink, value: Any) -> None:
+        self._check_error()
+        self._queue.put((sink, value))
+
+    def flush(self) -> None:
+        """Block until all pending values have been delivered."""
+        self._queue.join()
+        self._check_error()
+
+    def close(self) -> None:
+        """Deliver all pending values and stop the thread."""
+        self._queue.put(None)
+        self._thread.join()
+        self._check_error()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                # Drop all further values after an error; the scan will be aborted.
+                if not self._failed:
+                    sink, value = item
+                    with self.lock:
+                        sink.push(value)
+            except Exception as e:
+                self._error = e
+                self._failed = True
+            finally:
+                self._queue.task_done()
+
+    def _check_error(self) -> None:
+        if self._error is not None:
+            error = self._error
+            self._error = None
+            raise error
+
+
+class _PublishedSink(ResultSink):
+    def __init__(self, publisher: _SinkPublisher, sink: ResultSink):
+        self.publisher = publisher
+        self.sink = sink
+
+    def push(self, value: Any) -> None:
+        self.publisher.push(self.sink, value)
+
+    def flush(self) -> None:
+        # Only called once the publisher has been flushed itself (i.e. is idle).
+        self.sink.flush()
+
+
+class _StagingSink(ResultSink):
+    """Holds back the values pushed to a result channel until the scan point has been
+    completed, at which point they are forwarded to the original sink."""
+    def __init__(self, channel: ResultChannel):
+        self.channel = channel
+        self.sink = channel.sink
+        self.values = []
+
+    def install(self) -> None:
+        self.channel.set_sink(self)
+
+    def uninstall(self) -> None:
+        # Any remaining values belong to an incomplete point.
+        self.values.clear()
+        self.channel.set_sink(self.sink)
+
+    def push(self, value: Any) -> None:
+        self.values.append(value)
+
+    def push_many(self, values: Sequence[Any]) -> None:
+        self.values.extend(_to_value_list(values))
+
+    def flush(self) -> None:
+        # Values still staged belong to an incomplete point.
+        self.sink.flush()
+
+    def commit(self) -> bool:
+        """Forward the staged values to the original sink.
+
+        :return: Whether there were any values.
+        """
+        if not self.values:
+            return False
+        self.sink.push_many(self.values)
+        self.values = []
+        return True
+
+    def discard(self) -> None:
+        self.values.clear()
+
+
+class _KernelResultBuffer:
+    """Buffers the values pushed to a numeric result channel during a kernel scan, such
+    that they can be transferred to the host in bulk rather than using one RPC each.
+
+    While installed, the buffer replaces the ``push()``/``push_many()`` methods of the
+    channel, so values pushed from the host (e.g. from RPCs) are buffered as well (in
+    the host-side copy of the buffer). Only values that have been committed (i.e.
+    belong to completed points) are transferred.
+    """
+    DTYPE = None
+
+    def __init__(self, channel: ResultChannel, capacity: int):
+        self.channel = channel
+        self.values = np.zeros(capacity, dtype=self.DTYPE)
+        self.num_values = 0
+        self.num_committed = 0
+
+        #: The number of values forwarded to the channel since last reset (only
+        #: updated on the host).
+        self.num_forwarded = 0
+
+    def install(self) -> None:
+        self.channel.push = self.push
+        self.channel.push_many = self.push_many
+
+    def uninstall(self) -> None:
+        self.flush()
+        del self.channel.push
+        del self.channel.push_many
+
+    @portable
+    def push_many(self, values):
+        for value in values:
+            self.push(value)
+
+    @portable
+    def commit(self):
+        self.num_committed = self.num_values
+
+    @portable
+    def discard(self):
+        self.num_values = self.num_committed
+
+    @portable
+    def flush(self):
+        if self.num_committed == 0:
+            return
+        self._push_values(self.values, self.num_committed)
+        # Keep the values for the current point.
+        for i in range(self.num_values - self.num_committed):
+            self.values[i] = self.values[self.num_committed + i]
+        self.num_values -= self.num_committed
+        self.num_committed = 0
+
+    @portable
+    def _make_space(self):
+        if self.num_values == len(self.values):
+            if self.num_committed == 0:
+                # A single point pushed more values than fit into the buffer; there is
+                # no choice but to forward them (they can then no longer be discarded).
+                self.commit()
+            self.flush()
+
+    @rpc(flags={"async"})
+    def _push_values(self, values, num_values):
+        # Forward to the original implementation, which coerces the values and passes
+        # them on to the sink (all at once).
+        type(self.channel).push_many(self.channel, values[:num_values])
+        self.num_forwarded += num_values
+
+
+class _FloatResultBuffer(_KernelResultBuffer):
+    DTYPE = np.float64
+
+    @portable
+    def push(self, value):
+        self._make_space()
+        self.values[self.num_values] = float(value)
+        self.num_values += 1
+
+
+class _IntResultBuffer(_KernelResultBuffer):
+    DTYPE = np.int32
+
+    @portable
+    def push(self, value):
+        self._make_space()
+        self.values[self.num_values] = np.int32(value)
+        self.num_values += 1
+
+
+def _make_kernel_result_buffer(channel: ResultChannel,
+                               capacity: int) -> Optional[_KernelResultBuffer]:
+    """Create a kernel-side buffer for the given channel, or return ``None`` if the
+    channel type is not supported (in which case values are pushed as usual)."""
+    if isinstance(channel, FloatChannel):
+        return _FloatResultBuffer(channel, capacity)
+    if isinstance(channel, IntChannel):
+        return _IntResultBuffer(channel, capacity)
+    return None
+
+
+def _coerce_chunk(axes: List[ScanAxis], chunk: Tuple[np.ndarray, ...]) -> List[list]:
+    """Convert a chunk of scan points into lists of values of the respective parameter
+    types, one for each axis.
+    """
+    # KLUDGE: Explicitly coerce values to the target type here so we can use the regular
+    # (float) scans for integers until proper support for int scans is implemented.
+    return [
+        axis.param_store.coerce_array(values).tolist()
+        for axis, values in zip(axes, chunk)
+    ]
 
 
 def match_default_analysis(analysis: DefaultAnalysis, axes: Iterable[ScanAxis]) -> bool:
@@ -376,7 +1227,8 @@ def describe_scan(spec: ScanSpec, fragment: ExpFragment,
     # them; they should possibly just be ignored there.
     desc["channels"] = {
         name: channel.describe()
-        for (channel, name) in short_result_names.items() if channel.save_by_default
+        for (channel, name) in short_result_names.items()
+        if channel.save_by_default and not channel.is_muted()
     }
 
     return desc
@@ -0,0 +1,228 @@
+"""
+Streaming of scan data to a local HDF5 file, for runs too long to keep all the data in
+the (broadcast) datasets.
+"""
+
+from artiq.language import HasEnvironment
+import h5py
+import numpy as np
+from sipyco import pyon
+import time
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+from .result_channels import (ArrayChannel, FloatChannel, IntChannel, OpaqueChannel,
+                              PackedArrayChannel, ResultChannel, ResultSink,
+                              _to_value_list)
+
+__all__ = ["HDF5Stream", "HDF5StreamSink"]
+
+
+class HDF5Stream:
+    """Streams the values pushed to a number of sinks into chunked, resizable datasets
+    in a local HDF5 file, and only keeps a window of the most recent values in the
+    corresponding broadcast datasets.
+
+    This keeps the memory usage of the master (and any dataset subscribers, like the
+    ndscan applet) bounded, no matter how long a run goes on for. The file uses the
+    same layout as ARTIQ results files (datasets below ``datasets/``, by key), and is
+    written in SWMR (single writer, multiple readers) mode, so it can be read while the
+    run is still in progress.
+
+    All sinks and metadata keys need to be added before :meth:`start` is called (a
+    limitation of SWMR mode).
+
+    :param env: The environment to set the broadcast datasets from.
+    :param path: The path of the HDF5 file to create.
+    :param window: The number of most recent values to (at least) keep in the broadcast
+        datasets. To keep the overhead low, older values are only removed once there
+        are twice as many.
+    :param flush_interval: The minimum interval between writes to the file, in seconds.
+    :param chunk_size: The number of values per HDF5 chunk.
+    """
+    def __init__(self,
+                 env: HasEnvironment,
+                 path: str,
+                 window: int = 10000,
+                 flush_interval: float = 1.0,
+                 chunk_size: int = 1024):
+        self.env = env
+        self.path = path
+        self.window = window
+        self.flush_interval = flush_interval
+        self.chunk_size = chunk_size
+
+        self._file = h5py.File(path, "w", libver="latest")
+        self._group = self._file.create_group("datasets")
+        self._sinks = []
+        self._last_flush = time.monotonic()
+
+    def set_metadata(self, key: str, value: Any) -> None:
+        """Store a scalar value (e.g. scan metadata) in the file.
+
+        New keys can only be added before :meth:`start` is called; afterwards, only
+        the values of existing ones can be updated.
+        """
+        if key in self._group:
+            self._group[key][()] = value
+        else:
+            self._group[key] = value
+
+    def make_sink(self,
+                  key: str,
+                  dtype,
+                  shape: Tuple[int, ...] = (),
+                  encode: Optional[Callable[[Any], Any]] = None,
+                  decode: Optional[Callable[[Any], Any]] = None) -> "HDF5StreamSink":
+        """Create a sink streaming values to the given dataset.
+
+        :param key: The dataset key, used both for the broadcast dataset and the
+            dataset in the file.
+        :param dtype: The NumPy dtype to store the values as in the file.
+        :param shape: The shape of each value.
+        :param encode: Optionally, a function to convert values into a form that can be
+            stored as ``dtype`` (e.g. a string).
+        :param decode: The inverse of ``encode``, to read back values from the file.
+        """
+        dataset = self._group.create_dataset(key, (0, ) + tuple(shape),
+                                             dtype=dtype,
+                                             maxshape=(None, ) + tuple(shape),
+                                             chunks=(self.chunk_size, ) + tuple(shape))
+        sink = HDF5StreamSink(self, key, dataset, encode, decode)
+        self._sinks.append(sink)
+        return sink
+
+    def make_channel_sink(self, key: str, channel: ResultChannel) -> "HDF5StreamSink":
+        r"""Create a sink streaming the values of the given result channel to the given
+        dataset, with the dtype chosen based on the channel type.
+
+        Values of :class:`.PackedArrayChannel`\ s are stored as variable-length
+        arrays. Values of channels that are not numeric are stored as strings
+        (PYON-encoded for :class:`.OpaqueChannel`\ s).
+        """
+        if isinstance(channel, FloatChannel):
+            return self.make_sink(key, np.float64)
+        if isinstance(channel, IntChannel):
+            return self.make_sink(key, np.int64)
+        if isinstance(channel, ArrayChannel):
+            return self.make_sink(key, channel.dtype, channel.shape)
+        if isinstance(channel, PackedArrayChannel):
+            return self.make_sink(key, h5py.vlen_dtype(channel.dtype))
+        if isinstance(channel, OpaqueChannel):
+            return self.make_sink(key, h5py.string_dtype(), (), pyon.encode,
+                                  lambda v: pyon.decode(v.decode()))
+        return self.make_sink(key, h5py.string_dtype(), (), None, bytes.decode)
+
+    def start(self) -> None:
+        """Switch the file to SWMR mode, allowing readers to open it from now on."""
+        self._file.swmr_mode = True
+
+    def end_point(self) -> None:
+        """Notify the stream that all values for a point have been pushed.
+
+        Writes the pending values to the file if the flush interval has passed, and
+        removes old values from the broadcast datasets where necessary (all at once, so
+        that the datasets stay consistent with each other).
+        """
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+        for sink in self._sinks:
+            sink._trim_window(self.window)
+
+    def flush(self) -> None:
+        """Write all pending values to the file."""
+        for sink in self._sinks:
+            sink.flush()
+        self._last_flush = time.monotonic()
+
+    def close(self) -> None:
+        """Write all pending values, and close the file."""
+        if not self._file:
+            return
+        self.flush()
+        self._file.close()
+
+    def _read(self, key: str) -> np.ndarray:
+        if self._file:
+            return self._group[key][:]
+        with h5py.File(self.path, "r") as f:
+            return f["datasets"][key][:]
+
+
+class HDF5StreamSink(ResultSink):
+    """Sink that appends values to a dataset in a :class:`HDF5Stream` file, and to a
+    broadcast dataset holding only the most recent values.
+
+    Created using :meth:`HDF5Stream.make_sink`/:meth:`HDF5Stream.make_channel_sink`.
+    """
+    def __init__(self, stream: HDF5Stream, key: str, dataset: h5py.Dataset,
+                 encode: Optional[Callable[[Any], Any]],
+                 decode: Optional[Callable[[Any], Any]]):
+        self.key = key
+        self._stream = stream
+        self._dataset = dataset
+        self._encode = encode
+        self._decode = decode
+        self._pending = []
+        self._num_written = 0
+        self._num_broadcast = 0
+        self._last_value = None
+
+    def push(self, value: Any) -> None:
+        env = self._stream.env
+        if self._num_broadcast == 0:
+            env.set_dataset(self.key, [value], broadcast=True)
+        else:
+            env.append_to_dataset(self.key, value)
+        self._num_broadcast += 1
+        self._last_value = value
+        self._pending.append(value if self._encode is None else self._encode(value))
+
+    def push_many(self, values: Sequence[Any]) -> None:
+        values = _to_value_list(values)
+        if not values:
+            return
+        env = self._stream.env
+        if self._num_broadcast == 0:
+            env.set_dataset(self.key, values, broadcast=True)
+        else:
+            env.mutate_dataset(self.key, (self._num_broadcast, self._num_broadcast),
+                               values)
+        self._num_broadcast += len(values)
+        self._last_value = values[-1]
+        if self._encode is not None:
+            values = [self._encode(v) for v in values]
+        self._pending.extend(values)
+
+    def flush(self) -> None:
+        """Write all pending values to the file."""
+        if not self._pending:
+            return
+        num_values = self._num_written + len(self._pending)
+        self._dataset.resize(num_values, axis=0)
+        self._dataset[self._num_written:] = self._pending
+        self._dataset.flush()
+        self._num_written = num_values
+        self._pending = []
+
+    def get_last(self) -> Any:
+        """Return the last pushed value (or ``None``)."""
+        return self._last_value
+
+    def get_all(self) -> List[Any]:
+        """Read back all previously pushed values from the file (not just the window
+        kept in the broadcast dataset).
+
+        :return: A NumPy array for numeric values, otherwise a list.
+        """
+        self.flush()
+        values = self._stream._read(self.key)
+        if self._decode is None:
+            return values
+        return [self._decode(v) for v in values]
+
+    def _trim_window(self, window: int) -> None:
+        if self._num_broadcast < 2 * window:
+            return
+        # Remove the oldest values with a single slice assignment.
+        num_excess = self._num_broadcast - window
+        self._stream.env.mutate_dataset(self.key, (0, num_excess), [])
+        self._num_broadcast = window
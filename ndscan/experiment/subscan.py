@@ -6,13 +6,16 @@ another child fragment as part of its execution.
 from collections import OrderedDict
 from copy import copy
 from functools import reduce
+import numpy as np
 from typing import Callable, Dict, List, Tuple
 from .default_analysis import AnnotationContext, DefaultAnalysis
 from .fragment import ExpFragment, Fragment
 from .parameters import ParamHandle
-from .result_channels import (ArraySink, LastValueSink, OpaqueChannel, ResultChannel,
-                              SubscanChannel)
-from .scan_generator import ScanGenerator, ScanOptions
+from .result_channels import (ArraySink, FloatChannel, IntChannel, LastValueSink,
+                              OpaqueChannel, PackedArrayChannel, ResultChannel,
+                              ResultSink, SubscanChannel, TypedArraySink,
+                              make_array_sink)
+from .scan_generator import AdaptiveGenerator, ScanGenerator, ScanOptions
 from .scan_runner import (ScanAxis, ScanRunner, ScanSpec, describe_analyses,
                           describe_scan, filter_default_analyses)
 from ..utils import merge_no_duplicates, shorten_to_unambiguous_suffixes
@@ -26,12 +29,12 @@ class Subscan:
     """
     def __init__(
         self,
-        run_fn: Callable[[ExpFragment, ScanSpec, List[ArraySink]], None],
+        run_fn: Callable[[ExpFragment, ScanSpec, List[ResultSink]], None],
         fragment: ExpFragment,
         possible_axes: Dict[ParamHandle, ScanAxis],
         schema_channel: SubscanChannel,
         coordinate_channels: List[ResultChannel],
-        child_result_sinks: Dict[ResultChannel, ArraySink],
+        child_result_sinks: Dict[ResultChannel, ResultSink],
         aggregate_result_channels: Dict[ResultChannel, ResultChannel],
         short_child_channel_names: Dict[str, ResultChannel],
         analyses: List[DefaultAnalysis],
@@ -68,7 +71,8 @@ class Subscan:
 
         :return: A tuple ``(coordinates, values, analysis_results)``, each a dictionary
             mapping parameter handles, result channels and analysis channel names to
-            lists of their values.
+            their values. Coordinates/values of numeric parameters/result channels are
+            given as (read-only) NumPy arrays, and as lists otherwise.
         """
 
         for sink in self._child_result_sinks.values():
@@ -83,7 +87,19 @@ class Subscan:
             assert axis is not None, "Axis not registered in setattr_subscan()"
             axes.append(axis)
             generators.append(generator)
-            coordinate_sinks[param_handle] = ArraySink()
+            coordinate_sinks[param_handle] = _make_coordinate_sink(axis)
+
+            if isinstance(generator, AdaptiveGenerator) and generator.channel:
+                channels = [
+                    c for c, name in self._short_child_channel_names.items()
+                    if name == generator.channel
+                ]
+                if not channels:
+                    raise ValueError(
+                        "Result channel '{}' for adaptive scan not found".format(
+                            generator.channel))
+                generator.set_feedback_sinks(coordinate_sinks[param_handle],
+                                             self._child_result_sinks[channels[0]])
 
         spec = ScanSpec(axes, generators, options)
         self._fragment.prepare()
@@ -112,7 +128,7 @@ class Subscan:
     def _handle_default_analyses(
         self,
         axes: List[ScanAxis],
-        coordinate_sinks: Dict[ParamHandle, ArraySink],
+        coordinate_sinks: Dict[ParamHandle, ResultSink],
         always_run: bool,
     ):
         # Re-filter analyses based on actual scan axes to support slightly dodgy use
@@ -176,6 +192,24 @@ class Subscan:
         return schema, analysis_results
 
 
+def _numeric_dtype(type_string: str):
+    return {"float": np.float64, "int": np.int64}.get(type_string, None)
+
+
+def _make_coordinate_sink(axis: ScanAxis) -> ResultSink:
+    dtype = _numeric_dtype(axis.param_schema["type"])
+    return ArraySink() if dtype is None else TypedArraySink(dtype)
+
+
+def _make_aggregate_channel(owner: Fragment, name: str, dtype,
+                            **kwargs) -> ResultChannel:
+    # Numeric values are collected into a 1-D array per point of the parent scan,
+    # which can be stored much more efficiently than arbitrary (opaque) values.
+    if dtype is None:
+        return owner.setattr_result(name, OpaqueChannel, **kwargs)
+    return owner.setattr_result(name, PackedArrayChannel, dtype, **kwargs)
+
+
 def setattr_subscan(owner: Fragment,
                     scan_name: str,
                     fragment: ExpFragment,
@@ -228,19 +262,20 @@ def setattr_subscan(owner: Fragment,
         #    the most common use case anyway).
         #  - Serialise the scan point coordinates into the scan spec.
         coordinate_channels.append(
-            owner.setattr_result(scan_name + "_axis_{}".format(i),
-                                 OpaqueChannel,
-                                 save_by_default=save_results_by_default))
+            _make_aggregate_channel(owner,
+                                    scan_name + "_axis_{}".format(i),
+                                    _numeric_dtype(param.describe()["type"]),
+                                    save_by_default=save_results_by_default))
 
     # Instead of letting our parent directly manage the subfragment result channels,
-    # we redirect the results to ArraySinks…
+    # we redirect the results to array sinks…
     original_channels = {}
     fragment._collect_result_channels(original_channels)
     owner._absorbed_results_subfragments.add(fragment)
 
     child_result_sinks = {}
     for channel in original_channels.values():
-        sink = ArraySink()
+        sink = make_array_sink(channel)
         channel.set_sink(sink)
         child_result_sinks[channel] = sink
 
@@ -254,12 +289,19 @@ def setattr_subscan(owner: Fragment,
         channel = original_channels[full_name]
         short_child_channel_names[channel] = short_identifier
 
-        # TODO: Implement ArrayChannel to represent a variable number of dimensions
-        # around a scalar channel so we can keep the schema information here instead of
-        # throwing our hands up in the air helplessly (i.e. using OpaqueChannel).
-        aggregate_result_channels[channel] = owner.setattr_result(
+        # TODO: Represent a variable number of dimensions around the child channel so
+        # we can keep the full schema information here (rather than just the dtype for
+        # numeric channels, and throwing our hands up in the air helplessly – i.e.
+        # using OpaqueChannel – otherwise).
+        dtype = None
+        if isinstance(channel, FloatChannel):
+            dtype = np.float64
+        elif isinstance(channel, IntChannel):
+            dtype = np.int64
+        aggregate_result_channels[channel] = _make_aggregate_channel(
+            owner,
             scan_name + "_channel_" + short_identifier,
-            OpaqueChannel,
+            dtype,
             save_by_default=save_results_by_default and channel.save_by_default)
 
     spec_channel = owner.setattr_result(scan_name + "_spec", SubscanChannel)
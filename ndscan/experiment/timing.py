@@ -0,0 +1,66 @@
+"""
+Instrumentation for finding out where the time in a scan is spent.
+"""
+
+from array import array
+from collections import OrderedDict
+import numpy as np
+from typing import Dict, List
+
+__all__ = ["TimingLog"]
+
+
+class TimingLog:
+    """Records the durations of the different phases of a scan (e.g. ``device_setup``,
+    ``run_once``, fetching new points, pausing), one entry per occurrence.
+
+    Durations are stored in compact arrays of doubles rather than lists of Python
+    floats, so the log can be kept for scans with a large number of points without
+    much overhead.
+    """
+    def __init__(self):
+        self._durations = OrderedDict()
+
+    def record(self, phase: str, duration: float) -> None:
+        """Add an entry for the given phase.
+
+        :param phase: The name of the phase.
+        :param duration: The duration, in seconds.
+        """
+        durations = self._durations.get(phase, None)
+        if durations is None:
+            durations = array("d")
+            self._durations[phase] = durations
+        durations.append(duration)
+
+    def get_phases(self) -> List[str]:
+        """Return the names of all phases recorded so far, in order of their first
+        occurrence."""
+        return list(self._durations.keys())
+
+    def get_durations(self, phase: str) -> np.ndarray:
+        """Return all durations recorded for the given phase, in seconds."""
+        durations = self._durations.get(phase, None)
+        if not durations:
+            return np.zeros(0)
+        # Copy, as the array can't be appended to while its buffer is exported.
+        return np.frombuffer(durations, dtype=np.float64).copy()
+
+    def summarise(self) -> Dict[str, Dict[str, float]]:
+        """Return summary statistics for each phase.
+
+        :return: A dictionary mapping phase names to dictionaries of the number of
+            entries (``count``), and the ``total``, ``mean``, ``median`` and 99th
+            percentile (``p99``) duration, in seconds.
+        """
+        summary = OrderedDict()
+        for phase in self._durations.keys():
+            durations = self.get_durations(phase)
+            summary[phase] = {
+                "count": len(durations),
+                "total": float(np.sum(durations)),
+                "mean": float(np.mean(durations)),
+                "median": float(np.median(durations)),
+                "p99": float(np.percentile(durations, 99))
+            }
+        return summary
@@ -180,6 +180,12 @@ class ScanModel(Model):
     def get_point_data(self) -> Dict[str, Any]:
         raise NotImplementedError
 
+    def get_point_view(self) -> Optional[Dict[str, Any]]:
+        """Return the schema of the (reduced) view of the points provided by this model
+        (e.g. the ``live`` entry of the ``point_views`` metadata for decimated live
+        views), or ``None`` if the points are provided at full resolution."""
+        return None
+
     def get_annotations(self) -> List[Annotation]:
         return self._annotations
 
@@ -4,7 +4,7 @@ from typing import Any, Dict, List, Optional
 import h5py
 from . import (Context, FixedDataSource, Model, Root, ScanModel, SinglePointModel)
 from .utils import call_later, emit_later
-from ...utils import SCHEMA_REVISION_KEY
+from ...utils import PackedArray, SCHEMA_REVISION_KEY
 
 logger = logging.getLogger(__name__)
 
@@ -91,6 +91,13 @@ class HDF5ScanModel(ScanModel):
         for name in (["axis_{}".format(i) for i in range(len(self.axes))] +
                      ["channel_" + c for c in self._channel_schemata.keys()]):
             self._point_data[name] = datasets[prefix + "points." + name][:]
+        for name, schema in self._channel_schemata.items():
+            if schema["type"] == "packed_array":
+                # Values for all points are read in one go; the values for the
+                # individual points are views into the packed array.
+                key = prefix + "points.channel_" + name
+                self._point_data["channel_" + name] = PackedArray(
+                    self._point_data["channel_" + name], datasets[key + ".offsets"][:])
         emit_later(self.points_appended, self._point_data)
 
     def get_channel_schemata(self) -> Dict[str, Any]:
@@ -1,7 +1,7 @@
 import json
 from typing import Any, Dict, Iterable, List, Optional
 from sipyco.sync_struct import ModAction
-from ...utils import SCHEMA_REVISION_KEY, strip_prefix
+from ...utils import PackedArray, SCHEMA_REVISION_KEY, strip_prefix
 from . import (Annotation, Context, FixedDataSource, Model, Root, ScanModel,
                SinglePointModel)
 
@@ -157,6 +157,7 @@ class SubscriberScanModel(ScanModel):
         self._analysis_results_json = None
         self._analysis_result_sources = {}
         self._point_data = {}
+        self._point_view = None
 
     def data_changed(self, data: Dict[str, Any], mods: Iterable[Dict[str,
                                                                      Any]]) -> None:
@@ -165,6 +166,11 @@ class SubscriberScanModel(ScanModel):
             if not channels_json:
                 return
             self._channel_schemata = json.loads(channels_json)
+            views_json = data.get(self._prefix + "point_views", (False, None))[1]
+            if views_json:
+                # Only a reduced view is broadcast; the full-resolution points are
+                # archived only.
+                self._point_view = json.loads(views_json)["live"]
             self._series_initialised = True
             self.channel_schemata_changed.emit(self._channel_schemata)
 
@@ -191,11 +197,46 @@ class SubscriberScanModel(ScanModel):
             source.set(
                 data.get(self._prefix + "analysis_result." + name, (False, None))[1])
 
-        for name in (["axis_{}".format(i) for i in range(len(self.axes))] +
-                     ["channel_" + c for c in self._channel_schemata.keys()]):
-            self._point_data[name] = data.get(self._prefix + "points." + name,
-                                              (False, []))[1]
-        self.points_appended.emit(self._point_data)
+        if self._point_view is None:
+            points_prefix = self._prefix + "points."
+            for name in self._point_names():
+                self._point_data[name] = data.get(points_prefix + name, (False, []))[1]
+            for name, schema in self._channel_schemata.items():
+                if schema["type"] == "packed_array":
+                    key = points_prefix + "channel_" + name
+                    self._point_data["channel_" + name] = PackedArray(
+                        data.get(key, (False, []))[1],
+                        data.get(key + ".offsets", (False, [0]))[1])
+        else:
+            # Decimated view: the bin means take the place of the values, with the
+            # other statistics (minimum/maximum) available as "<name>.<statistic>".
+            points_prefix = self._prefix + self._point_view["prefix"]
+            for name in self._point_names():
+                for stat in self._point_view["statistics"]:
+                    key = name if stat == "mean" else name + "." + stat
+                    self._point_data[key] = data.get(points_prefix + name + "." + stat,
+                                                     (False, []))[1]
+
+        # Points are only ever appended (possibly by assigning to an empty slice at the
+        # end), except when old points are removed from a bounded window (e.g. for
+        # streamed time series), which is done by modifying the existing point datasets
+        # in place, or when neighbouring points of a decimated view are merged, which
+        # sets the datasets anew.
+        def rewrites_points(mod):
+            if mod["action"] != ModAction.setitem.value:
+                return False
+            if not mod["path"]:
+                return (self._point_view is not None
+                        and mod["key"].startswith(points_prefix))
+            if not mod["path"][0].startswith(points_prefix):
+                return False
+            key = mod["key"]
+            return not (isinstance(key, slice) and key.start == key.stop)
+
+        if any(rewrites_points(m) for m in mods):
+            self.points_rewritten.emit(self._point_data)
+        else:
+            self.points_appended.emit(self._point_data)
 
     def get_annotations(self) -> List[Annotation]:
         return self._annotations
@@ -206,6 +247,13 @@ class SubscriberScanModel(ScanModel):
     def get_point_data(self) -> Dict[str, Any]:
         return self._point_data
 
+    def get_point_view(self) -> Optional[Dict[str, Any]]:
+        return self._point_view
+
+    def _point_names(self) -> List[str]:
+        return (["axis_{}".format(i) for i in range(len(self.axes))] +
+                ["channel_" + c for c in self._channel_schemata.keys()])
+
     def get_analysis_result_source(self, name: str) -> Optional[FixedDataSource]:
         if name not in self._analysis_result_sources:
             self._analysis_result_sources[name] = FixedDataSource(None)
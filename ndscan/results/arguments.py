@@ -42,6 +42,19 @@ def dump_overrides(schema: Dict[str, Any]) -> Iterable[str]:
             yield f"   ({fqn}@{path})"
 
 
+def dump_channel_settings(schema: Dict[str, Any]) -> Iterable[str]:
+    """Format information about muted/(not) saved result channels as a human-readable
+    string.
+
+    :return: Generator yielding the output line-by-line.
+    """
+    for path, settings in schema.get("channel_settings", {}).items():
+        if settings.get("muted", False):
+            yield f" - {path}: muted"
+        elif "save" in settings:
+            yield f" - {path}: {'saved' if settings['save'] else 'not saved'}"
+
+
 def format_scan_range(typ: str, rang: Dict[str, Any], param_spec: Dict[str,
                                                                        Any]) -> str:
     if typ == "linear":
@@ -52,8 +65,17 @@ def format_scan_range(typ: str, rang: Dict[str, Any], param_spec: Dict[str,
         lower = format_numeric(rang["lower"], param_spec["spec"])
         upper = format_numeric(rang["upper"], param_spec["spec"])
         return f"{lower} to {upper}, refining"
+    if typ == "adaptive":
+        lower = format_numeric(rang["lower"], param_spec["spec"])
+        upper = format_numeric(rang["upper"], param_spec["spec"])
+        channel = rang.get("channel", "")
+        return f"{lower} to {upper}, adaptive ({channel or 'no feedback'})"
     if typ == "list":
         return f"list: [{rang['values']}]"
+    if typ in ("halton", "latin_hypercube"):
+        lower = format_numeric(rang["lower"], param_spec["spec"])
+        upper = format_numeric(rang["upper"], param_spec["spec"])
+        return f"{lower} to {upper}, {rang['num_points']} points ({typ}, joint)"
 
     return f"<Unknown scan type '{typ}'.>"
 
@@ -80,3 +102,6 @@ def dump_scan(schema: Dict[str, Any]) -> Iterable[str]:
         yield f"     {format_scan_range(ax['type'], ax['range'], ps)}"
     yield f" - Number of repeats: {scan['num_repeats']}"
     yield f" - Randomise order globally: {scan['randomise_order_globally']}"
+    if scan.get("aggregate_repeats", False):
+        archived = scan.get("archive_raw_repeats", False)
+        yield f" - Aggregate repeats: True (raw values archived: {archived})"
@@ -1,8 +1,9 @@
 """Odds and ends common to all of ndscan."""
 
 from enum import Enum, unique
+import numpy as np
 import oitg.fitting
-from typing import Any, Callable, Dict, Iterable
+from typing import Any, Callable, Dict, Iterable, Sequence
 
 #: Registry of well-known fit procecure names.
 FIT_OBJECTS = {
@@ -44,6 +45,48 @@ class NoAxesMode(Enum):
     time_series = "Time series (save all, with timestamps)"
 
 
+class PackedArray:
+    """Read-only sequence view of a number of 1-D arrays of possibly different length
+    (e.g. the values of a subscan result channel for each point of the parent scan),
+    packed one after the other into a single array.
+
+    Indexing returns views into the packed array, so no data is copied.
+
+    :param values: The concatenation of all the arrays.
+    :param offsets: The index into ``values`` at which each array starts, followed by
+        the total length; i.e. the ``i``-th array is ``values[offsets[i]:offsets[i +
+        1]]``.
+    """
+    def __init__(self, values: Sequence[Any], offsets: Sequence[int]):
+        self.values = np.asarray(values)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return max(len(self.offsets) - 1, 0)
+
+    def __getitem__(self, idx: int) -> np.ndarray:
+        length = len(self)
+        if idx < 0:
+            idx += length
+        if not 0 <= idx < length:
+            raise IndexError("PackedArray index out of range")
+        return self.values[self.offsets[idx]:self.offsets[idx + 1]]
+
+    def to_2d(self) -> np.ndarray:
+        """Return the arrays as the rows of a 2-D array (a view into the packed
+        values).
+
+        :raises ValueError: If the arrays are not all of the same length.
+        """
+        if len(self) == 0:
+            return self.values[:0].reshape((0, 0))
+        lengths = np.diff(self.offsets)
+        if np.any(lengths != lengths[0]):
+            raise ValueError("Cannot convert arrays of different lengths to 2-D array")
+        return self.values[self.offsets[0]:self.offsets[-1]].reshape(
+            (len(self), lengths[0]))
+
+
 def strip_prefix(string: str, prefix: str) -> str:
     if string.startswith(prefix):
         return string[len(prefix):]
@@ -0,0 +1,320 @@
+"""
+Throughput/memory benchmarks for running scans end-to-end on the mock environment.
+
+Measures the number of points per second and the peak (Python heap) memory usage for
+the various host-side execution modes and sink types, for a range of scan sizes. The
+results are written as JSON, and can be compared against a previously stored baseline
+to catch performance regressions (run from the ``test`` directory)::
+
+    python benchmark.py --output baseline.json
+    # …make changes…
+    python benchmark.py --baseline baseline.json
+
+The exit code is non-zero if any benchmark is slower than the baseline by more than
+the given tolerance.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+from ndscan.experiment import *
+from ndscan.experiment.parameters import FloatParamStore
+from ndscan.experiment.scan_runner import ScanAxis
+from ndscan.utils import PARAMS_ARG_KEY
+from sipyco import pyon
+from mock_environment import HasEnvironmentCase
+
+#: Number of subscan points per point of the outer scan in the subscan benchmark.
+SUBSCAN_POINTS = 10
+
+
+class BenchFragment(ExpFragment):
+    """Minimal fragment (one parameter, two result channels), such that the runtime is
+    dominated by the scan machinery."""
+    def build_fragment(self):
+        self.setattr_param("value", FloatParam, "Value", 0.0)
+        self.setattr_result("result", FloatChannel)
+        self.setattr_result("count", IntChannel)
+
+        #: If set, raise TerminationRequested after this many points (to end
+        #: continuous scans).
+        self.max_points = None
+        self.num_points = 0
+
+    def run_once(self):
+        if self.num_points == self.max_points:
+            raise TerminationRequested
+        self.num_points += 1
+        self.result.push(self.value.get() + 1)
+        self.count.push(self.num_points)
+
+
+class BenchSubscanFragment(ExpFragment):
+    def build_fragment(self):
+        self.setattr_param("offset", FloatParam, "Offset", 0.0)
+        self.setattr_fragment("child", BenchFragment)
+        setattr_subscan(self, "scan", self.child, [(self.child, "value")])
+
+    def run_once(self):
+        offset = self.offset.get()
+        self.scan.run([(self.child.value,
+                        LinearGenerator(offset, offset + 1, SUBSCAN_POINTS, False))])
+
+
+ScanBenchExp = make_fragment_scan_exp(BenchFragment)
+PublishedScanBenchExp = make_fragment_scan_exp(BenchFragment, publish_host_results=True)
+ScanSubscanBenchExp = make_fragment_scan_exp(BenchSubscanFragment)
+
+
+class Environment(HasEnvironmentCase):
+    """Mock ARTIQ environment (re-using the unit test helpers outside of a test)."""
+    def __init__(self):
+        super().__init__()
+        self.setUp()
+
+
+def _param_fqn(klass, name):
+    return klass.__module__ + "." + klass.__qualname__ + "." + name
+
+
+def _scan_params(fqn, num_points, num_repeats=1, no_axes_mode="single", **scan):
+    axes = []
+    if fqn is not None:
+        axes.append({
+            "type": "linear",
+            "range": {
+                "start": 0,
+                "stop": 1,
+                "num_points": num_points,
+                "randomise_order": False
+            },
+            "fqn": fqn,
+            "path": "*"
+        })
+    scan.update({
+        "axes": axes,
+        "num_repeats": num_repeats,
+        "no_axes_mode": no_axes_mode
+    })
+    return {PARAMS_ARG_KEY: pyon.encode({"overrides": {}, "scan": scan})}
+
+
+def _prepare_experiment(klass, env_args, max_points=None):
+    exp = Environment().create(klass, env_args=env_args)
+    exp.prepare()
+    exp.fragment.max_points = max_points
+    return exp.run
+
+
+def _prepare_scan_runner(num_points, make_sink, **kwargs):
+    env = Environment()
+    fragment = env.create(BenchFragment, [])
+    for channel in (fragment.result, fragment.count):
+        channel.set_sink(make_sink())
+    fqn = _param_fqn(BenchFragment, "value")
+    store = FloatParamStore((fqn, "*"), 0.0)
+    fragment.init_params({fqn: [("*", store)]})
+    param_schema = {"fqn": fqn, "type": "float"}
+    spec = ScanSpec([ScanAxis(param_schema, "*", store)],
+                    [LinearGenerator(0, 1, num_points, False)], ScanOptions())
+    runner = env.create(ScanRunner, **kwargs)
+    return lambda: runner.run(fragment, spec, [make_sink()])
+
+
+def host_scan_array_sink(num_points):
+    return _prepare_scan_runner(num_points, ArraySink)
+
+
+def host_scan_typed_array_sink(num_points):
+    return _prepare_scan_runner(num_points, lambda: TypedArraySink(np.float64))
+
+
+def host_scan_last_value_sink(num_points):
+    return _prepare_scan_runner(num_points, LastValueSink)
+
+
+def host_scan_published(num_points):
+    return _prepare_scan_runner(num_points, ArraySink, publish_host_results=True)
+
+
+def host_scan_dataset_sink(num_points):
+    return _prepare_experiment(
+        ScanBenchExp, _scan_params(_param_fqn(BenchFragment, "value"), num_points))
+
+
+def host_scan_published_dataset_sink(num_points):
+    return _prepare_experiment(
+        PublishedScanBenchExp,
+        _scan_params(_param_fqn(BenchFragment, "value"), num_points))
+
+
+def host_scan_aggregate_repeats(num_points):
+    return _prepare_experiment(
+        ScanBenchExp,
+        _scan_params(_param_fqn(BenchFragment, "value"),
+                     max(num_points // 10, 1),
+                     num_repeats=10,
+                     aggregate_repeats=True))
+
+
+def subscan(num_points):
+    return _prepare_experiment(
+        ScanSubscanBenchExp,
+        _scan_params(_param_fqn(BenchSubscanFragment, "offset"),
+                     max(num_points // SUBSCAN_POINTS, 1)))
+
+
+def continuous(num_points):
+    return _prepare_experiment(ScanBenchExp,
+                               _scan_params(None, None, no_axes_mode="repeat"),
+                               max_points=num_points)
+
+
+def time_series(num_points):
+    return _prepare_experiment(ScanBenchExp,
+                               _scan_params(None, None, no_axes_mode="time_series"),
+                               max_points=num_points)
+
+
+# Benchmark names, mapped to functions that set up a scan with (approximately) the
+# given number of points, and return a callable to run it.
+BENCHMARKS = {
+    f.__name__: f
+    for f in [
+        host_scan_array_sink, host_scan_typed_array_sink, host_scan_last_value_sink,
+        host_scan_published, host_scan_dataset_sink, host_scan_published_dataset_sink,
+        host_scan_aggregate_repeats, subscan, continuous, time_series
+    ]
+}
+
+
+def run_benchmark(name: str, num_points: int, num_repeats: int, measure_memory: bool):
+    result = {"benchmark": name, "num_points": num_points}
+
+    # Use the fastest of several runs to reduce the influence of other system load (and
+    # one-off costs like imports and caches being populated).
+    elapsed = float("inf")
+    for _ in range(num_repeats):
+        run = BENCHMARKS[name](num_points)
+        start = time.perf_counter()
+        run()
+        elapsed = min(elapsed, time.perf_counter() - start)
+    result["seconds"] = elapsed
+    result["points_per_second"] = num_points / elapsed
+
+    if measure_memory:
+        # Separate run, as tracing allocations slows down execution considerably.
+        run = BENCHMARKS[name](num_points)
+        tracemalloc.start()
+        try:
+            run()
+            result["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        result["memory_bytes_per_point"] = result["peak_memory_bytes"] / num_points
+    return result
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """Return a list of human-readable descriptions of all regressions."""
+    reference = {(r["benchmark"], r["num_points"]): r for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        ref = reference.get((r["benchmark"], r["num_points"]), None)
+        if ref is None:
+            continue
+        ratio = r["points_per_second"] / ref["points_per_second"]
+        if ratio < 1 - tolerance:
+            regressions.append(
+                "{} ({} points): {:.0f} points/s vs. {:.0f} ({:+.0%})".format(
+                    r["benchmark"], r["num_points"], r["points_per_second"],
+                    ref["points_per_second"], ratio - 1))
+        if "peak_memory_bytes" in r and "peak_memory_bytes" in ref:
+            ratio = r["peak_memory_bytes"] / ref["peak_memory_bytes"]
+            if ratio > 1 + tolerance:
+                regressions.append(
+                    "{} ({} points): {} bytes peak vs. {} ({:+.0%})".format(
+                        r["benchmark"], r["num_points"], r["peak_memory_bytes"],
+                        ref["peak_memory_bytes"], ratio - 1))
+    return regressions
+
+
+def get_argparser():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks ndscan scan execution on the mock environment")
+    parser.add_argument("--benchmarks",
+                        nargs="+",
+                        choices=list(BENCHMARKS.keys()),
+                        default=list(BENCHMARKS.keys()),
+                        help="Benchmarks to run (default: all)")
+    parser.add_argument("--sizes",
+                        nargs="+",
+                        type=int,
+                        default=[10**n for n in range(2, 6)],
+                        help="Number of scan points to run each benchmark for "
+                        "(default: 10^2 to 10^5; add 1000000 for a full run)")
+    parser.add_argument("--repeats",
+                        default=3,
+                        type=int,
+                        help="Number of runs to take the fastest of (default: 3)")
+    parser.add_argument("--no-memory",
+                        action="store_true",
+                        help="Do not measure peak memory usage")
+    parser.add_argument("--output",
+                        default=None,
+                        type=str,
+                        help="File to write the results to as JSON (default: stdout)")
+    parser.add_argument("--baseline",
+                        default=None,
+                        type=str,
+                        help="JSON file with previous results to compare against")
+    parser.add_argument("--tolerance",
+                        default=0.2,
+                        type=float,
+                        help="Relative slowdown/memory increase compared to the "
+                        "baseline to tolerate (default: 0.2)")
+    return parser
+
+
+def main():
+    args = get_argparser().parse_args()
+
+    results = []
+    for name in args.benchmarks:
+        for num_points in args.sizes:
+            r = run_benchmark(name, num_points, args.repeats, not args.no_memory)
+            print("{}: {} points, {:.0f} points/s".format(name, num_points,
+                                                          r["points_per_second"]),
+                  file=sys.stderr)
+            results.append(r)
+
+    output = {
+        "metadata": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+        },
+        "results": results
+    }
+    if args.output is None:
+        json.dump(output, sys.stdout, indent=2)
+    else:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        for r in regressions:
+            print("Regression: " + r, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
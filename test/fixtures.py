@@ -141,3 +141,39 @@ class TwoAnalysisFragment(ExpFragment):
             CustomAnalysis([self.a], analyse, [FloatChannel("result_a")]),
             CustomAnalysis([self.b], analyse, [FloatChannel("result_b")])
         ]
+
+
+class HistogramFragment(ExpFragment):
+    """Pushes a histogram of counts around the parameter value to an array channel."""
+    def build_fragment(self):
+        self.setattr_param("value", IntParam, "Value", 0)
+        self.setattr_result("hist", ArrayChannel, (3, ), numpy.int32)
+
+    def run_once(self):
+        value = self.value.get()
+        self.hist.push([value - 1, value, value + 1])
+
+
+class SubscanLengthFragment(ExpFragment):
+    """Runs a subscan of :class:`AddOneFragment` with a variable number of points."""
+    def build_fragment(self):
+        self.setattr_param("num_points", IntParam, "Number of subscan points", 1)
+        self.setattr_fragment("child", AddOneFragment)
+        setattr_subscan(self, "scan", self.child, [(self.child, "value")])
+
+    def run_once(self):
+        num_points = self.num_points.get()
+        self.scan.run([(self.child.value,
+                        LinearGenerator(0, num_points - 1, num_points, False))])
+
+
+class DebugChannelFragment(ExpFragment):
+    """Pushes to a regular and a (by default not saved) debug result channel."""
+    def build_fragment(self):
+        self.setattr_param("value", FloatParam, "Value", 0.0)
+        self.setattr_result("result", FloatChannel)
+        self.setattr_result("debug", FloatChannel, save_by_default=False)
+
+    def run_once(self):
+        self.result.push(self.value.get())
+        self.debug.push(self.value.get() * 2)
@@ -2,18 +2,44 @@
 Tests for ndscan.experiment top-level runners.
 """
 
+import h5py
 import json
+import numpy as np
+import os
+import tempfile
 from ndscan.experiment import *
 from ndscan.utils import PARAMS_ARG_KEY, SCHEMA_REVISION, SCHEMA_REVISION_KEY
 from sipyco import pyon
-from fixtures import (AddOneFragment, ReboundAddOneFragment, TrivialKernelFragment,
-                      TransitoryErrorFragment, RequestTerminationFragment)
+from fixtures import (AddOneFragment, DebugChannelFragment, HistogramFragment,
+                      ReboundAddOneFragment, TrivialKernelFragment,
+                      TransitoryErrorFragment, RequestTerminationFragment,
+                      SubscanLengthFragment)
 from mock_environment import HasEnvironmentCase
 
 ScanAddOneExp = make_fragment_scan_exp(AddOneFragment)
 ScanReboundAddOneExp = make_fragment_scan_exp(ReboundAddOneFragment)
 
 
+class InterruptedAddOneFragment(AddOneFragment):
+    """Requests termination after :attr:`max_points` points."""
+    max_points = None
+
+    def build_fragment(self):
+        super().build_fragment()
+        self.num_points = 0
+
+    def run_once(self):
+        if self.num_points == self.max_points:
+            raise TerminationRequested
+        self.num_points += 1
+        super().run_once()
+
+
+class InterruptedNoAnalysisFragment(InterruptedAddOneFragment):
+    def get_default_analyses(self):
+        return []
+
+
 class FragmentScanExpCase(HasEnvironmentCase):
     def test_wrong_fqn_override(self):
         exp = self.create(ScanAddOneExp,
@@ -152,6 +178,128 @@ class FragmentScanExpCase(HasEnvironmentCase):
         self.assertEqual(exp.fragment.add_one.num_host_cleanup_calls, 1)
         self.assertEqual(exp.fragment.add_one.num_device_cleanup_calls, 1)
 
+    def test_run_1d_scan_aggregate_repeats(self):
+        exp = self.create(ScanAddOneExp)
+        fqn = "fixtures.AddOneFragment.value"
+        exp.args._params["scan"]["axes"].append({
+            "type": "linear",
+            "range": {
+                "start": 0,
+                "stop": 2,
+                "num_points": 3,
+                "randomise_order": False
+            },
+            "fqn": fqn,
+            "path": "*"
+        })
+        exp.args._params["scan"]["num_repeats"] = 4
+        exp.args._params["scan"]["aggregate_repeats"] = True
+        exp.args._params["scan"]["archive_raw_repeats"] = True
+        exp.prepare()
+        exp.run()
+        self.assertEqual(exp.fragment.num_device_setup_calls, 12)
+
+        def d(key):
+            return self.dataset_db.get("ndscan." + key)
+
+        self.assertEqual(d("points.axis_0"), [0, 1, 2])
+        self.assertEqual(d("points.channel_result"), [1, 2, 3])
+        self.assertEqual(d("points.channel_result_error"), [0, 0, 0])
+        self.assertEqual(d("points.channel_repeat_count"), [4, 4, 4])
+        # Raw values are only archived, not broadcast.
+        self.assertNotIn("ndscan.raw.axis_0", self.dataset_db.data)
+        self.assertEqual(self.dataset_mgr.get("ndscan.raw.axis_0"), [0, 1, 2] * 4)
+        self.assertEqual(self.dataset_mgr.get("ndscan.raw.channel_result"),
+                         [1, 2, 3] * 4)
+
+        channels = json.loads(d("channels"))
+        self.assertEqual(channels["result_error"]["display_hints"],
+                         {"error_bar_for": "result"})
+        self.assertEqual(channels["repeat_count"]["type"], "int")
+
+    def test_run_1d_scan_record_timing(self):
+        exp = self.create(make_fragment_scan_exp(AddOneFragment, record_timing=True))
+        exp.args._params["scan"]["axes"].append({
+            "type": "linear",
+            "range": {
+                "start": 0,
+                "stop": 2,
+                "num_points": 3,
+                "randomise_order": False
+            },
+            "fqn": "fixtures.AddOneFragment.value",
+            "path": "*"
+        })
+        exp.prepare()
+        exp.run()
+
+        summary = json.loads(self.dataset_db.get("ndscan.timing.summary"))
+        self.assertEqual(summary["run_once"]["count"], 3)
+        self.assertEqual(summary["total"]["count"], 1)
+        # The individual durations are only archived, not broadcast.
+        self.assertNotIn("ndscan.timing.run_once", self.dataset_db.data)
+        self.assertEqual(len(self.dataset_mgr.get("ndscan.timing.device_setup")), 3)
+
+    def test_run_1d_scan_array_channel(self):
+        exp = self.create(make_fragment_scan_exp(HistogramFragment))
+        exp.args._params["scan"]["axes"].append({
+            "type": "list",
+            "range": {
+                "values": [1, 5],
+                "randomise_order": False
+            },
+            "fqn": "fixtures.HistogramFragment.value",
+            "path": "*"
+        })
+        exp.prepare()
+        exp.run()
+
+        def d(key):
+            return self.dataset_db.get("ndscan." + key)
+
+        self.assertEqual(
+            json.loads(d("channels"))["hist"], {
+                "description": "",
+                "dtype": "int32",
+                "path": "hist",
+                "shape": [3],
+                "type": "array"
+            })
+        self.assertEqual(json.loads(d("plan"))["num_bytes"]["channel_hist"], 24)
+        hist = np.asarray(d("points.channel_hist"))
+        self.assertEqual(hist.dtype, np.int32)
+        self.assertEqual(hist.tolist(), [[0, 1, 2], [4, 5, 6]])
+
+    def test_run_1d_scan_packed_subscan(self):
+        exp = self.create(make_fragment_scan_exp(SubscanLengthFragment))
+        exp.args._params["scan"]["axes"].append({
+            "type": "list",
+            "range": {
+                "values": [2, 3],
+                "randomise_order": False
+            },
+            "fqn": "fixtures.SubscanLengthFragment.num_points",
+            "path": "*"
+        })
+        exp.prepare()
+        exp.run()
+
+        def d(key):
+            return self.dataset_db.get("ndscan." + key)
+
+        channels = json.loads(d("channels"))
+        self.assertEqual(channels["scan_channel_result"]["type"], "packed_array")
+        self.assertEqual(channels["scan_axis_0"]["dtype"], "float64")
+
+        # Values for all points are stored in a single flat array each.
+        self.assertEqual(d("points.channel_scan_axis_0"), [0.0, 1.0, 0.0, 1.0, 2.0])
+        self.assertEqual(d("points.channel_scan_channel_result"),
+                         [1.0, 2.0, 1.0, 2.0, 3.0])
+        self.assertEqual(d("points.channel_scan_channel_result.offsets"), [0, 2, 5])
+
+        results = exp.tlr._make_value_dict()[exp.fragment.scan_channel_result]
+        self.assertEqual([r.tolist() for r in results], [[1.0, 2.0], [1.0, 2.0, 3.0]])
+
     def _test_run_1d(self, klass, fragment_fqn):
         exp = self.create(klass)
         fqn = fragment_fqn + ".value"
@@ -193,12 +341,321 @@ class FragmentScanExpCase(HasEnvironmentCase):
         self.assertEqual(d("completed"), True)
         self.assertEqual(d("points.axis_0"), [0, 1, 2])
         self.assertEqual(d("points.channel_result"), [1, 2, 3])
+        self.assertEqual(
+            json.loads(d("plan")), {
+                "points_per_level": [3],
+                "num_points": 3,
+                "num_bytes": {
+                    "axis_0": 24,
+                    "channel_result": 24
+                }
+            })
+        self.assertEqual(d("progress.num_points"), 3)
         self.assertEqual(d("fragment_fqn"), fragment_fqn)
         self.assertEqual(d("source_id"), "rid_0")
 
         return exp
 
 
+class CheckpointCase(HasEnvironmentCase):
+    def setUp(self):
+        super().setUp()
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.klass = make_fragment_scan_exp(InterruptedAddOneFragment,
+                                            checkpoint_dir=self.dir.name,
+                                            checkpoint_interval=0.0)
+
+    def _run(self, max_points):
+        InterruptedAddOneFragment.max_points = max_points
+        self.addCleanup(setattr, InterruptedAddOneFragment, "max_points", None)
+        exp = self.create(self.klass)
+        exp.args._params["scan"]["axes"].append({
+            "type": "linear",
+            "range": {
+                "start": 0,
+                "stop": 4,
+                "num_points": 5,
+                "randomise_order": True
+            },
+            "fqn": exp.fragment.fqn + ".value",
+            "path": "*"
+        })
+        exp.prepare()
+        exp.run()
+        return exp
+
+    def d(self, key):
+        return self.dataset_db.get("ndscan." + key)
+
+    def test_resume(self):
+        self._run(3)
+        self.assertEqual(self.d("completed"), False)
+        # For host scans, the coordinates of the interrupted point are already pushed.
+        first_points = self.d("points.axis_0")[:3]
+        self.assertEqual(len(self.d("points.channel_result")), 3)
+        seed = self.d("seed")
+        self.assertEqual(len(os.listdir(self.dir.name)), 1)
+
+        # Resume in a fresh environment, as it would be the case for a new RID.
+        super().setUp()
+        exp = self._run(None)
+        self.assertEqual(exp.fragment.num_points, 2)
+        self.assertEqual(self.d("completed"), True)
+        self.assertEqual(self.d("seed"), seed)
+        self.assertEqual(self.d("progress.num_points"), 5)
+        points = self.d("points.axis_0")
+        self.assertEqual(points[:3], first_points)
+        self.assertEqual(sorted(points), [0, 1, 2, 3, 4])
+        self.assertEqual(self.d("points.channel_result"), [p + 1 for p in points])
+
+        # Completed scans should not be resumed.
+        self.assertEqual(os.listdir(self.dir.name), [])
+
+    def test_different_scan(self):
+        self._run(2)
+        super().setUp()
+        InterruptedAddOneFragment.max_points = None
+        exp = self.create(self.klass)
+        exp.args._params["scan"]["axes"].append({
+            "type": "list",
+            "range": {
+                "values": [5, 6],
+                "randomise_order": False
+            },
+            "fqn": exp.fragment.fqn + ".value",
+            "path": "*"
+        })
+        exp.prepare()
+        exp.run()
+        self.assertEqual(self.d("points.axis_0"), [5, 6])
+        # The checkpoint for the other scan is left alone.
+        self.assertEqual(len(os.listdir(self.dir.name)), 1)
+
+
+class CoalescedAppendsCase(HasEnvironmentCase):
+    def setUp(self):
+        super().setUp()
+        self.mods = []
+        publish = self.dataset_mgr._broadcaster.publish
+
+        def record_publish(mod):
+            self.mods.append(mod)
+            publish(mod)
+
+        self.dataset_mgr._broadcaster.publish = record_publish
+
+    def _run(self, max_points):
+        InterruptedAddOneFragment.max_points = max_points
+        self.addCleanup(setattr, InterruptedAddOneFragment, "max_points", None)
+        exp = self.create(
+            make_fragment_scan_exp(InterruptedAddOneFragment,
+                                   append_flush_interval=1000.0,
+                                   max_pending_appends=2))
+        exp.args._params["scan"]["axes"].append({
+            "type": "linear",
+            "range": {
+                "start": 0,
+                "stop": 4,
+                "num_points": 5,
+                "randomise_order": False
+            },
+            "fqn": exp.fragment.fqn + ".value",
+            "path": "*"
+        })
+        exp.prepare()
+        exp.run()
+        return exp
+
+    def _num_mods(self, key):
+        return sum(1 for m in self.mods
+                   if m.get("key", None) == key or m["path"][:1] == [key])
+
+    def test_batched(self):
+        self._run(None)
+        self.assertEqual(self.dataset_db.get("ndscan.points.axis_0"), [0, 1, 2, 3, 4])
+        self.assertEqual(self.dataset_db.get("ndscan.points.channel_result"),
+                         [1, 2, 3, 4, 5])
+        # First value immediately, then two batches of two.
+        self.assertEqual(self._num_mods("ndscan.points.channel_result"), 3)
+
+    def test_flush_on_termination(self):
+        self._run(2)
+        # The first value is written immediately, the second one is still pending when
+        # the scan is interrupted.
+        self.assertEqual(self.dataset_db.get("ndscan.points.channel_result"), [1, 2])
+
+    def test_flush_on_pause(self):
+        num_checks = 0
+        paused_values = []
+
+        def check_pause():
+            nonlocal num_checks
+            num_checks += 1
+            return num_checks == 2
+
+        def pause():
+            paused_values.append(self.dataset_db.get("ndscan.points.channel_result")[:])
+
+        self.scheduler.check_pause = check_pause
+        self.scheduler.pause = pause
+        self._run(None)
+        # Pausing after the second point, which would otherwise still be pending.
+        self.assertEqual(paused_values, [[1, 2]])
+        self.assertEqual(self.dataset_db.get("ndscan.points.channel_result"),
+                         [1, 2, 3, 4, 5])
+
+
+TIME_SERIES_ARGS = {
+    PARAMS_ARG_KEY:
+    pyon.encode({
+        "overrides": {},
+        "scan": {
+            "axes": [],
+            "num_repeats": 1,
+            "no_axes_mode": "time_series"
+        }
+    })
+}
+
+
+class StreamCase(HasEnvironmentCase):
+    def setUp(self):
+        super().setUp()
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def test_time_series(self):
+        InterruptedNoAnalysisFragment.max_points = 25
+        self.addCleanup(setattr, InterruptedNoAnalysisFragment, "max_points", None)
+        exp = self.create(make_fragment_scan_exp(InterruptedNoAnalysisFragment,
+                                                 stream_dir=self.dir.name,
+                                                 stream_window=5),
+                          env_args=TIME_SERIES_ARGS)
+        exp.prepare()
+        exp.run()
+
+        def d(key):
+            return self.dataset_db.get("ndscan." + key)
+
+        # Only a window of the most recent points is kept in the datasets…
+        timestamps = d("points.axis_0")
+        self.assertGreaterEqual(len(timestamps), 5)
+        self.assertLess(len(timestamps), 10)
+        self.assertEqual(len(d("points.channel_result")), len(timestamps))
+
+        # …but all of them are written to the file.
+        path = d("stream_file")
+        self.assertEqual(os.path.dirname(path), self.dir.name)
+        with h5py.File(path, "r") as f:
+            datasets = f["datasets"]
+            self.assertEqual(datasets["ndscan.points.channel_result"][:].tolist(),
+                             [1.0] * 25)
+            all_timestamps = datasets["ndscan.points.axis_0"][:]
+            self.assertEqual(len(all_timestamps), 25)
+            self.assertEqual(all_timestamps[-len(timestamps):].tolist(), timestamps)
+            self.assertTrue(np.all(np.diff(all_timestamps) >= 0))
+            self.assertTrue(datasets["ndscan.completed"][()])
+            self.assertEqual(json.loads(datasets["ndscan.channels"][()]),
+                             json.loads(d("channels")))
+
+        self.assertEqual(len(exp.tlr._make_value_dict()[exp.fragment.result]), 25)
+
+
+class LiveViewCase(HasEnvironmentCase):
+    def test_time_series(self):
+        InterruptedNoAnalysisFragment.max_points = 25
+        self.addCleanup(setattr, InterruptedNoAnalysisFragment, "max_points", None)
+        exp = self.create(make_fragment_scan_exp(InterruptedNoAnalysisFragment,
+                                                 live_view_resolution=4),
+                          env_args=TIME_SERIES_ARGS)
+        exp.prepare()
+        exp.run()
+
+        def d(key):
+            return self.dataset_db.get("ndscan." + key)
+
+        # The full-resolution points are archived, but not broadcast…
+        self.assertNotIn("ndscan.points.channel_result", self.dataset_db.data)
+        self.assertEqual(self.dataset_mgr.local["ndscan.points.channel_result"],
+                         [1.0] * 25)
+        timestamps = self.dataset_mgr.local["ndscan.points.axis_0"]
+        self.assertEqual(len(timestamps), 25)
+        self.assertEqual(len(exp.tlr._make_value_dict()[exp.fragment.result]), 25)
+
+        # …whereas the live view is decimated to bins of 4 (with the partial bin at the
+        # end flushed once the scan was terminated).
+        self.assertEqual(d("live_points.channel_result.mean"), [1.0] * 7)
+        self.assertEqual(d("live_points.axis_0.min"), timestamps[::4])
+        self.assertEqual(d("live_points.axis_0.max"),
+                         timestamps[3::4] + [timestamps[-1]])
+
+        views = json.loads(d("point_views"))
+        self.assertEqual(views["full"]["prefix"], "points.")
+        self.assertEqual(views["live"]["prefix"], "live_points.")
+        self.assertEqual(views["live"]["resolution"], 4)
+
+    def test_no_stream(self):
+        with self.assertRaises(ValueError):
+            self.create(make_fragment_scan_exp(InterruptedNoAnalysisFragment,
+                                               stream_dir="",
+                                               live_view_resolution=4),
+                        env_args=TIME_SERIES_ARGS).prepare()
+
+
+class ChannelSettingsCase(HasEnvironmentCase):
+    def _run(self, channel_settings):
+        exp = self.create(make_fragment_scan_exp(DebugChannelFragment))
+        params = exp.args.get_params()
+        params["channel_settings"] = channel_settings
+        params["scan"]["axes"].append({
+            "type": "list",
+            "range": {
+                "values": [1.0, 2.0],
+                "randomise_order": False
+            },
+            "fqn": "fixtures.DebugChannelFragment.value",
+            "path": "*"
+        })
+        exp.prepare()
+        exp.run()
+        return exp
+
+    def _channels(self):
+        return json.loads(self.dataset_db.get("ndscan.channels"))
+
+    def test_describe(self):
+        exp = self.create(make_fragment_scan_exp(DebugChannelFragment))
+        params = exp.args.get_params()
+        self.assertEqual(params["channels"]["debug"]["save_by_default"], False)
+        self.assertEqual(params["channels"]["result"]["type"], "float")
+        self.assertEqual(params["channel_settings"], {})
+
+    def test_default(self):
+        self._run({})
+        self.assertEqual(list(self._channels().keys()), ["result"])
+        self.assertEqual(self.dataset_db.get("ndscan.points.channel_result"),
+                         [1.0, 2.0])
+        self.assertNotIn("ndscan.points.channel_debug", self.dataset_db.data)
+
+    def test_save(self):
+        self._run({"debug": {"save": True}, "result": {"save": False}})
+        self.assertEqual(list(self._channels().keys()), ["debug"])
+        self.assertEqual(self.dataset_db.get("ndscan.points.channel_debug"), [2.0, 4.0])
+        self.assertNotIn("ndscan.points.channel_result", self.dataset_db.data)
+
+    def test_mute(self):
+        exp = self._run({"debug": {"save": True, "muted": True}})
+        self.assertTrue(exp.fragment.debug.is_muted())
+        self.assertFalse(exp.fragment.result.is_muted())
+        self.assertEqual(list(self._channels().keys()), ["result"])
+        self.assertNotIn("ndscan.points.channel_debug", self.dataset_db.data)
+
+    def test_unknown_channel(self):
+        with self.assertRaises(ValueError):
+            self._run({"non_existent": {"muted": True}})
+
+
 class RunOnceCase(HasEnvironmentCase):
     def test_run_once_host(self):
         fragment = self.create(AddOneFragment, [])
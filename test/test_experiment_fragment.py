@@ -14,6 +14,42 @@ class DatasetDefaultFragment(Fragment):
         self.setattr_param("bar", IntParam, "Bar", default="dataset('bar', 2)")
 
 
+class SetupCountingFragment(Fragment):
+    skip_unchanged_device_setup = True
+
+    def build_fragment(self):
+        self.setattr_param("foo", IntParam, "Foo", default=1)
+        self.num_setups = 0
+
+    def device_setup(self):
+        self.num_setups += 1
+        self.device_setup_subfragments()
+
+
+class UncheckedSetupCountingFragment(SetupCountingFragment):
+    skip_unchanged_device_setup = False
+
+
+class SetupCountingParentFragment(Fragment):
+    skip_unchanged_device_setup = True
+
+    def build_fragment(self):
+        self.setattr_fragment("a", SetupCountingFragment)
+        self.setattr_fragment("b", SetupCountingFragment)
+        self.setattr_param_rebind("foo", self.b)
+        self.num_setups = 0
+
+    def device_setup(self):
+        self.num_setups += 1
+        self.device_setup_subfragments()
+
+
+class SetupCountingRootFragment(Fragment):
+    def build_fragment(self, child_class):
+        self.setattr_fragment("parent", SetupCountingParentFragment)
+        self.setattr_fragment("child", child_class)
+
+
 class TestParamDefaults(HasEnvironmentCase):
     def test_nonexistent_datasets(self):
         ddf = self.create(DatasetDefaultFragment, [])
@@ -59,3 +95,63 @@ class TestMisc(HasEnvironmentCase):
         self.assertEqual(a.make_namespaced_identifier("foo"), "a/foo")
         b = self.create(AddOneFragment, ["b", "c", "d"])
         self.assertEqual(b.make_namespaced_identifier("foo"), "b/c/d/foo")
+
+
+class TestDeviceSetupChangeTracking(HasEnvironmentCase):
+    def setUp(self):
+        super().setUp()
+        self.root = self.create(SetupCountingRootFragment, [], SetupCountingFragment)
+        self.root.init_params()
+
+    def setup_counts(self):
+        counts = (self.root.parent.num_setups, self.root.parent.a.num_setups,
+                  self.root.parent.b.num_setups, self.root.child.num_setups)
+        for f in (self.root.parent, self.root.parent.a, self.root.parent.b,
+                  self.root.child):
+            f.num_setups = 0
+        return counts
+
+    def test_skip_unchanged(self):
+        self.root.device_setup()
+        self.assertEqual(self.setup_counts(), (1, 1, 1, 1))
+        self.root.device_setup()
+        self.assertEqual(self.setup_counts(), (0, 0, 0, 0))
+
+        # Only the subtrees containing the changed parameter should be set up again.
+        self.root.parent.a.foo._store.set_value(2)
+        self.root.device_setup()
+        self.assertEqual(self.setup_counts(), (1, 1, 0, 0))
+
+        # Setting the same value again is not a change.
+        self.root.parent.a.foo._store.set_value(2)
+        self.root.device_setup()
+        self.assertEqual(self.setup_counts(), (0, 0, 0, 0))
+
+        # Rebound parameters should propagate to the original owner's subtree.
+        self.root.parent.foo._store.set_value(3)
+        self.root.device_setup()
+        self.assertEqual(self.setup_counts(), (1, 0, 1, 0))
+
+        # After cleanup (i.e. on the next kernel entry), everything is set up again.
+        self.root.device_cleanup()
+        self.root.device_setup()
+        self.assertEqual(self.setup_counts(), (1, 1, 1, 1))
+
+    def test_new_store(self):
+        self.root.device_setup()
+        self.setup_counts()
+        self.root.child.init_params({
+            self.root.child.fqn + ".foo":
+            [("*", IntParamStore((self.root.child.fqn + ".foo", "*"), 4))]
+        })
+        self.root.device_setup()
+        self.assertEqual(self.setup_counts(), (0, 0, 0, 1))
+
+    def test_opt_in_required(self):
+        root = self.create(SetupCountingRootFragment, [],
+                           UncheckedSetupCountingFragment)
+        root.init_params()
+        root.device_setup()
+        root.device_setup()
+        self.assertEqual(root.parent.num_setups, 1)
+        self.assertEqual(root.child.num_setups, 2)
@@ -1,5 +1,6 @@
+import numpy as np
 import unittest
-from ndscan.experiment.parameters import FloatParam, IntParam
+from ndscan.experiment.parameters import FloatParam, IntParam, IntParamStore
 
 
 class FloatParamCase(unittest.TestCase):
@@ -39,3 +40,17 @@ class IntParamCase(unittest.TestCase):
                 },
                 "type": "int"
             })
+
+
+class IntParamStoreCase(unittest.TestCase):
+    def test_coerce_array(self):
+        store = IntParamStore(("foo", "*"), 0)
+        values = store.coerce_array([1.0, 2.0, -3.0])
+        self.assertEqual(values.dtype, np.int64)
+        self.assertEqual(list(values), [1, 2, -3])
+
+    def test_coerce_array_non_finite(self):
+        store = IntParamStore(("foo", "*"), 0)
+        for value in [float("nan"), float("inf"), -float("inf")]:
+            with self.assertRaises(ValueError):
+                store.coerce_array([1.0, value])
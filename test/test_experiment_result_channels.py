@@ -0,0 +1,232 @@
+"""
+Tests for result channel sinks.
+"""
+
+import numpy as np
+import unittest
+from ndscan.experiment import *
+from mock_environment import HasEnvironmentCase
+
+
+class TypedArraySinkCase(unittest.TestCase):
+    def test_push_grow(self):
+        sink = TypedArraySink(np.float64, initial_capacity=2)
+        self.assertEqual(len(sink.get_all()), 0)
+        for i in range(100):
+            sink.push(i)
+        values = sink.get_all()
+        self.assertEqual(values.dtype, np.float64)
+        self.assertEqual(values.tolist(), list(range(100)))
+
+    def test_read_only_view(self):
+        sink = TypedArraySink(np.int64)
+        sink.push(1)
+        values = sink.get_all()
+        with self.assertRaises(ValueError):
+            values[0] = 2
+
+    def test_views_remain_valid(self):
+        sink = TypedArraySink(np.int64, initial_capacity=1)
+        sink.push(1)
+        first = sink.get_all()
+        sink.push(2)
+        sink.push(3)
+        self.assertEqual(first.tolist(), [1])
+        second = sink.get_all()
+        sink.clear()
+        sink.push(4)
+        self.assertEqual(second.tolist(), [1, 2, 3])
+        self.assertEqual(sink.get_all().tolist(), [4])
+
+    def test_make_array_sink(self):
+        float_sink = make_array_sink(FloatChannel("a"))
+        self.assertIsInstance(float_sink, TypedArraySink)
+        self.assertEqual(float_sink.dtype, np.float64)
+        int_sink = make_array_sink(IntChannel("b"))
+        self.assertIsInstance(int_sink, TypedArraySink)
+        self.assertEqual(int_sink.dtype, np.int64)
+        self.assertIsInstance(make_array_sink(OpaqueChannel("c")), ArraySink)
+
+    def test_array_values(self):
+        sink = make_array_sink(ArrayChannel("a", (2, 3), np.int32))
+        for i in range(20):
+            sink.push(np.full((2, 3), i))
+        values = sink.get_all()
+        self.assertEqual(values.shape, (20, 2, 3))
+        self.assertEqual(values.dtype, np.int32)
+        self.assertTrue(values.flags.c_contiguous)
+        self.assertEqual(values[:, 1, 2].tolist(), list(range(20)))
+
+
+class FanOutSinkCase(unittest.TestCase):
+    def test_forward(self):
+        archive = ArraySink()
+        last = LastValueSink()
+        sink = FanOutSink([archive, last])
+        sink.push(1)
+        sink.push(2)
+        self.assertEqual(archive.get_all(), [1, 2])
+        self.assertEqual(last.get_last(), 2)
+        self.assertEqual(sink.get_all(), [1, 2])
+
+
+class DecimatingDatasetSinkCase(HasEnvironmentCase):
+    def get(self, stat):
+        return self.dataset_db.get("values." + stat)
+
+    def test_decimate(self):
+        sink = self.create(DecimatingDatasetSink, "values", 4)
+        for i in range(3):
+            sink.push(i)
+        self.assertEqual(self.get("mean"), [0, 1, 2])
+
+        for i in range(3, 100):
+            sink.push(i)
+            num_bins = len(self.get("mean"))
+            self.assertLess(num_bins, 8)
+            self.assertEqual(num_bins, (i + 1) // sink.bin_size)
+        self.assertEqual(sink.bin_size, 16)
+        self.assertEqual(self.get("min"), [0, 16, 32, 48, 64, 80])
+        self.assertEqual(self.get("max"), [15, 31, 47, 63, 79, 95])
+        self.assertEqual(self.get("mean"), [7.5, 23.5, 39.5, 55.5, 71.5, 87.5])
+        self.assertEqual(sink.get_last(), 99)
+
+    def test_flush_partial_bin(self):
+        sink = self.create(DecimatingDatasetSink, "values", 1)
+        for i in range(5):
+            sink.push(i)
+        self.assertEqual(sink.bin_size, 4)
+        self.assertEqual(self.get("mean"), [1.5])
+        sink.flush()
+        self.assertEqual(self.get("mean"), [1.5, 4])
+        self.assertEqual(self.get("max"), [3, 4])
+        for i in range(5, 7):
+            sink.push(i)
+        sink.flush()
+        self.assertEqual(self.get("mean"), [1.5, 5])
+        sink.push(7)
+        # Completing the second bin merges it with the first.
+        self.assertEqual(sink.bin_size, 8)
+        self.assertEqual(self.get("mean"), [3.5])
+        self.assertEqual(self.get("min"), [0])
+        self.assertEqual(self.get("max"), [7])
+
+
+class PackedArrayDatasetSinkCase(HasEnvironmentCase):
+    def test_push(self):
+        sink = self.create(PackedArrayDatasetSink, "values")
+        self.assertEqual(len(sink.get_all()), 0)
+        sink.push(np.array([1.0, 2.0]))
+        sink.push(np.array([]))
+        sink.push(np.array([3.0, 4.0, 5.0]))
+        self.assertEqual(self.dataset_db.get("values"), [1.0, 2.0, 3.0, 4.0, 5.0])
+        self.assertEqual(self.dataset_db.get("values.offsets"), [0, 2, 2, 5])
+        values = sink.get_all()
+        self.assertEqual([v.tolist() for v in values],
+                         [[1.0, 2.0], [], [3.0, 4.0, 5.0]])
+        self.assertEqual(sink.get_last().tolist(), [3.0, 4.0, 5.0])
+
+
+class PackedArrayChannelCase(unittest.TestCase):
+    def test_coerce(self):
+        channel = PackedArrayChannel("a", np.int64)
+        sink = LastValueSink()
+        channel.set_sink(sink)
+        channel.push([1, 2, 3])
+        self.assertEqual(sink.get_last().dtype, np.int64)
+        with self.assertRaises(ValueError):
+            channel.push([[1, 2]])
+        self.assertEqual(channel.describe()["type"], "packed_array")
+        self.assertEqual(channel.describe()["dtype"], "int64")
+
+
+class MutedChannelCase(unittest.TestCase):
+    def test_push(self):
+        channel = FloatChannel("a")
+        sink = ArraySink()
+        channel.set_sink(sink)
+        self.assertFalse(channel.is_muted())
+        channel.set_muted(True)
+        self.assertTrue(channel.is_muted())
+        # Values are discarded without even being coerced.
+        channel.push("not a number")
+        channel.push_many(["not a number"])
+        self.assertEqual(sink.get_all(), [])
+        channel.set_muted(False)
+        channel.push(1)
+        self.assertEqual(sink.get_all(), [1.0])
+
+
+class ArrayChannelCase(unittest.TestCase):
+    def test_coerce(self):
+        channel = ArrayChannel("a", (3, ), np.int32)
+        sink = LastValueSink()
+        channel.set_sink(sink)
+        channel.push([1, 2, 3])
+        self.assertEqual(sink.get_last().dtype, np.int32)
+        self.assertEqual(sink.get_last().tolist(), [1, 2, 3])
+        with self.assertRaises(ValueError):
+            channel.push([1, 2])
+
+    def test_describe(self):
+        channel = ArrayChannel("a", [2, 4], description="Image")
+        self.assertEqual(
+            channel.describe(), {
+                "path": "a",
+                "description": "Image",
+                "type": "array",
+                "shape": [2, 4],
+                "dtype": "float64"
+            })
+
+
+class PushManyCase(HasEnvironmentCase):
+    def test_coerce(self):
+        channel = FloatChannel("a")
+        sink = ArraySink()
+        channel.set_sink(sink)
+        channel.push_many([1, 2.5])
+        channel.push_many(np.arange(2))
+        self.assertEqual(sink.get_all(), [1.0, 2.5, 0.0, 1.0])
+        for value in sink.get_all():
+            self.assertIsInstance(value, float)
+        with self.assertRaises(ValueError):
+            channel.push_many([[1.0]])
+
+        channel = IntChannel("b")
+        channel.set_sink(sink)
+        channel.push_many([3.7])
+        self.assertEqual(sink.get_all()[-1], 3)
+        self.assertIsInstance(sink.get_all()[-1], int)
+
+    def test_array_channel(self):
+        channel = ArrayChannel("a", (2, ), np.int32)
+        sink = make_array_sink(channel)
+        channel.set_sink(sink)
+        channel.push_many(np.zeros((3, 2)))
+        channel.push_many([[1, 2]])
+        self.assertEqual(sink.get_all().tolist(), [[0, 0]] * 3 + [[1, 2]])
+        with self.assertRaises(ValueError):
+            channel.push_many([[1, 2, 3]])
+
+    def test_typed_array_sink_grow(self):
+        sink = TypedArraySink(np.float64, initial_capacity=2)
+        sink.push(0)
+        sink.push_many(np.arange(1, 10))
+        sink.push_many([])
+        sink.push(10)
+        self.assertEqual(sink.get_all().tolist(), list(range(11)))
+
+    def test_appending_dataset_sink(self):
+        sink = self.create(AppendingDatasetSink, "values")
+        sink.push_many(np.array([1.0, 2.0]))
+        sink.push(3.0)
+        sink.push_many([4.0, 5.0])
+        self.assertEqual(self.dataset_db.get("values"), [1.0, 2.0, 3.0, 4.0, 5.0])
+        self.assertEqual(sink.get_last(), 5.0)
+        self.assertEqual(sink.get_all(), [1.0, 2.0, 3.0, 4.0, 5.0])
+
+    def test_scalar_dataset_sink(self):
+        sink = self.create(ScalarDatasetSink, "value")
+        sink.push_many([1, 2])
+        self.assertEqual(sink.get_last(), 2)
@@ -0,0 +1,350 @@
+from itertools import islice
+import numpy as np
+import unittest
+from ndscan.experiment.scan_generator import (
+    AdaptiveGenerator, count_points_per_level, generate_point_chunks, generate_points,
+    HaltonSampler, LatinHypercubeSampler, LinearGenerator, ListGenerator,
+    RefiningGenerator, SampledGenerator, ScanGenerator, ScanOptions, ScanPointSequence,
+    _RandomPermutation)
+
+
+class GeneratePointsCase(unittest.TestCase):
+    def test_cartesian_order(self):
+        gens = [ListGenerator([1, 2], False), ListGenerator([3, 4, 5], False)]
+        points = list(generate_points(gens, ScanOptions()))
+        self.assertEqual(points, [(1, 3), (2, 3), (1, 4), (2, 4), (1, 5), (2, 5)])
+
+    def test_repeats(self):
+        gens = [LinearGenerator(0.0, 1.0, 3, False)]
+        points = list(generate_points(gens, ScanOptions(num_repeats=2)))
+        self.assertEqual(points, [(0.0, ), (0.5, ), (1.0, )] * 2)
+
+    def test_refining_levels(self):
+        gens = [RefiningGenerator(0.0, 1.0, False), ListGenerator([0, 1], False)]
+        points = list(islice(generate_points(gens, ScanOptions()), 64))
+
+        # Each combination should only be visited once, even across levels.
+        self.assertEqual(len(points), len(set(points)))
+
+        # The first level consists of the end points only.
+        self.assertEqual(points[:4], [(0.0, 0), (1.0, 0), (0.0, 1), (1.0, 1)])
+        self.assertEqual(points[4:6], [(0.5, 0), (0.5, 1)])
+
+    def test_randomise_globally(self):
+        gens = [ListGenerator(list(range(10)), False), ListGenerator([0, 1], False)]
+        options = ScanOptions(num_repeats=3, randomise_order_globally=True, seed=1234)
+        points = list(generate_points(gens, options))
+        self.assertEqual(len(points), 60)
+        for i in range(3):
+            self.assertEqual(sorted(points[(i * 20):((i + 1) * 20)]),
+                             sorted((a, b) for a in range(10) for b in [0, 1]))
+
+        # Generating points is deterministic given the seed.
+        self.assertEqual(points, list(generate_points(gens, options)))
+
+    def test_iterator(self):
+        points = generate_points([ListGenerator([1, 2], False)], ScanOptions())
+        self.assertEqual(next(points), (1, ))
+        self.assertEqual(next(points), (2, ))
+        with self.assertRaises(StopIteration):
+            next(points)
+
+
+class RandomPermutationCase(unittest.TestCase):
+    def test_bijective(self):
+        for size in [1, 2, 3, 4, 5, 17, 1000, 4097]:
+            perm = _RandomPermutation(size, np.random.RandomState(size))
+            indices = perm(np.arange(size))
+            self.assertEqual(sorted(indices.tolist()), list(range(size)))
+
+    def test_reproducible(self):
+        def make():
+            return _RandomPermutation(10000, np.random.RandomState(1234))
+
+        indices = np.arange(10000)
+        self.assertEqual(make()(indices).tolist(), make()(indices).tolist())
+        self.assertNotEqual(make()(indices).tolist(), indices.tolist())
+
+        # Evaluating the permutation piecewise gives the same result.
+        perm = make()
+        self.assertEqual(
+            perm(indices[:5000]).tolist() + perm(indices[5000:]).tolist(),
+            perm(indices).tolist())
+
+    def test_cycle_walking(self):
+        # Sizes just above a power of four (i.e. with an odd number of bits), where
+        # the Feistel domain is almost four times larger than the number of elements.
+        for size in [4097, 2**20 + 1]:
+            perm = _RandomPermutation(size, np.random.RandomState(size))
+            indices = perm(np.arange(size))
+            self.assertEqual(indices.min(), 0)
+            self.assertEqual(indices.max(), size - 1)
+            self.assertEqual(len(np.unique(indices)), size)
+
+    def test_empty(self):
+        perm = _RandomPermutation(0, np.random.RandomState(0))
+        self.assertEqual(perm(np.arange(0)).tolist(), [])
+
+        gens = [ListGenerator([], False), ListGenerator([1, 2], False)]
+        options = ScanOptions(num_repeats=2, randomise_order_globally=True)
+        self.assertEqual(list(generate_points(gens, options)), [])
+        self.assertEqual(list(generate_point_chunks(gens, options, 10)), [])
+
+
+class GeneratePointChunksCase(unittest.TestCase):
+    def test_matches_generate_points(self):
+        gens = [
+            RefiningGenerator(-1.0, 1.0, True),
+            LinearGenerator(0.0, 2.0, 7, True),
+            ListGenerator([3, 5, 7], False)
+        ]
+        for randomise in [False, True]:
+            options = ScanOptions(num_repeats=2,
+                                  randomise_order_globally=randomise,
+                                  seed=42)
+            expected = list(islice(generate_points(gens, options), 1000))
+
+            actual = []
+            for chunk in generate_point_chunks(gens, options, 13):
+                self.assertEqual(len(chunk), len(gens))
+                self.assertLessEqual(len(chunk[0]), 13)
+                for values in chunk:
+                    self.assertIsInstance(values, np.ndarray)
+                actual.extend(zip(*(values.tolist() for values in chunk)))
+                if len(actual) >= 1000:
+                    break
+            self.assertEqual(actual[:1000], expected)
+
+
+class ScanPointSequenceCase(unittest.TestCase):
+    def test_num_points(self):
+        gens = [ListGenerator([1, 2], False), LinearGenerator(0.0, 1.0, 5, False)]
+        seq = ScanPointSequence(gens, ScanOptions(num_repeats=3))
+        self.assertEqual(seq.num_points, 30)
+        self.assertEqual(len(seq), 30)
+        self.assertEqual(len(list(seq)), 30)
+
+        gens.append(RefiningGenerator(0.0, 1.0, False))
+        seq = ScanPointSequence(gens, ScanOptions())
+        self.assertIsNone(seq.num_points)
+        with self.assertRaises(TypeError):
+            len(seq)
+
+    def test_random_access(self):
+        gens = [RefiningGenerator(0.0, 1.0, True), ListGenerator([1, 2, 3], True)]
+        for randomise in [False, True]:
+            options = ScanOptions(num_repeats=2,
+                                  randomise_order_globally=randomise,
+                                  seed=1234)
+            expected = list(islice(generate_points(gens, options), 200))
+
+            # Access points out of order on a fresh sequence.
+            seq = ScanPointSequence(gens, options)
+            for i in [150, 3, 199, 0, 42]:
+                self.assertEqual(seq.point_at(i), expected[i])
+
+            # Resume iteration part-way through.
+            seq = ScanPointSequence(gens, options)
+            seq.skip(77)
+            self.assertEqual(list(islice(seq, 123)), expected[77:])
+            self.assertEqual(seq.position, 77)
+            chunk = seq.next_chunk(50)
+            self.assertEqual(list(zip(*(values.tolist() for values in chunk))),
+                             expected[77:127])
+            self.assertEqual(seq.position, 127)
+
+    def test_independent_iterators(self):
+        seq = ScanPointSequence([ListGenerator([1, 2, 3], False)], ScanOptions())
+        a = iter(seq)
+        b = iter(seq)
+        self.assertEqual(next(a), (1, ))
+        self.assertEqual(next(a), (2, ))
+        self.assertEqual(next(b), (1, ))
+        self.assertEqual(list(seq), [(1, ), (2, ), (3, )])
+        self.assertEqual(list(a), [(3, )])
+
+    def test_generator_num_points(self):
+        self.assertIsNone(ScanGenerator().total_num_points())
+        self.assertIsNone(RefiningGenerator(0.0, 1.0, False).total_num_points())
+        self.assertEqual(LinearGenerator(0.0, 1.0, 7, False).total_num_points(), 7)
+        self.assertEqual(ListGenerator([1, 2], False).total_num_points(), 2)
+
+    def test_out_of_range(self):
+        seq = ScanPointSequence([ListGenerator([1, 2], False)], ScanOptions())
+        self.assertEqual(seq.point_at(1), (2, ))
+        with self.assertRaises(IndexError):
+            seq.point_at(2)
+        seq.skip(5)
+        self.assertEqual(list(seq), [])
+
+
+class CountPointsPerLevelCase(unittest.TestCase):
+    def test_matches_generated_levels(self):
+        for gens in [
+            [LinearGenerator(0.0, 1.0, 3, False),
+             ListGenerator([1, 2], False)],
+            [RefiningGenerator(0.0, 1.0, False),
+             ListGenerator([1, 2, 3], False)],
+            [RefiningGenerator(0.0, 1.0, True),
+             RefiningGenerator(0.0, 1.0, True)]
+        ]:
+            options = ScanOptions(num_repeats=2)
+            counts = count_points_per_level(gens, options, 4)
+            self.assertEqual(len(counts), 1 if gens[0].total_num_points() else 4)
+
+            seq = ScanPointSequence(gens, options)
+            for _ in counts:
+                seq._generate_next_level()
+            self.assertEqual(np.diff(seq._block_offsets[::2]).tolist(), counts)
+
+    def test_sampled(self):
+        sampler = HaltonSampler(10, False)
+        gens = [
+            SampledGenerator(sampler, 0.0, 1.0),
+            ListGenerator([1, 2], False),
+            SampledGenerator(sampler, 0.0, 1.0)
+        ]
+        self.assertEqual(count_points_per_level(gens, ScanOptions(), 4), [20])
+
+    def test_adaptive(self):
+        gens = [AdaptiveGenerator(0.0, 1.0, False, num_initial_points=3)]
+        self.assertEqual(count_points_per_level(gens, ScanOptions(), 3), [3, 5, 5])
+
+    def test_unknown(self):
+        self.assertEqual(count_points_per_level([ScanGenerator()], ScanOptions(), 3),
+                         [None])
+
+
+class _ListSink:
+    def __init__(self):
+        self.data = []
+
+    def get_all(self):
+        return self.data
+
+
+class AdaptiveGeneratorCase(unittest.TestCase):
+    def test_without_feedback(self):
+        gen = AdaptiveGenerator(0.0,
+                                1.0,
+                                False,
+                                num_initial_points=3,
+                                num_points_per_level=2)
+        points = [p for (p, ) in islice(generate_points([gen], ScanOptions()), 9)]
+        self.assertEqual(points,
+                         [0.0, 0.5, 1.0, 0.25, 0.75, 0.125, 0.375, 0.625, 0.875])
+
+    def test_refines_near_step(self):
+        gen = AdaptiveGenerator(0.0,
+                                1.0,
+                                False,
+                                "y",
+                                num_initial_points=11,
+                                num_points_per_level=2)
+        coordinates = _ListSink()
+        values = _ListSink()
+        gen.set_feedback_sinks(coordinates, values)
+
+        for (x, ) in islice(generate_points([gen], ScanOptions()), 41):
+            coordinates.data.append(x)
+            values.data.append(1.0 if x > 0.52 else 0.0)
+
+        # Uniform refinement would only reach a resolution of 0.025 with this number
+        # of points.
+        new_points = np.array(coordinates.data[11:])
+        self.assertLess(np.min(np.abs(new_points - 0.52)), 1e-3)
+        self.assertGreater(np.count_nonzero(np.abs(new_points - 0.52) < 0.05), 10)
+
+    def test_feedback_length_mismatch(self):
+        gen = AdaptiveGenerator(0.0, 1.0, False, "y", num_initial_points=3)
+        coordinates = _ListSink()
+        values = _ListSink()
+        gen.set_feedback_sinks(coordinates, values)
+
+        points = generate_points([gen], ScanOptions())
+        for _ in range(3):
+            (x, ) = next(points)
+            coordinates.data.append(x)
+        values.data.extend([0.0, 1.0])
+        with self.assertRaises(ValueError):
+            next(points)
+
+    def test_no_skipping(self):
+        gen = AdaptiveGenerator(0.0, 1.0, False, num_initial_points=3)
+        seq = ScanPointSequence([gen], ScanOptions())
+        with self.assertRaises(ValueError):
+            seq.skip(1)
+        with self.assertRaises(ValueError):
+            seq.point_at(1)
+
+        # Points are accessible once the preceding levels have been generated.
+        self.assertEqual(seq.point_at(0), (0.0, ))
+        self.assertEqual(seq.point_at(2), (1.0, ))
+        self.assertEqual(seq.point_at(3), (0.25, ))
+        self.assertEqual(seq.point_at(4), (0.75, ))
+        with self.assertRaises(ValueError):
+            seq.point_at(6)
+        seq.skip(0)
+        self.assertEqual(seq.position, 0)
+
+    def test_min_spacing(self):
+        gen = AdaptiveGenerator(0.0, 1.0, True, num_initial_points=2, min_spacing=0.1)
+        points = list(generate_points([gen], ScanOptions()))
+        self.assertEqual(len(points), len(set(points)))
+        self.assertEqual(len(points), 9)
+        self.assertIsNone(gen.total_num_points())
+
+    def test_describe_limits(self):
+        target = {}
+        AdaptiveGenerator(2.0, -1.0, False).describe_limits(target)
+        self.assertEqual(target, {"min": -1.0, "max": 2.0})
+
+
+class SampledGeneratorCase(unittest.TestCase):
+    def test_halton(self):
+        sampler = HaltonSampler(7, False)
+        gens = [
+            SampledGenerator(sampler, 0.0, 1.0),
+            SampledGenerator(sampler, 0.0, 9.0)
+        ]
+        points = list(generate_points(gens, ScanOptions()))
+        self.assertEqual(len(points), 7)
+        self.assertEqual(ScanPointSequence(gens, ScanOptions()).num_points, 7)
+        np.testing.assert_allclose([p[0] for p in points],
+                                   [1 / 2, 1 / 4, 3 / 4, 1 / 8, 5 / 8, 3 / 8, 7 / 8])
+        np.testing.assert_allclose([p[1] for p in points], [3, 6, 1, 4, 7, 2, 5])
+
+    def test_latin_hypercube(self):
+        sampler = LatinHypercubeSampler(20, False)
+        gens = [SampledGenerator(sampler, 0.0, 20.0) for _ in range(3)]
+        points = np.array(list(generate_points(gens, ScanOptions(seed=123))))
+        self.assertEqual(points.shape, (20, 3))
+        for axis in range(3):
+            # Exactly one point per stratum.
+            self.assertEqual(sorted(np.floor(points[:, axis]).tolist()),
+                             list(range(20)))
+
+    def test_product_with_other_axes(self):
+        sampler = HaltonSampler(5, True)
+        gens = [
+            SampledGenerator(sampler, 0.0, 1.0),
+            ListGenerator([1, 2], False),
+            SampledGenerator(sampler, -1.0, 0.0)
+        ]
+        options = ScanOptions(num_repeats=2, randomise_order_globally=True, seed=1)
+        points = list(generate_points(gens, options))
+        self.assertEqual(len(points), 20)
+        samples = set((a, c) for (a, _, c) in points)
+        self.assertEqual(len(samples), 5)
+        self.assertEqual(sorted(points[:10]),
+                         sorted((a, b, c) for (a, c) in samples for b in [1, 2]))
+
+    def test_describe_limits(self):
+        sampler = LatinHypercubeSampler(16, True)
+        gens = [
+            SampledGenerator(sampler, 0.0, 3.0),
+            SampledGenerator(sampler, 1.0, 0.0)
+        ]
+        target = {}
+        gens[0].describe_limits(target)
+        self.assertEqual(target, {"min": 0.0, "max": 3.0, "increment": 1.0})
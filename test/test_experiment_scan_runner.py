@@ -0,0 +1,540 @@
+"""
+Tests for ndscan.experiment.scan_runner.
+"""
+
+import numpy as np
+import unittest.mock
+from ndscan.experiment import *
+from ndscan.experiment.parameters import FloatParamStore, IntParamStore
+from ndscan.experiment.result_channels import ArraySink
+from ndscan.experiment.scan_generator import ScanPointSequence
+from ndscan.experiment.scan_runner import (_FloatResultBuffer, _IntResultBuffer,
+                                           _StagingSink)
+from mock_environment import HasEnvironmentCase
+
+
+def _make_axis(store_type, type_string):
+    return ScanAxis({"type": type_string}, "*", store_type(("foo", "*"), 0))
+
+
+class KernelScanBookkeepingCase(HasEnvironmentCase):
+    def setUp(self):
+        super().setUp()
+        self.runner = self.create(ScanRunner)
+        self.axes = [
+            _make_axis(FloatParamStore, "float"),
+            _make_axis(IntParamStore, "int")
+        ]
+        self.sinks = [ArraySink(), ArraySink()]
+
+    def set_up_points(self, generators, options=None):
+        points = ScanPointSequence(generators, options or ScanOptions())
+        self.runner._kscan_set_up_points(points, self.axes, self.sinks)
+
+    def test_chunks_span_levels_and_repeats(self):
+        self.set_up_points(
+            [ListGenerator([0.5, 1.5, 2.5], False),
+             ListGenerator([1], False)], ScanOptions(num_repeats=5))
+        chunk_size = self.runner.KERNEL_CHUNK_SIZE
+        floats, ints = self.runner._kscan_param_values_chunk()
+        self.assertEqual(len(floats), chunk_size)
+        self.assertEqual(floats[:4], [0.5, 1.5, 2.5, 0.5])
+        self.assertEqual(ints, [1] * chunk_size)
+
+    def test_partial_chunk_resend(self):
+        self.set_up_points(
+            [ListGenerator([0.0, 1.0, 2.0], False),
+             ListGenerator([3.0, 4.0], False)])
+        self.runner._kscan_update_host_param_stores()
+        self.assertEqual(self.axes[0].param_store.get_value(), 0.0)
+        self.assertEqual(self.axes[1].param_store.get_value(), 3)
+
+        floats, ints = self.runner._kscan_param_values_chunk()
+        self.assertEqual(floats, [0.0, 1.0, 2.0, 0.0, 1.0, 2.0])
+        self.assertEqual(ints, [3, 3, 3, 4, 4, 4])
+
+        # Complete two points, then leave the kernel (e.g. to pause) – the remaining
+        # points should be sent again.
+        self.runner._kscan_point_completed()
+        self.runner._kscan_point_completed()
+        self.assertEqual(self.axes[0].param_store.get_value(), 2.0)
+        floats, ints = self.runner._kscan_param_values_chunk()
+        self.assertEqual(floats, [2.0, 0.0, 1.0, 2.0])
+        self.assertEqual(ints, [3, 4, 4, 4])
+
+        self.assertEqual(self.sinks[0].get_all(), [0.0, 1.0])
+        self.assertEqual(self.sinks[1].get_all(), [3, 3])
+        for value in self.sinks[1].get_all():
+            self.assertIsInstance(value, int)
+
+    def test_exhaustion(self):
+        self.set_up_points(
+            [ListGenerator([0.0, 1.0], False),
+             ListGenerator([3], False)])
+        self.runner._kscan_update_host_param_stores()
+        self.assertFalse(self.runner._kscan_is_out_of_points())
+        self.runner._kscan_point_completed()
+        self.assertFalse(self.runner._kscan_is_out_of_points())
+        self.runner._kscan_point_completed()
+        self.assertTrue(self.runner._kscan_is_out_of_points())
+        self.assertEqual(self.runner._kscan_param_values_chunk(), ([], []))
+        self.assertEqual(self.sinks[0].get_all(), [0.0, 1.0])
+
+    def test_pending_points_block_next_level(self):
+        self.set_up_points([
+            AdaptiveGenerator(0.0, 1.0, False, num_initial_points=3),
+            ListGenerator([3], False)
+        ])
+        self.runner._kscan_update_host_param_stores()
+
+        # The first chunk only contains the initial level, as the next one depends on
+        # the results.
+        floats, ints = self.runner._kscan_param_values_chunk()
+        self.assertEqual(floats, [0.0, 0.5, 1.0])
+
+        # While some of its points are still pending, no new level is generated.
+        self.runner._kscan_point_completed()
+        floats, ints = self.runner._kscan_param_values_chunk()
+        self.assertEqual(floats, [0.5, 1.0])
+        self.assertEqual(self.runner._kscan_points.position, 3)
+
+        self.runner._kscan_point_completed()
+        self.runner._kscan_point_completed()
+        floats, ints = self.runner._kscan_param_values_chunk()
+        self.assertEqual(floats, [0.25, 0.75])
+        self.assertEqual(ints, [3, 3])
+        self.assertEqual(self.sinks[0].get_all(), [0.0, 0.5, 1.0])
+
+    def test_empty_scan(self):
+        self.set_up_points([ListGenerator([], False), ListGenerator([3], False)])
+        self.runner._kscan_update_host_param_stores()
+        self.assertTrue(self.runner._kscan_is_out_of_points())
+        self.assertEqual(self.runner._kscan_param_values_chunk(), ([], []))
+        self.assertEqual(self.sinks[0].get_all(), [])
+
+
+class KernelChunkSizeCase(HasEnvironmentCase):
+    def setUp(self):
+        super().setUp()
+        self.runner = self.create(ScanRunner, max_kernel_chunk_size=32)
+        self.runner._kscan_pause_check_interval_mu = 10**6
+        axes = [_make_axis(FloatParamStore, "float")]
+        points = ScanPointSequence([LinearGenerator(0.0, 1.0, 1000, False)],
+                                   ScanOptions())
+        self.runner._kscan_set_up_points(points, axes, [ArraySink()])
+
+    def run_chunk(self, fetch_mu, point_mu):
+        """Simulate the kernel executing a chunk of points and fetching the next one,
+        returning the new chunk size."""
+        (values, ) = self.runner._kscan_param_values_chunk()
+        for _ in values:
+            self.runner._kscan_point_completed()
+        self.runner._kscan_param_values_chunk(fetch_mu, point_mu * len(values))
+        return self.runner.kernel_chunk_size
+
+    def test_initial(self):
+        self.assertEqual(self.runner.kernel_chunk_size, ScanRunner.KERNEL_CHUNK_SIZE)
+        (values, ) = self.runner._kscan_param_values_chunk()
+        self.assertEqual(len(values), ScanRunner.KERNEL_CHUNK_SIZE)
+
+    def test_fast_points(self):
+        # Fetching takes as long as ten points, so chunks should grow (gradually) up to
+        # the limit.
+        self.assertEqual(self.run_chunk(1000, 100), 20)
+        self.assertEqual(self.run_chunk(1000, 100), 32)
+        self.assertEqual(self.runner.kernel_chunk_size, 32)
+
+    def test_slow_points(self):
+        self.assertEqual(self.run_chunk(1000, 10**6), 5)
+        for _ in range(5):
+            self.run_chunk(1000, 10**6)
+        self.assertEqual(self.runner.kernel_chunk_size, 1)
+
+    def test_pause_latency(self):
+        # Fetches exceeding the pause check interval should lead to smaller chunks, even
+        # if the RPC overhead is large in relative terms.
+        self.assertEqual(self.run_chunk(2 * 10**6, 1000), 5)
+
+    def test_no_timing_information(self):
+        self.assertEqual(self.run_chunk(0, 1000), ScanRunner.KERNEL_CHUNK_SIZE)
+
+
+class KernelPrefetchCase(HasEnvironmentCase):
+    def run_kernel_scan(self, **kwargs):
+        """Simulate the kernel executing all points of a 25-point scan chunk by chunk,
+        returning the chunks fetched and the sequence position after the first point
+        of each chunk has completed."""
+        runner = self.create(ScanRunner, **kwargs)
+        sink = ArraySink()
+        points = ScanPointSequence([LinearGenerator(0.0, 24.0, 25, False)],
+                                   ScanOptions())
+        runner._kscan_set_up_points(points, [_make_axis(FloatParamStore, "float")],
+                                    [sink])
+        runner._kscan_update_host_param_stores()
+        chunks = []
+        positions = []
+        while True:
+            (values, ) = runner._kscan_param_values_chunk()
+            if not values:
+                break
+            chunks.append(values)
+            runner._kscan_prefetch_points()
+            for i in range(len(values)):
+                runner._kscan_point_completed()
+                if i == 0:
+                    positions.append(points.position)
+        self.assertTrue(runner._kscan_is_out_of_points())
+        self.assertEqual(sink.get_all(), [float(i) for i in range(25)])
+        return chunks, positions
+
+    def test_prefetch(self):
+        chunks, positions = self.run_kernel_scan()
+        self.assertEqual([len(c) for c in chunks], [10, 10, 5])
+        # The next chunk is generated while the current one is still executing.
+        self.assertEqual(positions, [20, 25, 25])
+
+    def test_no_prefetch(self):
+        chunks, positions = self.run_kernel_scan(prefetch_kernel_chunks=False)
+        self.assertEqual([len(c) for c in chunks], [10, 10, 5])
+        self.assertEqual(positions, [10, 20, 25])
+
+
+class KernelResultStagingCase(HasEnvironmentCase):
+    def setUp(self):
+        super().setUp()
+        self.runner = self.create(ScanRunner)
+        self.axis_sink = ArraySink()
+        points = ScanPointSequence([ListGenerator([0.5, 1.5, 2.5], False)],
+                                   ScanOptions())
+        self.runner._kscan_set_up_points(points, [_make_axis(FloatParamStore, "float")],
+                                         [self.axis_sink])
+        self.channel = FloatChannel("foo")
+        self.sink = ArraySink()
+        self.channel.set_sink(self.sink)
+        self.runner._kscan_update_host_param_stores()
+
+    def test_retry(self):
+        staging = _StagingSink(self.channel)
+        self.runner._kscan_staging_sinks.append(staging)
+        staging.install()
+
+        # Values are only forwarded once the point has been completed, and are
+        # discarded if the point is retried.
+        self.channel.push(1.0)
+        self.assertEqual(self.sink.get_all(), [])
+        self.runner._kscan_discard_staged_results()
+        self.channel.push(2.0)
+        self.runner._kscan_point_completed()
+        self.assertEqual(self.sink.get_all(), [2.0])
+        self.assertEqual(self.axis_sink.get_all(), [0.5])
+
+        # Values for incomplete points are dropped.
+        self.channel.push(3.0)
+        staging.uninstall()
+        self.assertIs(self.channel.sink, self.sink)
+        self.assertEqual(self.sink.get_all(), [2.0])
+
+    def test_unpushed_channel(self):
+        staging = _StagingSink(self.channel)
+        self.runner._kscan_staging_sinks.append(staging)
+        staging.install()
+        with self.assertLogs("ndscan.experiment.scan_runner", "WARNING"):
+            self.runner._kscan_point_completed()
+        self.assertEqual(self.runner._kscan_unpushed_channels, {self.channel})
+        self.assertEqual(self.axis_sink.get_all(), [0.5])
+
+    def test_batched_points_completed(self):
+        buffer = _FloatResultBuffer(self.channel, 3)
+        self.runner._kscan_result_buffers.append(buffer)
+        buffer.install()
+        self.runner._kscan_param_values_chunk()
+        for value in [1.0, 2.0]:
+            self.channel.push(value)
+            buffer.commit()
+        self.runner._kscan_points_completed(2)
+        self.assertEqual(self.axis_sink.get_all(), [0.5, 1.5])
+        self.assertEqual(self.sink.get_all(), [1.0, 2.0])
+        self.assertEqual(self.runner._kscan_param_values_chunk(), ([2.5], ))
+        self.assertEqual(self.runner._kscan_unpushed_channels, set())
+
+        with self.assertLogs("ndscan.experiment.scan_runner", "WARNING"):
+            self.runner._kscan_points_completed(1)
+
+
+class KernelResultBufferCase(unittest.TestCase):
+    def setUp(self):
+        self.channel = FloatChannel("foo")
+        self.sink = ArraySink()
+        self.channel.set_sink(self.sink)
+        self.buffer = _FloatResultBuffer(self.channel, 3)
+        self.buffer.install()
+
+    def test_commit_discard(self):
+        for value in [0, 1]:
+            self.channel.push(value)
+            self.buffer.commit()
+        self.channel.push(2)
+        self.assertEqual(self.sink.get_all(), [])
+
+        # Once the buffer is full, the committed values are forwarded.
+        self.channel.push(3)
+        self.assertEqual(self.sink.get_all(), [0.0, 1.0])
+
+        # Retry the point.
+        self.buffer.discard()
+        self.channel.push(4)
+        self.buffer.commit()
+        self.buffer.uninstall()
+        self.assertEqual(self.sink.get_all(), [0.0, 1.0, 4.0])
+        self.assertEqual(self.buffer.num_forwarded, 3)
+
+        self.assertNotIn("push", self.channel.__dict__)
+        self.channel.push(5)
+        self.assertEqual(self.sink.get_all()[-1], 5.0)
+
+    def test_overflowing_point(self):
+        for value in range(4):
+            self.channel.push(value)
+        self.assertEqual(self.sink.get_all(), [0.0, 1.0, 2.0])
+
+    def test_push_many(self):
+        self.channel.push_many([0, 1])
+        self.buffer.commit()
+        self.channel.push_many([2, 3])
+        self.buffer.commit()
+        self.assertEqual(self.sink.get_all(), [0.0, 1.0])
+        self.buffer.uninstall()
+        self.assertEqual(self.sink.get_all(), [0.0, 1.0, 2.0, 3.0])
+        self.assertNotIn("push_many", self.channel.__dict__)
+
+    def test_int_buffer(self):
+        channel = IntChannel("bar")
+        sink = ArraySink()
+        channel.set_sink(sink)
+        buffer = _IntResultBuffer(channel, 3)
+        buffer.install()
+        for value in [1, 2]:
+            channel.push(value)
+            buffer.commit()
+        buffer.uninstall()
+        self.assertEqual(sink.get_all(), [1, 2])
+        for value in sink.get_all():
+            self.assertIsInstance(value, int)
+
+
+class HostScanCoercionCase(HasEnvironmentCase):
+    def run_host_scan(self, axis, generator):
+        runner = self.create(ScanRunner)
+        sink = ArraySink()
+        fragment = unittest.mock.Mock()
+        points = ScanPointSequence([generator], ScanOptions())
+        runner._run_scan_on_host(fragment, points, [axis], [sink])
+        self.assertEqual(fragment.run_once.call_count, len(sink.get_all()))
+        return sink.get_all()
+
+    def test_int_param_float_scan(self):
+        # Values are coerced to the parameter type before being pushed to the axis sink.
+        values = self.run_host_scan(_make_axis(IntParamStore, "int"),
+                                    LinearGenerator(0.0, 3.0, 4, False))
+        self.assertEqual(values, [0, 1, 2, 3])
+        for value in values:
+            self.assertIsInstance(value, int)
+
+    def test_mixed_list_float_param(self):
+        values = self.run_host_scan(_make_axis(FloatParamStore, "float"),
+                                    ListGenerator([1, 2.5], False))
+        self.assertEqual(values, [1.0, 2.5])
+        for value in values:
+            self.assertIsInstance(value, float)
+
+
+class HostScanPublishCase(HasEnvironmentCase):
+    def setUp(self):
+        super().setUp()
+        self.axis = _make_axis(FloatParamStore, "float")
+        self.axis_sink = ArraySink()
+        self.channel = FloatChannel("foo")
+        self.result_sink = ArraySink()
+        self.channel.set_sink(self.result_sink)
+        self.fragment = unittest.mock.Mock()
+        self.fragment._collect_result_channels.side_effect = lambda channels: \
+            channels.update({"foo": self.channel})
+        self.fragment.run_once.side_effect = lambda: self.channel.push(
+            2 * self.axis.param_store.get_value())
+
+    def run_host_scan(self, generator, **kwargs):
+        runner = self.create(ScanRunner, publish_host_results=True, **kwargs)
+        points = ScanPointSequence([generator], ScanOptions())
+        runner._run_scan_on_host(self.fragment, points, [self.axis], [self.axis_sink])
+
+    def test_publish(self):
+        self.run_host_scan(LinearGenerator(0.0, 99.0, 100, False),
+                           max_pending_host_results=3)
+        self.assertEqual(self.axis_sink.get_all(), [float(i) for i in range(100)])
+        self.assertEqual(self.result_sink.get_all(), [2.0 * i for i in range(100)])
+        # The original sink is restored afterwards.
+        self.assertIs(self.channel.sink, self.result_sink)
+
+    def test_sink_error(self):
+        def push(value):
+            if value > 10:
+                raise ValueError("Sink failure")
+
+        self.axis_sink.push = push
+        with self.assertRaises(ValueError):
+            self.run_host_scan(LinearGenerator(0.0, 99.0, 100, False))
+        self.assertIs(self.channel.sink, self.result_sink)
+
+
+class HostScanProcessesCase(HasEnvironmentCase):
+    def setUp(self):
+        super().setUp()
+        self.axis = _make_axis(FloatParamStore, "float")
+        self.channel = FloatChannel("foo")
+        self.fragment = unittest.mock.Mock()
+        self.fragment._collect_result_channels.side_effect = lambda channels: \
+            channels.update({"foo": self.channel})
+        self.fragment.run_once.side_effect = lambda: self.channel.push(
+            self.axis.param_store.get_value() + np.random.random())
+
+    def run_scan(self, num_host_processes, options):
+        runner = self.create(ScanRunner, num_host_processes=num_host_processes)
+        axis_sink = ArraySink()
+        result_sink = ArraySink()
+        self.channel.set_sink(result_sink)
+        spec = ScanSpec([self.axis], [LinearGenerator(0.0, 19.0, 20, True)], options)
+        runner.run(self.fragment, spec, [axis_sink])
+        return axis_sink.get_all(), result_sink.get_all()
+
+    def test_parallel(self):
+        options = ScanOptions(num_repeats=2, seed=1234)
+        axis_values, results = self.run_scan(3, options)
+        self.assertEqual(len(axis_values), 40)
+        self.assertEqual(sorted(axis_values), sorted(2 * list(range(20))))
+        # Results are pushed in point order.
+        for axis_value, result in zip(axis_values, results):
+            self.assertTrue(axis_value <= result < axis_value + 1)
+
+        # The results do not depend on the number of processes.
+        self.assertEqual(self.run_scan(2, options), (axis_values, results))
+
+    def test_worker_error(self):
+        self.fragment.run_once.side_effect = ValueError("Simulation failed")
+        with self.assertRaises(ValueError):
+            self.run_scan(2, ScanOptions())
+
+
+class HostScanResumeCase(HasEnvironmentCase):
+    def test_start_index(self):
+        runner = self.create(ScanRunner)
+        sink = ArraySink()
+        axis = _make_axis(FloatParamStore, "float")
+        spec = ScanSpec([axis], [LinearGenerator(0.0, 9.0, 10, False)],
+                        ScanOptions(num_repeats=2))
+        fragment = unittest.mock.Mock()
+        runner.run(fragment, spec, [sink], start_index=7)
+        self.assertEqual(sink.get_all(), [7.0, 8.0, 9.0] + list(range(10)))
+        self.assertEqual(fragment.run_once.call_count, 13)
+
+    def test_start_index_depends_on_results(self):
+        runner = self.create(ScanRunner)
+        axis = _make_axis(FloatParamStore, "float")
+        spec = ScanSpec([axis], [AdaptiveGenerator(0.0, 1.0, False)], ScanOptions())
+        fragment = unittest.mock.Mock()
+        with self.assertRaises(ValueError):
+            runner.run(fragment, spec, [ArraySink()], start_index=1)
+        fragment.run_once.assert_not_called()
+
+
+class ScanTimingCase(HasEnvironmentCase):
+    def test_host_scan(self):
+        log = TimingLog()
+        runner = self.create(ScanRunner, timing_log=log)
+        spec = ScanSpec([_make_axis(FloatParamStore, "float")],
+                        [LinearGenerator(0.0, 9.0, 10, False)], ScanOptions())
+        runner.run(unittest.mock.Mock(), spec, [ArraySink()])
+        self.assertEqual(log.get_phases(), [
+            "host_setup", "fetch", "set_point", "device_setup", "run_once",
+            "check_pause", "host_cleanup"
+        ])
+        for phase in ["set_point", "device_setup", "run_once", "check_pause"]:
+            self.assertEqual(len(log.get_durations(phase)), 10)
+        # One call returning the points, and one signalling the end.
+        self.assertEqual(len(log.get_durations("fetch")), 2)
+        self.assertTrue(np.all(log.get_durations("run_once") >= 0))
+
+    def test_kernel_chunks(self):
+        log = TimingLog()
+        self.core.mu_to_seconds.side_effect = lambda mu: mu * 1e-9
+        runner = self.create(ScanRunner, timing_log=log)
+        runner._kscan_pause_check_interval_mu = 10**9
+        points = ScanPointSequence([LinearGenerator(0.0, 1.0, 100, False)],
+                                   ScanOptions())
+        runner._kscan_set_up_points(points, [_make_axis(FloatParamStore, "float")],
+                                    [ArraySink()])
+        (values, ) = runner._kscan_param_values_chunk()
+        for _ in values:
+            runner._kscan_point_completed()
+        runner._kscan_param_values_chunk(1000, 500 * len(values))
+        np.testing.assert_allclose(log.get_durations("fetch"), [1e-6])
+        np.testing.assert_allclose(log.get_durations("kernel_point"), [5e-7])
+        self.assertEqual(len(log.get_durations("push")), len(values))
+
+    def test_summarise(self):
+        log = TimingLog()
+        for i in range(101):
+            log.record("foo", float(i))
+        log.record("bar", 1.0)
+        summary = log.summarise()
+        self.assertEqual(list(summary.keys()), ["foo", "bar"])
+        self.assertEqual(summary["foo"], {
+            "count": 101,
+            "total": 5050.0,
+            "mean": 50.0,
+            "median": 50.0,
+            "p99": 99.0
+        })
+        self.assertEqual(summary["bar"]["p99"], 1.0)
+        self.assertEqual(len(log.get_durations("baz")), 0)
+
+
+class ScanPlanCase(unittest.TestCase):
+    def test_bounded(self):
+        axes = [_make_axis(FloatParamStore, "float"), _make_axis(IntParamStore, "int")]
+        spec = ScanSpec(
+            axes,
+            [LinearGenerator(0.0, 1.0, 5, False),
+             ListGenerator([1, 2, 3], False)], ScanOptions(num_repeats=2))
+        plan = spec.plan({"a": FloatChannel("a"), "b": OpaqueChannel("b")})
+        self.assertEqual(plan.points_per_level, [30])
+        self.assertEqual(plan.num_points, 30)
+        self.assertEqual(plan.num_bytes(), {
+            "axis_0": 240,
+            "axis_1": 240,
+            "channel_a": 240,
+            "channel_b": None
+        })
+        self.assertEqual(plan.num_bytes(10)["channel_a"], 80)
+
+    def test_unbounded(self):
+        spec = ScanSpec([_make_axis(FloatParamStore, "float")],
+                        [RefiningGenerator(0.0, 1.0, False)], ScanOptions())
+        plan = spec.plan(max_levels=4)
+        self.assertEqual(plan.points_per_level, [2, 1, 2, 4])
+        self.assertIsNone(plan.num_points)
+        self.assertEqual(plan.num_points_after_level(2), 5)
+        self.assertIsNone(plan.num_points_after_level(4))
+        self.assertEqual(plan.num_bytes(5), {"axis_0": 40})
+        self.assertEqual(plan.num_bytes(), {"axis_0": None})
+
+    def test_aggregate_repeats(self):
+        spec = ScanSpec([_make_axis(FloatParamStore, "float")],
+                        [LinearGenerator(0.0, 1.0, 5, False)],
+                        ScanOptions(num_repeats=10, aggregate_repeats=True))
+        plan = spec.plan({"a": IntChannel("a")})
+        self.assertEqual(plan.num_points, 50)
+        self.assertEqual(plan.num_bytes(), {
+            "axis_0": 40,
+            "channel_a": 80,
+            "channel_repeat_count": 40
+        })
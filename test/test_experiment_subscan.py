@@ -3,12 +3,17 @@ Tests for subscan functionality.
 """
 
 import json
+import numpy as np
 from ndscan.experiment import *
 from fixtures import (AddOneFragment, ReboundAddOneFragment,
                       AddOneCustomAnalysisFragment, TwoAnalysisFragment)
 from mock_environment import ExpFragmentCase
 
 
+def to_lists(data):
+    return {key: values.tolist() for key, values in data.items()}
+
+
 class Scan1DFragment(ExpFragment):
     def build_fragment(self, klass):
         self.setattr_fragment("child", klass)
@@ -20,6 +25,22 @@ class Scan1DFragment(ExpFragment):
                              ScanOptions(seed=1234))[:2]
 
 
+class AdaptiveScanFragment(ExpFragment):
+    def build_fragment(self, channel):
+        self.setattr_fragment("child", AddOneFragment)
+        setattr_subscan(self, "scan", self.child, [(self.child, "value")])
+        self.generator = AdaptiveGenerator(0,
+                                           3,
+                                           False,
+                                           channel,
+                                           num_initial_points=3,
+                                           num_points_per_level=2,
+                                           min_spacing=0.5)
+
+    def run_once(self):
+        return self.scan.run([(self.child.value, self.generator)])[:2]
+
+
 class SubscanCase(ExpFragmentCase):
     def test_1d_subscan_return(self):
         parent = self.create(Scan1DFragment, AddOneFragment)
@@ -34,8 +55,9 @@ class SubscanCase(ExpFragmentCase):
 
         expected_values = [float(n) for n in range(0, 4)]
         expected_results = [v + 1 for v in expected_values]
-        self.assertEqual(coords, {parent.child.value: expected_values})
-        self.assertEqual(values, {result_channel: expected_results})
+        self.assertEqual(to_lists(coords), {parent.child.value: expected_values})
+        self.assertEqual(to_lists(values), {result_channel: expected_results})
+        self.assertEqual(values[result_channel].dtype, np.float64)
 
     def test_1d_result_channels(self):
         parent = self.create(Scan1DFragment, AddOneFragment)
@@ -43,8 +65,8 @@ class SubscanCase(ExpFragmentCase):
 
         expected_values = [float(n) for n in range(0, 4)]
         expected_results = [v + 1 for v in expected_values]
-        self.assertEqual(results[parent.scan_axis_0], expected_values)
-        self.assertEqual(results[parent.scan_channel_result], expected_results)
+        self.assertEqual(results[parent.scan_axis_0].tolist(), expected_values)
+        self.assertEqual(results[parent.scan_channel_result].tolist(), expected_results)
 
         spec = json.loads(results[parent.scan_spec])
         self.assertEqual(spec["fragment_fqn"], "fixtures.AddOneFragment")
@@ -176,6 +198,24 @@ class SubscanCase(ExpFragmentCase):
         # values.
         self.assertEqual(annotations, [x_location, y_location])
 
+    def test_adaptive_feedback(self):
+        parent = self.create(AdaptiveScanFragment, "result")
+        coords, values = parent.run_once()
+        points = coords[parent.child.value]
+        self.assertGreater(len(points), 3)
+        self.assertEqual(values[parent.child.result].tolist(), [v + 1 for v in points])
+
+        # The generator reads back the data acquired by the subscan.
+        self.assertEqual(parent.generator._coordinate_sink.get_all().tolist(),
+                         points.tolist())
+        self.assertEqual(parent.generator._value_sink.get_all().tolist(),
+                         values[parent.child.result].tolist())
+
+    def test_adaptive_unknown_channel(self):
+        parent = self.create(AdaptiveScanFragment, "foo")
+        with self.assertRaises(ValueError):
+            parent.run_once()
+
 
 class RunSubscanTwiceFragment(ExpFragment):
     def build_fragment(self):
@@ -199,8 +239,9 @@ class RunSubscanTwiceCase(ExpFragmentCase):
         for base, (coords, values, _) in zip([0, 4], results):
             expected_values = [float(n) for n in range(base, base + 4)]
             expected_results = [v + 1 for v in expected_values]
-            self.assertEqual(coords, {parent.child.value: expected_values})
-            self.assertEqual(values, {parent.child.result: expected_results})
+            # The values of the first run need to remain valid after the second one.
+            self.assertEqual(to_lists(coords), {parent.child.value: expected_values})
+            self.assertEqual(to_lists(values), {parent.child.result: expected_results})
 
 
 class SubscanAnalysisFragment(ExpFragment):
@@ -108,3 +108,77 @@ class SinglePointTest(unittest.TestCase):
         self.datasets["ndscan.completed"] = (False, True)
         self.init()
         self.assertEqual(self.root.get_model().get_point(), {"foo": 42, "bar": 23})
+
+
+class ScanTest(unittest.TestCase):
+    def setUp(self):
+        self.context = Context()
+        self.root = SubscriberRoot("ndscan.", self.context)
+        axis = {"param": {"fqn": "foo", "type": "float", "spec": {}}, "path": "*"}
+        self.datasets = Notifier({
+            "ndscan.axes": (False, json.dumps([axis])),
+            "ndscan.channels": (False,
+                                json.dumps({
+                                    "y": {
+                                        "description": "Y",
+                                        "path": "y",
+                                        "type": "float"
+                                    },
+                                    "scan_y": {
+                                        "description": "Subscan Y",
+                                        "path": "scan_y",
+                                        "type": "packed_array",
+                                        "dtype": "float64"
+                                    }
+                                })),
+            "ndscan.online_analyses": (False, "{}"),
+            "ndscan.annotations": (False, "[]"),
+            "ndscan.analysis_results": (False, "{}"),
+            "ndscan.points.axis_0": (False, [0.0]),
+            "ndscan.points.channel_y": (False, [1.0]),
+            "ndscan.points.channel_scan_y": (False, [1.0, 2.0, 3.0]),
+            "ndscan.points.channel_scan_y.offsets": (False, [0, 3]),
+            ("ndscan." + SCHEMA_REVISION_KEY): (False, SCHEMA_REVISION),
+        })
+        self.pending_mods = [{
+            "action": "init",
+            "struct": self.datasets.raw_view.copy()
+        }]
+        self.datasets.publish = lambda a: self.pending_mods.append(a)
+        self.sync()
+
+        self.model = self.root.get_model()
+        self.signals = []
+        self.model.points_appended.connect(lambda _: self.signals.append("appended"))
+        self.model.points_rewritten.connect(lambda _: self.signals.append("rewritten"))
+
+    def sync(self):
+        self.root.data_changed(self.datasets.raw_view, self.pending_mods)
+        self.pending_mods.clear()
+
+    def points(self, name):
+        return self.datasets["ndscan.points." + name][1]
+
+    def test_packed_array(self):
+        packed = self.model.get_point_data()["channel_scan_y"]
+        self.assertEqual(len(packed), 1)
+        self.assertEqual(packed[0].tolist(), [1.0, 2.0, 3.0])
+
+        # Values of packed channels are appended by assigning to an empty slice.
+        self.points("axis_0").append(1.0)
+        self.points("channel_y").append(2.0)
+        self.points("channel_scan_y")[3:3] = [4.0, 5.0]
+        self.points("channel_scan_y.offsets").append(5)
+        self.sync()
+        self.assertEqual(self.signals, ["appended"])
+
+        packed = self.model.get_point_data()["channel_scan_y"]
+        self.assertEqual(len(packed), 2)
+        self.assertEqual(packed[1].tolist(), [4.0, 5.0])
+
+    def test_remove_points(self):
+        for name in ["axis_0", "channel_y"]:
+            self.points(name)[0:1] = []
+        self.sync()
+        self.assertEqual(self.signals, ["rewritten"])
+        self.assertEqual(self.model.get_point_data()["axis_0"], [])
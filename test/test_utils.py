@@ -1,5 +1,7 @@
+import numpy as np
 import unittest
-from ndscan.utils import strip_prefix, strip_suffix, shorten_to_unambiguous_suffixes
+from ndscan.utils import (PackedArray, strip_prefix, strip_suffix,
+                          shorten_to_unambiguous_suffixes)
 
 
 class StripTest(unittest.TestCase):
@@ -27,3 +29,25 @@ class ShortenTest(unittest.TestCase):
         test({"a1/b/c": "a1/b/c", "a2/b/c": "a2/b/c"})
         test({"a1/b/c/d": "a1/b/c/d", "a2/b/c/d": "a2/b/c/d"})
         test({"a1/b/c/d/e": "a1/b/c/d/e", "a2/b/c/d/e": "a2/b/c/d/e"})
+
+
+class PackedArrayTest(unittest.TestCase):
+    def test_ragged(self):
+        values = np.arange(6.0)
+        packed = PackedArray(values, [0, 1, 1, 6])
+        self.assertEqual(len(packed), 3)
+        self.assertEqual(packed[0].tolist(), [0.0])
+        self.assertEqual(packed[1].tolist(), [])
+        self.assertEqual(packed[-1].tolist(), [1.0, 2.0, 3.0, 4.0, 5.0])
+        self.assertTrue(np.shares_memory(packed[2], values))
+        with self.assertRaises(IndexError):
+            packed[3]
+        with self.assertRaises(ValueError):
+            packed.to_2d()
+
+    def test_to_2d(self):
+        values = np.arange(6)
+        array = PackedArray(values, [0, 3, 6]).to_2d()
+        self.assertEqual(array.tolist(), [[0, 1, 2], [3, 4, 5]])
+        self.assertTrue(np.shares_memory(array, values))
+        self.assertEqual(PackedArray([], [0]).to_2d().shape, (0, 0))